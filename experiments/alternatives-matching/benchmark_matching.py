@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Compares the candidate retrieval of preprocess.py with a full scan of every text.
+
+Uses the wholesaler samples and the report rows of this directory. --scale repeats the catalogs
+and the report to see how both approaches grow with the data. The index caches results per
+keyword, so its cache is cleared before every copy of the report: each copy is searched like a new
+report rather than answered from the previous copy. The index build time is reported separately
+from the search time. The candidate lists of both approaches are compared and must be identical.
+
+Usage:
+    python experiments/alternatives-matching/benchmark_matching.py [--scale 4]
+"""
+
+import os
+import time
+import argparse
+
+import pandas as pd
+
+from matching_index import KeywordIndex, get_keywords
+
+dir_path = os.path.dirname(os.path.abspath(__file__))
+
+
+def scan(texts: list[str], queries: list[tuple[str, str]]) -> list[list[int]]:
+    """The previous loop: two `in` checks against every text for every query."""
+    results = []
+    for keyword_1, keyword_2 in queries:
+        results.append([i for i, text in enumerate(texts) if keyword_1 in text or keyword_2 in text])
+    return results
+
+
+def load_texts(filename: str) -> list[str]:
+    df = pd.read_csv(os.path.join(dir_path, filename))
+    return list(df.apply(lambda x: x.to_json().lower().replace('-', ' '), axis=1).values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=1, help="Times the catalogs and the report are repeated.")
+    args = parser.parse_args()
+
+    report_file = "product-report-top-1000-generic-predictions.csv"
+    if not os.path.exists(os.path.join(dir_path, report_file)):
+        report_file = "product-report-top-1000-preprocessed.csv"
+    df_report = pd.read_csv(os.path.join(dir_path, report_file), low_memory=False)
+    if 'brand_status' in df_report:
+        df_report = df_report[df_report['brand_status'] == 'Generic']
+    report_queries = [
+        get_keywords(description, ingredient)
+        for description, ingredient in zip(df_report['Product Description'], df_report['Primary Ingredient HIC4 Desc'])
+    ]
+    queries = report_queries * args.scale
+
+    for name in ("blupax", "parmed"):
+        texts = load_texts(f"unique_{name}_samples.csv") * args.scale
+        print(f"{name}: {len(queries)} queries against {len(texts)} texts")
+
+        start = time.perf_counter()
+        expected = scan(texts, queries)
+        scan_elapsed = time.perf_counter() - start
+        print(f"  scan:   {scan_elapsed:.2f}s")
+
+        start = time.perf_counter()
+        index = KeywordIndex(texts)
+        build_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = []
+        for _ in range(args.scale):
+            index.clear_cache()
+            result += index.search_batch(report_queries)
+        search_elapsed = time.perf_counter() - start
+        total_elapsed = build_elapsed + search_elapsed
+        print(f"  index:  {build_elapsed:.2f}s to build, {search_elapsed:.2f}s to search")
+        print(f"  {scan_elapsed / search_elapsed:.1f}x faster searching, {scan_elapsed / total_elapsed:.1f}x faster including the build")
+
+        if result != expected:
+            mismatches = sum(1 for a, b in zip(result, expected) if a != b)
+            print(f"  MISMATCH: {mismatches} queries differ")
+        else:
+            print(f"  identical candidates ({sum(map(len, result))} in total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Candidate ranking for the alternatives-matching experiment.
+
+The keyword index of matching_index.py finds every catalog text sharing a keyword with a report row,
+which is often hundreds of texts for broad ingredients. predict.py sends all of them to the LLM, so
+prompt size and latency grow with the candidate count. CandidateRanker scores the candidates and
+keeps only the top k.
+
+Products are embedded as TF-IDF vectors of character n-grams, which tolerate the abbreviations of the
+catalogs ("TB" / "Tab", "600-300MG" / "600 MG"). Descriptions with strengths and manufacturers are
+separate blocks of the vectors, each L2-normalized, so one dot product is a weighted sum of their
+cosine similarities. All report rows are scored against a catalog in a single sparse matrix product.
+"""
+
+import re
+from collections import Counter
+from typing import Sequence
+
+import numpy as np
+from scipy import sparse
+
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9.]+")
+
+# The catalog columns of each field and the weight of the field in the score
+CATALOG_FIELDS = {
+    'parmed': [(('Description', 'Strength'), 1.0), (('Manufacturer',), 0.2)],
+    'blupax': [(('Description', 'Generic Name', 'Strength'), 1.0), (('Manufacturer Name',), 0.2)],
+}
+# The report columns matching the catalog fields
+REPORT_FIELDS = [('Product Description', 'Primary Ingredient HIC4 Desc'), ('Supplier Name',)]
+
+
+def normalize(text) -> str:
+    """Lowercases a text and replaces punctuation with spaces. Missing values become empty texts."""
+    if not isinstance(text, str):
+        return ''
+    return NON_ALPHANUMERIC.sub(' ', text.lower()).strip()
+
+
+def char_ngrams(text: str, ngram_range: tuple[int, int] = (2, 4)) -> Counter:
+    """Counts the character n-grams of the words of a normalized text, words padded with spaces."""
+    grams = Counter()
+    low, high = ngram_range
+    for word in text.split():
+        word = f' {word} '
+        for n in range(low, high + 1):
+            grams.update(word[i:i + n] for i in range(len(word) - n + 1))
+    return grams
+
+
+class CharNgramVectorizer:
+    """TF-IDF over character n-grams, with the vocabulary and the IDF weights fitted on a catalog."""
+
+    def __init__(self, ngram_range: tuple[int, int] = (2, 4)):
+        self.ngram_range = ngram_range
+        self.vocabulary: dict[str, int] = {}
+        self.idf: np.ndarray = np.empty(0)
+
+    def _counts(self, texts: Sequence[str], grow: bool) -> sparse.csr_matrix:
+        """Builds the n-gram count matrix, adding new n-grams to the vocabulary when grow is set."""
+        indptr = [0]
+        indices = []
+        data = []
+        for text in texts:
+            for gram, count in char_ngrams(normalize(text), self.ngram_range).items():
+                column = self.vocabulary.get(gram)
+                if column is None:
+                    if not grow:
+                        continue
+                    column = self.vocabulary[gram] = len(self.vocabulary)
+                indices.append(column)
+                data.append(count)
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), np.asarray(indices, dtype=np.int32), np.asarray(indptr)),
+            shape=(len(texts), len(self.vocabulary)),
+        )
+
+    def _weight(self, counts: sparse.csr_matrix) -> sparse.csr_matrix:
+        """Applies sublinear TF and IDF weights and L2-normalizes the rows."""
+        counts.data = 1.0 + np.log(counts.data)
+        weighted = (counts @ sparse.diags(self.idf)).tocsr()
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return (sparse.diags(1.0 / norms) @ weighted).tocsr().astype(np.float32)
+
+    def fit_transform(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        """Fits the vocabulary and IDF weights on texts and returns their vectors."""
+        self.vocabulary = {}
+        counts = self._counts(texts, grow=True)
+        document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+        self.idf = np.log((1 + counts.shape[0]) / (1 + document_frequency)) + 1.0
+        return self._weight(counts)
+
+    def transform(self, texts: Sequence[str]) -> sparse.csr_matrix:
+        """Returns the vectors of texts. N-grams absent from the fitted catalog are ignored."""
+        return self._weight(self._counts(texts, grow=False))
+
+
+class CandidateRanker:
+    """
+    Ranks the products of one catalog by similarity to report rows.
+
+    Each field is a (catalog texts, weight) pair: the catalog side of the field and the weight of its
+    cosine similarity in the score, e.g. descriptions with strengths weighted 1.0 and manufacturers 0.2.
+    """
+
+    def __init__(self, fields: Sequence[tuple[Sequence[str], float]], ngram_range: tuple[int, int] = (2, 4)):
+        """
+        Fits one vectorizer per field on the catalog.
+
+        Args:
+            fields: The catalog texts of each field with the weight of the field.
+            ngram_range: The lengths of the character n-grams.
+        """
+        self.weights = [weight for _, weight in fields]
+        self.vectorizers = [CharNgramVectorizer(ngram_range) for _ in fields]
+        self.catalog = sparse.hstack(
+            [vectorizer.fit_transform(texts) for vectorizer, (texts, _) in zip(self.vectorizers, fields)],
+            format='csr',
+        )
+
+    def score(self, fields: Sequence[Sequence[str]]) -> sparse.csr_matrix:
+        """
+        Scores every query against every catalog product in one sparse matrix product.
+
+        Args:
+            fields: The query texts of each field, in the order of the catalog fields.
+
+        Returns:
+            A sparse (queries × catalog) matrix of weighted cosine similarities.
+        """
+        queries = sparse.hstack(
+            [
+                vectorizer.transform(texts) * weight
+                for vectorizer, texts, weight in zip(self.vectorizers, fields, self.weights)
+            ],
+            format='csr',
+        )
+        return (queries @ self.catalog.T).tocsr()
+
+    def top_k(self, fields: Sequence[Sequence[str]], k: int, candidates: Sequence[Sequence[int]] | None = None) -> list[list[int]]:
+        """
+        Returns the k best catalog indices of every query, best first.
+
+        Args:
+            fields: The query texts of each field, in the order of the catalog fields.
+            k: The number of candidates to keep per query.
+            candidates: Restricts each query to these catalog indices, e.g. the keyword matches of
+                KeywordIndex. The whole catalog is ranked by default.
+
+        Returns:
+            The ranked indices of each query. Equal scores keep the order of the candidates.
+
+        Raises:
+            ValueError: If k is smaller than 1.
+        """
+        if k < 1:
+            raise ValueError(f"k must be at least 1, got {k}.")
+        scores = self.score(fields)
+        ranked = []
+        for row in range(scores.shape[0]):
+            row_scores = scores.getrow(row).toarray().ravel()
+            pool = np.asarray(candidates[row] if candidates is not None else range(len(row_scores)), dtype=np.int64)
+            if len(pool) == 0:
+                ranked.append([])
+                continue
+            pool_scores = row_scores[pool]
+            if len(pool) > k:
+                # argpartition finds the k best in linear time, only those are sorted
+                best = np.argpartition(-pool_scores, k - 1)[:k]
+                order = best[np.lexsort((best, -pool_scores[best]))]
+            else:
+                order = np.lexsort((np.arange(len(pool)), -pool_scores))
+            ranked.append(pool[order].tolist())
+        return ranked
+
+
+def join_columns(df, columns: Sequence[str]) -> list[str]:
+    """Joins the normalized values of some columns of each row of a DataFrame."""
+    return [' '.join(normalize(value) for value in values) for values in zip(*(df[column] for column in columns))]
+
+
+def build_ranker(df_catalog, wholesaler: str) -> CandidateRanker:
+    """Fits a ranker on the unique product samples of a wholesaler, see CATALOG_FIELDS."""
+    return CandidateRanker([(join_columns(df_catalog, columns), weight) for columns, weight in CATALOG_FIELDS[wholesaler]])
+
+
+def report_fields(df_report) -> list[list[str]]:
+    """Returns the query texts of the report rows, see REPORT_FIELDS."""
+    return [join_columns(df_report, columns) for columns in REPORT_FIELDS]
+
+
+def recall_at_k(ranked: Sequence[Sequence[int]], targets: Sequence[int | None]) -> float | None:
+    """
+    Returns the share of targets found in the ranked candidates of their query.
+
+    Args:
+        ranked: The ranked candidates of each query.
+        targets: The expected catalog index of each query, None or negative when there is none.
+
+    Returns:
+        The recall over queries with a target, None when no query has one.
+    """
+    hits = total = 0
+    for candidates, target in zip(ranked, targets):
+        if target is None or target < 0:
+            continue
+        total += 1
+        hits += target in candidates
+    return hits / total if total else None
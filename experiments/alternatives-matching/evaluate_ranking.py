@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Measures how many LLM choices survive the top-k ranking of candidate_ranking.py.
+
+Uses the predictions of a previous predict.py run, made on the unranked keyword matches. For every
+row where the LLM chose an alternative, the keyword matches are ranked again and the choice counts as
+recalled when it is in the top k. Also reports the candidates and prompt characters sent per row, which
+is what the ranking saves. --scale repeats the report to time the batched scoring on more rows.
+
+Usage:
+    python experiments/alternatives-matching/evaluate_ranking.py [--k 1 3 5 10 20] [--scale 10]
+"""
+
+import os
+import json
+import time
+import argparse
+
+import pandas as pd
+
+from candidate_ranking import build_ranker, recall_at_k, report_fields
+
+dir_path = os.path.dirname(os.path.abspath(__file__))
+
+
+def prompt_size(df_catalog: pd.DataFrame, texts: list[str], candidates: list[list[int]]) -> float:
+    """Returns the mean length of the alternatives serialized by predict.py."""
+    sizes = [
+        len(json.dumps([{'index': k, 'drug': texts[i]} for k, i in enumerate(indices)]))
+        for indices in candidates
+    ]
+    return sum(sizes) / len(sizes) if sizes else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10, 20], help="The k values to evaluate.")
+    parser.add_argument("--scale", type=int, default=1, help="Times the report is repeated for the timing.")
+    args = parser.parse_args()
+
+    df = pd.read_csv(os.path.join(dir_path, "product-report-top-1000-alternative-predictions.csv"), low_memory=False)
+    for name in ("parmed", "blupax"):
+        df_catalog = pd.read_csv(os.path.join(dir_path, f"unique_{name}_samples.csv"))
+        texts = list(df_catalog.apply(lambda x: x.to_json().lower(), axis=1).values)
+        rows = df[df[f'found_{name}'] & df[f'alternative_index_{name}'].notna()].reset_index(drop=True)
+        candidates = [json.loads(indices) for indices in rows[f'index_{name}']]
+        targets = [int(index) for index in rows[f'alternative_index_{name}']]
+        chosen = sum(1 for target in targets if target >= 0)
+        print(f"{name}: {len(rows)} rows with matches, {chosen} with an alternative chosen by the LLM")
+        if not len(rows):
+            continue
+
+        start = time.perf_counter()
+        ranker = build_ranker(df_catalog, name)
+        build_elapsed = time.perf_counter() - start
+        fields = report_fields(rows)
+        start = time.perf_counter()
+        ranker.score([texts * args.scale for texts in fields])
+        score_elapsed = time.perf_counter() - start
+        print(f"  fitted in {build_elapsed:.2f}s, scored {len(rows) * args.scale} rows in {score_elapsed:.3f}s")
+
+        print(f"  all matches: {sum(map(len, candidates)) / len(rows):.1f} candidates, "
+              f"{prompt_size(df_catalog, texts, candidates):.0f} prompt characters per row")
+        for k in args.k:
+            ranked = ranker.top_k(fields, k, candidates)
+            recall = recall_at_k(ranked, targets)
+            recall = f"{recall:.1%}" if recall is not None else "n/a"
+            print(f"  top {k:>3}: {sum(map(len, ranked)) / len(rows):.1f} candidates, "
+                  f"{prompt_size(df_catalog, texts, ranked):.0f} prompt characters per row, recall {recall}")
+
+
+if __name__ == "__main__":
+    main()
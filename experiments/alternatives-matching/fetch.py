@@ -4,80 +4,198 @@ Script to fetch all unique samples from both wholesaler tracking tables:
 1. wholesaler_tracking.parmed - based on description, manufacturer, strength, packQuantity
 2. wholesaler_tracking.blupax - based on description, product_size, manufacturer_name, brand, strength, branding_type, generic_name
 
-Saves results to two separate CSV files in the same directory as this script.
+Saves results to two separate CSV (or Parquet) files in the same directory as this script.
+
+Both wholesalers are exported concurrently, each on its own connection. CSV files are streamed by
+`COPY (query) TO STDOUT` straight into the file and Parquet files from a named server-side cursor,
+so memory stays flat whatever the number of samples.
+
+A full export aggregates the history tables. With --incremental, only the latest_price rows whose
+price or attributes changed since the previous export are aggregated and merged into the existing
+CSV file: a sample's minimum price is lowered and new samples are appended,
+which keeps the row numbers of existing samples (used by preprocess.py) stable. The watermark of
+each wholesaler is kept in export_state.json. A full export is needed to drop samples whose
+attributes changed.
+
+Usage:
+    python experiments/alternatives-matching/fetch.py [--incremental] [--format parquet]
 """
 
+import io
 import os
-import sys
 import csv
+import json
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
 import dotenv
 import psycopg2
-from typing import List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is only needed for the Parquet format
+    pa = None
 
 dotenv.load_dotenv()
 
+# The attributes of a sample and their SQL type, the output headers, and the price of latest_price used
+EXPORTS = {
+    'parmed': {
+        'filename': 'unique_parmed_samples',
+        'price_field': 'price',
+        'attributes': [
+            ('description', 'TEXT'), ('manufacturer', 'TEXT'), ('brandName', 'TEXT'), ('strength', 'TEXT'),
+            ('labelSize', 'TEXT'), ('packQuantity', 'INTEGER'),
+        ],
+        'headers': ["Description", "Manufacturer", "Brand Name", "Strength", "Label Size", "Pack Quantity", "Min Price"],
+    },
+    'blupax': {
+        'filename': 'unique_blupax_samples',
+        'price_field': 'unit_price',
+        'attributes': [
+            ('description', 'TEXT'), ('product_size', 'TEXT'), ('manufacturer_name', 'TEXT'), ('brand', 'TEXT'),
+            ('strength', 'TEXT'), ('branding_type', 'TEXT'), ('generic_name', 'TEXT'),
+        ],
+        'headers': ["Description", "Product Size", "Manufacturer Name", "Brand", "Strength", "Branding Type", "Generic Name", "Min Price"],
+    },
+}
 
-def fetch_unique_parmed_samples() -> Optional[List[tuple]]:
+# Rows written shortly before the watermark may commit after it. Aggregating them twice is harmless,
+# as merging keeps the minimum price, so incremental exports look back this far.
+WATERMARK_OVERLAP = timedelta(minutes=10)
+# Rows per round trip of the named cursor of Parquet exports
+ITERSIZE = 10000
+
+
+def build_full_query(wholesaler: str) -> str:
     """
-    Fetch all unique samples from the wholesaler_tracking.parmed table
-    based on description, manufacturer, strength, and packQuantity, with minimum price.
-    
-    Returns:
-        List of unique tuples (description, manufacturer, brandName, strength, labelSize, packQuantity, min_price), or None if an error occurs.
+    Returns the query of all the unique samples of a wholesaler with their minimum price.
+
+    The history table is aggregated, so every combination of attributes an item ever had is a sample,
+    including rows scraped before latest_price was maintained.
     """
-    # Get Postgres connection string from environment
-    pg_conn_str = os.environ.get("POSTGRES_CONNECTION_STRING")
-    if not pg_conn_str:
-        print("Error: POSTGRES_CONNECTION_STRING is not set in environment variables.")
-        print("Please set this environment variable and try again.")
-        return None
-    
-    # SQL query to fetch unique combinations with minimum price
-    sql_query = """
-    SELECT description, manufacturer, brandName, strength, labelSize, packQuantity, MIN(price) as min_price
-    FROM wholesaler_tracking.parmed 
-    WHERE description IS NOT NULL 
-    AND description != '' 
-    GROUP BY description, manufacturer, brandName, strength, labelSize, packQuantity
-    ORDER BY description, manufacturer, brandName, strength, labelSize, packQuantity;
+    export = EXPORTS[wholesaler]
+    columns = ', '.join(name for name, _ in export['attributes'])
+    return f"""
+    SELECT {columns}, MIN({export['price_field']}) as min_price
+    FROM wholesaler_tracking.{wholesaler}
+    WHERE description IS NOT NULL
+    AND description != ''
+    GROUP BY {columns}
+    ORDER BY {columns}
     """
 
-    try:
-        # Connect to database
-        print("Connecting to database for parmed...")
-        conn = psycopg2.connect(dsn=pg_conn_str)
-        
-        with conn:
-            with conn.cursor() as cur:
-                # Execute the query
-                print("Executing query to fetch unique parmed samples...")
-                cur.execute(sql_query)
-                
-                # Fetch all results
-                results = cur.fetchall()
-                
-                # Return the tuples as-is (description, manufacturer, brandName, strength, labelSize, packQuantity)
-                print(f"Found {len(results)} unique combinations.")
-                return results
 
-    except psycopg2.Error as e:
-        print(f"Database error occurred: {e}")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return None
-    finally:
-        if 'conn' in locals():
-            conn.close()
-            print("Database connection closed.")
+def build_incremental_query(wholesaler: str) -> str:
+    """
+    Returns the query of the unique samples of the items whose price or attributes changed since a watermark.
+
+    latest_price has one row per item with its all-time minimum, so the history is not re-aggregated.
+    The query takes the wholesaler's price field and the watermark as parameters.
+    """
+    attributes = EXPORTS[wholesaler]['attributes']
+    selected = ',\n               '.join(
+        f"attributes->>'{name}' AS {name}" if sql_type == 'TEXT' else f"(attributes->>'{name}')::{sql_type} AS {name}"
+        for name, sql_type in attributes
+    )
+    columns = ', '.join(name for name, _ in attributes)
+    return f"""
+    SELECT {columns}, MIN(min_price) as min_price
+    FROM (
+        SELECT {selected},
+               min_price
+        FROM wholesaler_tracking.latest_price
+        WHERE wholesaler = %(wholesaler)s AND price_field = %(price_field)s AND updated_at > %(since)s
+    ) items
+    WHERE description IS NOT NULL
+    AND description != ''
+    GROUP BY {columns}
+    ORDER BY {columns}
+    """
+
+
+def get_watermark(cur, wholesaler: str) -> datetime | None:
+    """Returns when the latest_price rows of a wholesaler were last written."""
+    cur.execute(
+        "SELECT MAX(updated_at) FROM wholesaler_tracking.latest_price WHERE wholesaler = %s AND price_field = %s",
+        (wholesaler, EXPORTS[wholesaler]['price_field'])
+    )
+    return cur.fetchone()[0]
+
+
+def copy_to_csv(cur, query: str, f, headers: list[str] | None = None):
+    """Streams the result of a bound query into a CSV file with COPY, after the headers if given."""
+    if headers:
+        csv.writer(f).writerow(headers)
+    cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", f)
 
-def fetch_unique_blupax_samples() -> Optional[List[tuple]]:
+
+def export_parquet(conn, query: str, path: str, headers: list[str]) -> int:
+    """Streams the result of a bound query into a Parquet file through a named cursor. Returns the row count."""
+    if pa is None:
+        raise RuntimeError("pyarrow is required for the Parquet format.")
+    rows_written = 0
+    writer = None
+    with conn.cursor(name='export_samples') as cur:
+        cur.itersize = ITERSIZE
+        cur.execute(query)
+        while rows := cur.fetchmany(ITERSIZE):
+            arrays = [pa.array(column) for column in zip(*rows)]
+            # Prices come as decimals and are stored as doubles, like the snapshot archive
+            arrays[-1] = arrays[-1].cast(pa.float64())
+            batch = pa.RecordBatch.from_arrays(arrays, names=headers)
+            if writer is None:
+                writer = pq.ParquetWriter(path, batch.schema, compression='zstd')
+            writer.write_batch(batch)
+            rows_written += len(rows)
+    if writer is not None:
+        writer.close()
+    return rows_written
+
+
+def merge_csv(path: str, updates: io.StringIO, tmp_path: str) -> tuple[int, int]:
     """
-    Fetch all unique samples from the wholesaler_tracking.blupax table
-    based on description, product_size, manufacturer_name, brand, strength, branding_type, generic_name, with minimum price.
-    
+    Merges aggregated samples into an existing CSV file of samples.
+
+    The file is streamed row by row: samples with a lower new minimum price are updated in place and
+    samples missing from the file are appended, so only the updates are held in memory.
+
     Returns:
-        List of unique tuples (description, product_size, manufacturer_name, brand, strength, branding_type, generic_name, min_price), or None if an error occurs.
+        The numbers of updated and appended samples.
+    """
+    # Samples by their attributes, as they appear in the CSV file
+    pending = {tuple(row[:-1]): row[-1] for row in csv.reader(updates)}
+    updated = 0
+    with open(path, encoding='utf-8', newline='') as source, open(tmp_path, 'w', encoding='utf-8', newline='') as target:
+        reader = csv.reader(source)
+        writer = csv.writer(target)
+        writer.writerow(next(reader))
+        for row in reader:
+            price = pending.pop(tuple(row[:-1]), None)
+            if price and (not row[-1] or float(price) < float(row[-1])):
+                row[-1] = price
+                updated += 1
+            writer.writerow(row)
+        for attributes, price in pending.items():
+            writer.writerow([*attributes, price])
+    return updated, len(pending)
+
+
+def export_samples(wholesaler: str, output_dir: str, file_format: str = 'csv', since: datetime | None = None) -> dict | None:
+    """
+    Exports the unique samples of a wholesaler on its own connection.
+
+    Args:
+        wholesaler: 'parmed' or 'blupax'.
+        output_dir: The directory of the output file.
+        file_format: 'csv' or 'parquet'.
+        since: The watermark of the previous export, to merge only the rows written after it into
+            the existing CSV file. The whole file is exported when None.
+
+    Returns:
+        The new watermark and counts of the export, or None if an error occurs.
     """
     # Get Postgres connection string from environment
     pg_conn_str = os.environ.get("POSTGRES_CONNECTION_STRING")
@@ -85,124 +203,122 @@ def fetch_unique_blupax_samples() -> Optional[List[tuple]]:
         print("Error: POSTGRES_CONNECTION_STRING is not set in environment variables.")
         print("Please set this environment variable and try again.")
         return None
-    
-    # SQL query to fetch unique combinations for blupax with minimum price
-    sql_query = """
-    SELECT description, product_size, manufacturer_name, brand, strength, branding_type, generic_name, MIN(unit_price) as min_price
-    FROM wholesaler_tracking.blupax 
-    WHERE description IS NOT NULL 
-    AND description != '' 
-    GROUP BY description, product_size, manufacturer_name, brand, strength, branding_type, generic_name
-    ORDER BY description, product_size, manufacturer_name, brand, strength, branding_type, generic_name;
-    """
-    print(sql_query)
+
+    export = EXPORTS[wholesaler]
+    path = os.path.join(output_dir, f"{export['filename']}.{file_format}")
+    tmp_path = path + '.tmp'
     try:
-        # Connect to database
-        print("Connecting to database for blupax...")
+        print(f"Connecting to database for {wholesaler}...")
         conn = psycopg2.connect(dsn=pg_conn_str)
-        
+        # One snapshot for the watermark and the export, so rows written meanwhile are left to the next run
+        conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+
         with conn:
             with conn.cursor() as cur:
-                # Execute the query
-                print("Executing query to fetch unique blupax samples...")
-                cur.execute(sql_query)
-                
-                # Fetch all results
-                results = cur.fetchall()
-                
-                # Return the tuples as-is
-                print(f"Found {len(results)} unique blupax combinations.")
-                return results
-                
+                watermark = get_watermark(cur, wholesaler)
+                if since is not None:
+                    parameters = {
+                        'wholesaler': wholesaler,
+                        'price_field': export['price_field'],
+                        'since': since - WATERMARK_OVERLAP,
+                    }
+                    query = cur.mogrify(build_incremental_query(wholesaler), parameters).decode()
+                else:
+                    query = build_full_query(wholesaler)
+
+                if since is not None:
+                    print(f"Merging {wholesaler} samples written since {since.isoformat()}...")
+                    updates = io.StringIO()
+                    copy_to_csv(cur, query, updates)
+                    updates.seek(0)
+                    updated, added = merge_csv(path, updates, tmp_path)
+                    result = {'updated': updated, 'added': added}
+                elif file_format == 'parquet':
+                    print(f"Exporting {wholesaler} samples to Parquet...")
+                    result = {'rows': export_parquet(conn, query, tmp_path, export['headers'])}
+                else:
+                    print(f"Exporting {wholesaler} samples to CSV...")
+                    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                        copy_to_csv(cur, query, f, export['headers'])
+                    # psycopg2 sets the row count from the COPY command tag
+                    result = {'rows': cur.rowcount if cur.rowcount >= 0 else None}
+
+        # Readers never see a partial file
+        if os.path.exists(tmp_path):
+            os.replace(tmp_path, path)
+        print(f"{wholesaler}: {result} saved to '{path}'")
+        watermark = watermark or since
+        return {**result, 'watermark': watermark.isoformat() if watermark else None}
+
     except psycopg2.Error as e:
-        print(f"Database error occurred for blupax: {e}")
+        print(f"Database error occurred for {wholesaler}: {e}")
         return None
     except Exception as e:
-        print(f"An unexpected error occurred for blupax: {e}")
+        print(f"An unexpected error occurred for {wholesaler}: {e}")
         return None
     finally:
         if 'conn' in locals():
             conn.close()
-            print("Database connection closed.")
+            print(f"Database connection closed for {wholesaler}.")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def load_state(path: str) -> dict:
+    """Returns the export watermarks by wholesaler."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(path: str, state: dict):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
 
-def save_to_file(samples: List[tuple], filename: str, headers: List[str]) -> None:
-    """
-    Save the unique samples to a CSV file.
-    
-    Args:
-        samples: List of unique tuples 
-        filename: Output filename
-        headers: List of column headers
-    """
-    try:
-        with open(filename, 'w', encoding='utf-8', newline='') as f:
-            writer = csv.writer(f)
-            
-            # Write header
-            writer.writerow(headers)
-            
-            # Write data rows
-            for row in samples:
-                writer.writerow(row)
-                
-        print(f"Results saved to '{filename}'")
-    except Exception as e:
-        print(f"Error saving to file: {e}")
 
 def main():
     """Main function to run the script."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=("csv", "parquet"), default="csv", help="The output file format.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only merge the samples written since the previous export. CSV only.")
+    parser.add_argument("--output-dir", default=os.path.dirname(os.path.abspath(__file__)))
+    args = parser.parse_args()
+
+    if args.incremental and args.format != 'csv':
+        parser.error("--incremental is only supported for the CSV format.")
+
+    state_path = os.path.join(args.output_dir, "export_state.json")
+    state = load_state(state_path)
+
+    def export(wholesaler: str) -> dict | None:
+        path = os.path.join(args.output_dir, f"{EXPORTS[wholesaler]['filename']}.{args.format}")
+        watermark = state.get(wholesaler, {}).get('watermark') if args.incremental else None
+        if watermark is not None and not os.path.exists(path):
+            watermark = None
+        since = datetime.fromisoformat(watermark) if watermark else None
+        if args.incremental and since is None:
+            print(f"No previous export of {wholesaler}, exporting all samples.")
+        return export_samples(wholesaler, args.output_dir, args.format, since)
+
     print("Fetching unique samples from both wholesaler tracking tables...")
     print("=" * 70)
-    
-    # Get script directory for file saving
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # Fetch ParMed samples
-    print("\n1. PARMED TABLE")
-    print("Based on: description, manufacturer, strength, packQuantity")
-    print("-" * 60)
-    
-    parmed_samples = fetch_unique_parmed_samples()
-    
-    if parmed_samples is None:
-        print("Failed to fetch parmed samples.")
-    else:
-        print(f"Total unique parmed samples found: {len(parmed_samples)}")
-
-        # Save parmed samples
-        parmed_filename = os.path.join(script_dir, "unique_parmed_samples.csv")
-        parmed_headers = ["Description", "Manufacturer", "Brand Name", "Strength", "Label Size", "Pack Quantity", "Min Price"]
-        save_to_file(parmed_samples, parmed_filename, parmed_headers)
-    
-    # Fetch BluPax samples
-    print("\n2. BLUPAX TABLE")
-    print("Based on: description, product_size, manufacturer_name, brand, strength, branding_type, generic_name")
-    print("-" * 90)
-    
-    blupax_samples = fetch_unique_blupax_samples()
-    
-    if blupax_samples is None:
-        print("Failed to fetch blupax samples.")
-    else:
-        print(f"Total unique blupax samples found: {len(blupax_samples)}")
-        
-        # Save blupax samples
-        blupax_filename = os.path.join(script_dir, "unique_blupax_samples.csv")
-        blupax_headers = ["Description", "Product Size", "Manufacturer Name", "Brand", "Strength", "Branding Type", "Generic Name", "Min Price"]
-        save_to_file(blupax_samples, blupax_filename, blupax_headers)
-    
+
+    # psycopg2 releases the GIL while waiting for the server, so threads export both wholesalers at once
+    with ThreadPoolExecutor(max_workers=len(EXPORTS)) as executor:
+        results = dict(zip(EXPORTS, executor.map(export, EXPORTS)))
+
     print("\n" + "=" * 70)
+    for wholesaler, result in results.items():
+        if result is None:
+            print(f"{wholesaler}: failed, the previous export is kept.")
+            continue
+        if args.format == 'csv' and result['watermark'] is not None:
+            state[wholesaler] = {'watermark': result['watermark']}
+        print(f"{wholesaler}: {', '.join(f'{key} {value}' for key, value in result.items() if key != 'watermark')}")
+    save_state(state_path, state)
     print("Script completed!")
-    
-    # Show summary
-    if parmed_samples is not None and blupax_samples is not None:
-        print(f"Summary: {len(parmed_samples)} parmed samples, {len(blupax_samples)} blupax samples")
-    elif parmed_samples is not None:
-        print(f"Summary: {len(parmed_samples)} parmed samples (blupax failed)")
-    elif blupax_samples is not None:
-        print(f"Summary: {len(blupax_samples)} blupax samples (parmed failed)")
-    else:
-        print("Summary: Both tables failed to fetch")
 
 
 if __name__ == "__main__":
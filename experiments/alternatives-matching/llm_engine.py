@@ -0,0 +1,240 @@
+"""
+Concurrent, rate-limited execution of LLM calls for the alternatives-matching experiment.
+
+LLMEngine runs many `client.responses.create` calls at once while staying under the
+requests-per-minute and tokens-per-minute limits of the account. Calls rejected with a rate-limit
+or transient server error are retried with exponential backoff, honoring Retry-After.
+
+Journal is an append-only JSON Lines file of finished calls. Every result is appended and flushed
+as soon as it arrives, so a crashed run loses at most the calls in flight and a re-run only makes
+the calls missing from the journal.
+
+StubClient stands in for the OpenAI client to try the engine without an API key or costs.
+"""
+
+import os
+import json
+import time
+import random
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Roughly estimates the tokens of some texts, about four characters per token."""
+    return sum(len(text) for text in texts) // 4 + 1
+
+
+class RateBudget:
+    """
+    Token buckets for the requests and tokens allowed per minute.
+
+    Both buckets start full and refill continuously at their per-minute rate. Callers acquire a
+    request and its estimated tokens in arrival order, so a large call is not starved by small ones.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.requests = float(requests_per_minute)
+        self.tokens = float(tokens_per_minute)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.requests = min(self.requests_per_minute, self.requests + elapsed * self.requests_per_minute / 60)
+        self.tokens = min(self.tokens_per_minute, self.tokens + elapsed * self.tokens_per_minute / 60)
+
+    async def acquire(self, tokens: int):
+        """Waits until one request and the given number of tokens are available and takes them."""
+        # A call larger than the whole budget waits for a full bucket instead of forever
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.requests >= 1 and self.tokens >= tokens:
+                    self.requests -= 1
+                    self.tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self.requests) * 60 / self.requests_per_minute,
+                    (tokens - self.tokens) * 60 / self.tokens_per_minute,
+                )
+                await asyncio.sleep(wait)
+
+    def adjust(self, tokens: int):
+        """Charges (or refunds) the difference between the estimated and the actual tokens of a call."""
+        self._refill()
+        self.tokens = min(self.tokens_per_minute, self.tokens - tokens)
+
+
+def get_status_code(error: Exception) -> int | None:
+    """Returns the HTTP status code of an API error, if it has one."""
+    status_code = getattr(error, 'status_code', None)
+    if status_code is None and getattr(error, 'response', None) is not None:
+        status_code = getattr(error.response, 'status_code', None)
+    return status_code
+
+
+def get_retry_after(error: Exception) -> float | None:
+    """Returns the Retry-After delay in seconds of an API error, if the server sent one."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Returns whether a failed call should be retried: rate limits, server errors, timeouts and connection errors."""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    # openai.APITimeoutError and openai.APIConnectionError have no status code
+    if type(error).__name__ in ('APITimeoutError', 'APIConnectionError'):
+        return True
+    return get_status_code(error) in RETRYABLE_STATUS_CODES
+
+
+class LLMEngine:
+    """Runs LLM calls concurrently under a rate budget, with retries."""
+
+    def __init__(self, client, budget: RateBudget, max_concurrency: int = 16, max_attempts: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 60.0, output_tokens: int = 300):
+        """
+        Initializes the engine.
+
+        Args:
+            client: An async client with `responses.create(**kwargs)`, e.g. openai.AsyncOpenAI or StubClient.
+            budget: The requests and tokens allowed per minute.
+            max_concurrency: The maximum number of calls in flight.
+            max_attempts: The maximum number of attempts per call, including the first one.
+            base_delay: The delay in seconds before the first retry, doubled with every attempt.
+            max_delay: The upper bound of a single delay in seconds.
+            output_tokens: The tokens reserved for the answer of a call, on top of the prompt.
+        """
+        self.client = client
+        self.budget = budget
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.output_tokens = output_tokens
+        self.calls = 0
+        self.retries = 0
+
+    async def create(self, prompt_text: str, **kwargs) -> Any:
+        """
+        Calls `client.responses.create(**kwargs)` once the budget allows it.
+
+        Args:
+            prompt_text: The variable part of the prompt, used to estimate the tokens of the call.
+            **kwargs: The arguments of `responses.create`.
+
+        Returns:
+            The response of the client.
+        """
+        estimate = estimate_tokens(prompt_text) + self.output_tokens
+        for attempt in range(1, self.max_attempts + 1):
+            await self.budget.acquire(estimate)
+            try:
+                async with self.semaphore:
+                    self.calls += 1
+                    response = await self.client.responses.create(**kwargs)
+            except Exception as e:
+                if attempt == self.max_attempts or not is_retryable(e):
+                    raise
+                self.retries += 1
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+                retry_after = get_retry_after(e)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                print(f"LLM call failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s (attempt {attempt}/{self.max_attempts})")
+                await asyncio.sleep(delay)
+                continue
+
+            usage = getattr(response, 'usage', None)
+            total_tokens = getattr(usage, 'total_tokens', None)
+            if isinstance(total_tokens, int):
+                self.budget.adjust(total_tokens - estimate)
+            return response
+
+
+class Journal:
+    """An append-only JSON Lines file of finished calls, keyed by record['key']."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> dict[str, dict]:
+        """
+        Returns the records of previous runs by key, the last record of a key winning.
+
+        A line cut off by a crash is skipped, its call is simply made again.
+        """
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record['key']] = record
+        return records
+
+    def append(self, record: dict):
+        """Appends a record and flushes it to disk."""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class RateLimitError(Exception):
+    """The error of StubClient for a rejected call, shaped like openai.RateLimitError."""
+
+    def __init__(self, message: str, retry_after: float | None = None):
+        super().__init__(message)
+        self.status_code = 429
+        headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+        self.response = SimpleNamespace(status_code=429, headers=headers)
+
+
+class StubClient:
+    """
+    A local stand-in for openai.AsyncOpenAI that answers after a random latency.
+
+    It picks the first alternative of the prompt and rejects a share of the calls with a 429, so that
+    the concurrency, the budget and the retries can be tried without calling the API.
+    """
+
+    def __init__(self, latency: tuple[float, float] = (0.5, 2.0), rate_limit_share: float = 0.05):
+        self.latency = latency
+        self.rate_limit_share = rate_limit_share
+        self.responses = SimpleNamespace(create=self._create)
+
+    async def _create(self, prompt: dict, **kwargs) -> SimpleNamespace:
+        await asyncio.sleep(random.uniform(*self.latency))
+        if random.random() < self.rate_limit_share:
+            raise RateLimitError("Rate limit reached (stub)", retry_after=1.0)
+        variables = prompt.get('variables', {})
+        alternatives = json.loads(variables.get('alternatives') or '[]')
+        answer = {
+            'alternative_index': 0 if alternatives else -1,
+            'reasoning': 'Stub answer: the first alternative.',
+        }
+        prompt_tokens = estimate_tokens(*(str(value) for value in variables.values()))
+        return SimpleNamespace(
+            output_text=json.dumps(answer),
+            usage=SimpleNamespace(input_tokens=prompt_tokens, output_tokens=20, total_tokens=prompt_tokens + 20),
+        )
+
@@ -0,0 +1,84 @@
+"""
+Candidate retrieval for the alternatives-matching experiment.
+
+KeywordIndex answers "which texts contain this keyword as a substring" without scanning every text.
+It keeps an inverted index from character n-grams to the texts containing them: a text can only
+contain a keyword if it contains all of the keyword's n-grams, so intersecting their postings gives
+a small candidate set, which is then verified with the same `in` check as a full scan. Results are
+therefore identical to scanning all texts, only the texts that are checked differ.
+"""
+
+from collections import defaultdict
+from typing import Iterable, Sequence
+
+
+def get_keywords(description: str, ingredient: str) -> tuple[str, str]:
+    """Returns the ingredient and description keywords of a report row, two words when the first is short."""
+    keyword_1 = ingredient.split(' ')[0].lower()
+    if len(keyword_1) <= 3:
+        words = ingredient.split(' ')
+        keyword_1 = words[1].lower() + ' ' + words[2].lower()
+    keyword_2 = description.split(' ')[0].lower()
+    if len(keyword_2) <= 3:
+        words = description.split(' ')
+        keyword_2 = words[1].lower() + ' ' + words[2].lower()
+    return keyword_1, keyword_2
+
+
+class KeywordIndex:
+    """An n-gram inverted index over a list of texts for exact substring search."""
+
+    def __init__(self, texts: Sequence[str], n: int = 3):
+        """
+        Builds the index.
+
+        Args:
+            texts: The texts to search, already normalized the way keywords are (e.g. lowercased).
+            n: The n-gram length. Keywords shorter than n fall back to scanning all texts.
+        """
+        self.texts = list(texts)
+        self.n = n
+        # Postings are lists in text order, as appending is cheaper than adding to sets
+        postings = defaultdict(list)
+        for i, text in enumerate(self.texts):
+            for gram in {text[j:j + n] for j in range(len(text) - n + 1)}:
+                postings[gram].append(i)
+        self.postings = dict(postings)
+        self._cache: dict[str, frozenset[int]] = {}
+
+    def _candidates(self, keyword: str) -> Iterable[int]:
+        """Returns the texts containing every n-gram of the keyword, rarest n-gram first."""
+        if len(keyword) < self.n:
+            return range(len(self.texts))
+        grams = {keyword[j:j + self.n] for j in range(len(keyword) - self.n + 1)}
+        lists = sorted((self.postings.get(gram, []) for gram in grams), key=len)
+        candidates = set(lists[0])
+        for postings in lists[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(postings)
+        return candidates
+
+    def search(self, keyword: str) -> frozenset[int]:
+        """Returns the indices of the texts containing the keyword. Results are cached per keyword."""
+        result = self._cache.get(keyword)
+        if result is None:
+            texts = self.texts
+            result = frozenset(i for i in self._candidates(keyword) if keyword in texts[i])
+            self._cache[keyword] = result
+        return result
+
+    def clear_cache(self):
+        """Forgets the cached search results."""
+        self._cache.clear()
+
+    def search_any(self, keywords: Iterable[str]) -> list[int]:
+        """Returns the sorted indices of the texts containing any of the keywords."""
+        found = set()
+        for keyword in keywords:
+            found |= self.search(keyword)
+        return sorted(found)
+
+    def search_batch(self, queries: Iterable[Sequence[str]]) -> list[list[int]]:
+        """Returns the search_any() result of every query, a query being a sequence of keywords."""
+        return [self.search_any(keywords) for keywords in queries]
@@ -1,100 +1,148 @@
+#!/usr/bin/env python3
+"""
+Selects the best ParMed and BluPax alternative of every preprocessed report row with the LLM.
+
+The calls run concurrently through LLMEngine (llm_engine.py), under the requests and tokens per
+minute of the account, and the ParMed and BluPax calls of a row run in parallel. Every answer is
+appended to a journal as soon as it arrives, keyed by the row, the wholesaler and a hash of the
+alternatives sent. A re-run, e.g. after a crash, only makes the calls missing from the journal, and
+calls whose alternatives changed since their answer was journaled. The output CSV is written once from the journal at the end.
+
+Usage:
+    python experiments/alternatives-matching/predict.py [--concurrency 16] [--rpm 500] [--tpm 200000]
+    python experiments/alternatives-matching/predict.py --stub  # a local stand-in for the API
+"""
+
+import os
 import json
+import time
+import hashlib
+import asyncio
+import argparse
+
 import dotenv
 import pandas as pd
 
-from openai import OpenAI
-
+from llm_engine import Journal, LLMEngine, RateBudget, StubClient
 
 dotenv.load_dotenv()
 
-client = OpenAI()
 dir_path = "experiments/alternatives-matching/"
+PROMPT_ID = "pmpt_686e6e307768819395b8d349ed4c12f10341e5bc38652685"
+WHOLESALERS = ("parmed", "blupax")
+RESULT_COLUMNS = ("alternatives", "alternative_index", "alternative_reasoning", "alternative_price", "alternative_description")
+
 
-df = pd.read_csv(dir_path + "product-report-top-1000-preprocessed.csv")
-output_file = dir_path + "product-report-top-1000-alternative-predictions.csv"
+def get_alternatives(row, wholesaler: str, texts: list[str]) -> str:
+    """Returns the alternatives payload of a report row, the wholesaler catalog entries of its candidates."""
+    indices = json.loads(row[f'index_{wholesaler}'])
+    return json.dumps([{'index': k, 'drug': texts[i]} for k, i in enumerate(indices)])
 
-df_parmed = pd.read_csv(dir_path + "unique_parmed_samples.csv")
-df_blupax = pd.read_csv(dir_path + "unique_blupax_samples.csv")
 
-df_parmed['text'] = df_parmed.apply(lambda x: x.to_json().lower(), axis=1)
-texts_parmed = list(df_parmed['text'].values)
-df_blupax['text'] = df_blupax.apply(lambda x: x.to_json().lower(), axis=1)
-texts_blupax = list(df_blupax['text'].values)
+def get_key(row, wholesaler: str, alternatives: str) -> str:
+    """
+    Returns the journal key of the call for a report row, a wholesaler and its alternatives payload.
 
-df['alternatives_parmed'] = None
-df['alternative_index_parmed'] = None
-df['alternative_reasoning_parmed'] = None
-df['alternative_price_parmed'] = None
-df['alternative_description_parmed'] = None
+    The key includes a hash of the payload, so an answer is not reused once the candidates or the
+    catalog texts changed, e.g. after a new fetch or with a different ranking.
+    """
+    digest = hashlib.sha1(alternatives.encode('utf-8')).hexdigest()[:12]
+    return f"{row['ABC #']}:{wholesaler}:{digest}"
 
-df['alternatives_blupax'] = None
-df['alternative_index_blupax'] = None
-df['alternative_reasoning_blupax'] = None
-df['alternative_price_blupax'] = None
-df['alternative_description_blupax'] = None
 
-for idx, row in df.iterrows():
-    print(idx)
+async def predict(engine: LLMEngine, journal: Journal, row, wholesaler: str, df_catalog: pd.DataFrame, texts: list[str]):
+    """Asks the LLM for the best alternative of a row in a wholesaler catalog and journals the answer."""
     source = row[['Product Description', 'Primary Ingredient HIC4 Desc', 'Supplier Name', 'Route Desc']].to_json()
-    print('Source:\n', source)
-
-    if row['found_parmed']:
-        indices = json.loads(row['index_parmed'])
-        alternatives = list(df_parmed.iloc[indices]['text'].values)
-        alternatives = [{'index': k, 'drug': alternative} for k, alternative in enumerate(alternatives)]
-        print('Alternatives (Parmed):\n', alternatives)
-        alternatives = json.dumps(alternatives)
-        df.at[idx, 'alternatives_parmed'] = alternatives
-
-        response = client.responses.create(
-            prompt={
-                "id": "pmpt_686e6e307768819395b8d349ed4c12f10341e5bc38652685",
-                "variables": {
-                    "source": source,
-                    "alternatives": alternatives,
-                }
-            }
-        )
-        response_data = json.loads(response.output_text)
-        if 0 <= int(response_data['alternative_index']) <= len(indices) - 1:
-            alternative_index = indices[int(response_data['alternative_index'])]
-            df.at[idx, 'alternative_index_parmed'] = alternative_index
-            df.at[idx, 'alternative_price_parmed'] = df_parmed.iloc[alternative_index]['Min Price']
-            df.at[idx, 'alternative_description_parmed'] = df_parmed.iloc[alternative_index]['Description']
-            print('Alternative found (Parmed):\n', df_parmed.iloc[alternative_index]['Description'])
-        else:
-            df.at[idx, 'alternative_index_parmed'] = -1
-
-        df.at[idx, 'alternative_reasoning_parmed'] = response_data['reasoning']
-        
-
-    if row['found_blupax']:
-        indices = json.loads(row['index_blupax'])
-        alternatives = list(df_blupax.iloc[indices]['text'].values)
-        alternatives = [{'index': k, 'drug': alternative} for k, alternative in enumerate(alternatives)]
-        print('Alternatives (Blupax):\n', alternatives)
-        alternatives = json.dumps(alternatives)
-        df.at[idx, 'alternatives_blupax'] = alternatives
-
-        response = client.responses.create(
-            prompt={
-                "id": "pmpt_686e6e307768819395b8d349ed4c12f10341e5bc38652685",
-                "variables": {
-                    "source": source,
-                    "alternatives": alternatives,
-                }
-            }
+    indices = json.loads(row[f'index_{wholesaler}'])
+    alternatives = get_alternatives(row, wholesaler, texts)
+    record = {'key': get_key(row, wholesaler, alternatives), 'alternatives': alternatives}
+    try:
+        response = await engine.create(
+            source + alternatives,
+            prompt={"id": PROMPT_ID, "variables": {"source": source, "alternatives": alternatives}},
         )
         response_data = json.loads(response.output_text)
-        if 0 <= int(response_data['alternative_index']) <= len(indices) - 1:
-            alternative_index = indices[int(response_data['alternative_index'])]
-            df.at[idx, 'alternative_index_blupax'] = alternative_index
-            df.at[idx, 'alternative_price_blupax'] = df_blupax.iloc[alternative_index]['Min Price']
-            df.at[idx, 'alternative_description_blupax'] = df_blupax.iloc[alternative_index]['Description']
-            print('Alternative found (Blupax):\n', df_blupax.iloc[alternative_index]['Description'])
-        else:
-            df.at[idx, 'alternative_index_blupax'] = -1
-
-        df.at[idx, 'alternative_reasoning_blupax'] = response_data['reasoning']
-
-    df.to_csv(output_file, index=False)
+        alternative_index = int(response_data['alternative_index'])
+    except Exception as e:
+        # Failed calls are not journaled, so the next run tries them again
+        print(f"Error predicting the {wholesaler} alternative of {row['Product Description']}: {e}")
+        return
+
+    if 0 <= alternative_index <= len(indices) - 1:
+        alternative = df_catalog.iloc[indices[alternative_index]]
+        record['alternative_index'] = indices[alternative_index]
+        record['alternative_price'] = alternative['Min Price']
+        record['alternative_description'] = alternative['Description']
+        print(f"Alternative found ({wholesaler}): {row['Product Description']} -> {alternative['Description']}")
+    else:
+        record['alternative_index'] = -1
+    record['alternative_reasoning'] = response_data.get('reasoning')
+    journal.append(record)
+
+
+async def predict_all(engine: LLMEngine, journal: Journal, df: pd.DataFrame, catalogs: dict) -> int:
+    """Runs the calls missing from the journal, ParMed and BluPax in parallel. Returns the number of calls."""
+    done = set(journal.load())
+    tasks = [
+        predict(engine, journal, row, wholesaler, *catalogs[wholesaler])
+        for _, row in df.iterrows()
+        for wholesaler in WHOLESALERS
+        if row[f'found_{wholesaler}']
+        and get_key(row, wholesaler, get_alternatives(row, wholesaler, catalogs[wholesaler][1])) not in done
+    ]
+    print(f"{len(done)} calls journaled by previous runs, {len(tasks)} to make")
+    await asyncio.gather(*tasks)
+    return len(tasks)
+
+
+def merge_journal(df: pd.DataFrame, journal: Journal, catalogs: dict) -> pd.DataFrame:
+    """Adds the journaled answers to the report rows, skipping answers given for other alternatives."""
+    records = journal.load()
+    for wholesaler in WHOLESALERS:
+        texts = catalogs[wholesaler][1]
+        row_records = [
+            records.get(get_key(row, wholesaler, get_alternatives(row, wholesaler, texts)), {})
+            if row[f'found_{wholesaler}'] else {}
+            for _, row in df.iterrows()
+        ]
+        for column in RESULT_COLUMNS:
+            df[f'{column}_{wholesaler}'] = [record.get(column) for record in row_records]
+    return df
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum calls in flight.")
+    parser.add_argument("--rpm", type=float, default=500, help="Requests per minute allowed.")
+    parser.add_argument("--tpm", type=float, default=200_000, help="Tokens per minute allowed.")
+    parser.add_argument("--stub", action="store_true", help="Use a local stub instead of the OpenAI API.")
+    parser.add_argument("--journal", default=dir_path + "product-report-top-1000-alternative-predictions.jsonl")
+    parser.add_argument("--output", default=dir_path + "product-report-top-1000-alternative-predictions.csv")
+    args = parser.parse_args()
+
+    df = pd.read_csv(dir_path + "product-report-top-1000-preprocessed.csv")
+    catalogs = {}
+    for wholesaler in WHOLESALERS:
+        df_catalog = pd.read_csv(dir_path + f"unique_{wholesaler}_samples.csv")
+        texts = list(df_catalog.apply(lambda x: x.to_json().lower(), axis=1).values)
+        catalogs[wholesaler] = (df_catalog, texts)
+
+    if args.stub:
+        client = StubClient()
+    else:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI()
+    engine = LLMEngine(client, RateBudget(args.rpm, args.tpm), max_concurrency=args.concurrency)
+    journal = Journal(args.journal)
+
+    start = time.perf_counter()
+    calls = await predict_all(engine, journal, df, catalogs)
+    elapsed = time.perf_counter() - start
+    print(f"Made {calls} calls in {elapsed:.1f}s ({engine.calls} attempts, {engine.retries} retries)")
+
+    merge_journal(df, journal, catalogs).to_csv(args.output, index=False)
+    print(f"Saved {len(df)} rows to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,12 @@
 # %%
+import os
 import json
+import time
 import pandas as pd
 
+from matching_index import KeywordIndex, get_keywords
+from candidate_ranking import build_ranker, report_fields
+
 dir_path = "experiments/alternatives-matching/"
 
 df_parmed = pd.read_csv(dir_path + "unique_parmed_samples.csv")
@@ -9,6 +14,10 @@ df_blupax = pd.read_csv(dir_path + "unique_blupax_samples.csv")
 df_report = pd.read_csv(dir_path + "product-report-top-1000-generic-predictions.csv", low_memory=False)
 
 output_file = dir_path + "product-report-top-1000-preprocessed.csv"
+# The keyword matches are ranked and only the best ones are passed to predict.py
+top_k = int(os.environ.get("ALTERNATIVES_TOP_K", 10))
+if top_k < 1:
+    raise ValueError(f"ALTERNATIVES_TOP_K must be at least 1, got {top_k}.")
 
 print(df_parmed.shape)
 print(df_blupax.shape)
@@ -30,41 +39,33 @@ texts_blupax = list(df_blupax['text'].values)
 texts_parmed = list(df_parmed['text'].values)
 
 # %%
-df_report['found_blupax'] = False
-df_report['found_parmed'] = False
-df_report['index_blupax'] = None
-df_report['index_parmed'] = None
-df_report['counter_blupax'] = 0
-df_report['counter_parmed'] = 0
-
+# The indexes are built once and return the same indices as checking every text with `in`
+start = time.perf_counter()
+index_blupax = KeywordIndex(texts_blupax)
+index_parmed = KeywordIndex(texts_parmed)
+queries = [
+    get_keywords(description, ingredient)
+    for description, ingredient in zip(df_report['Product Description'], df_report['Primary Ingredient HIC4 Desc'])
+]
+indices_blupax = index_blupax.search_batch(queries)
+indices_parmed = index_parmed.search_batch(queries)
+print(f"Matched {len(queries)} report rows in {time.perf_counter() - start:.2f}s")
 
-for idx, row in df_report.iterrows():
-    keyword_1 = row['Primary Ingredient HIC4 Desc'].split(' ')[0].lower()
-    if len(keyword_1) <= 3:
-        keyword_1_list = row['Primary Ingredient HIC4 Desc'].split(' ')
-        keyword_1 = keyword_1_list[1].lower() + ' ' + keyword_1_list[2].lower()
-    keyword_2 = row['Product Description'].split(' ')[0].lower()
-    if len(keyword_2) <= 3:
-        keyword_2_list = row['Product Description'].split(' ')
-        keyword_2 = keyword_2_list[1].lower() + ' ' + keyword_2_list[2].lower()
-
-    indices_blupax = []
-    for i, text in enumerate(texts_blupax):
-        if keyword_1 in text or keyword_2 in text:
-            indices_blupax.append(i)
-    if len(indices_blupax) > 0:
-        df_report.loc[idx, 'found_blupax'] = True
-        df_report.loc[idx, 'index_blupax'] = json.dumps(indices_blupax)
-        df_report.loc[idx, 'counter_blupax'] = len(indices_blupax)
+# %%
+# The matches are ranked by TF-IDF similarity of descriptions, strengths and manufacturers, best first
+start = time.perf_counter()
+fields = report_fields(df_report)
+ranked_blupax = build_ranker(df_blupax, 'blupax').top_k(fields, top_k, indices_blupax)
+ranked_parmed = build_ranker(df_parmed, 'parmed').top_k(fields, top_k, indices_parmed)
+print(f"Ranked the matches in {time.perf_counter() - start:.2f}s, keeping the top {top_k}")
 
-    indices_parmed = []
-    for i, text in enumerate(texts_parmed):
-        if keyword_1 in text or keyword_2 in text:
-            indices_parmed.append(i)
-    if len(indices_parmed) > 0:
-        df_report.loc[idx, 'found_parmed'] = True
-        df_report.loc[idx, 'index_parmed'] = json.dumps(indices_parmed)
-        df_report.loc[idx, 'counter_parmed'] = len(indices_parmed)
+df_report['found_blupax'] = [len(indices) > 0 for indices in indices_blupax]
+df_report['found_parmed'] = [len(indices) > 0 for indices in indices_parmed]
+df_report['index_blupax'] = [json.dumps(indices) if indices else None for indices in ranked_blupax]
+df_report['index_parmed'] = [json.dumps(indices) if indices else None for indices in ranked_parmed]
+# The number of keyword matches, before ranking
+df_report['counter_blupax'] = [len(indices) for indices in indices_blupax]
+df_report['counter_parmed'] = [len(indices) for indices in indices_parmed]
 
 
 print(df_report[['found_parmed', 'found_blupax']].value_counts())
@@ -0,0 +1,210 @@
+"""
+Persistent cache and batch submission for the generic classification experiment.
+
+ClassificationCache stores the answer of the classification prompt per NDC in SQLite, keyed by
+NDC, prompt id and prompt version, so a re-run or a new report drop only sends the NDCs that were
+never classified with the current prompt. Changing the prompt version invalidates the cache.
+
+Unseen NDCs are classified in batches. OpenAIBatchRunner submits them to the Batch API, which costs
+less but answers within hours. LocalBatchRunner sends the same requests to the Responses API
+concurrently and returns results in the same format.
+"""
+
+import json
+import time
+import sqlite3
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+# The fields of the classification answer
+RESULT_FIELDS = ("brand_status", "generic_alternative_available", "generic_manufacturers", "reasoning")
+
+
+def normalize_ndc(value) -> str | None:
+    """Returns an NDC as 11 digits, read as it comes from the report, e.g. 68382039504.0 or '0069-0150-30'."""
+    if value is None or value != value:  # None or NaN
+        return None
+    text = str(value).strip()
+    if text.endswith('.0'):
+        text = text[:-2]
+    digits = ''.join(char for char in text if char.isdigit())
+    return digits.zfill(11) if digits else None
+
+
+def get_output_text(body: dict) -> str:
+    """Returns the text of a Responses API response body, which the SDK calls `output_text`."""
+    return ''.join(
+        content.get('text', '')
+        for item in body.get('output', [])
+        if item.get('type') == 'message'
+        for content in item.get('content', [])
+        if content.get('type') == 'output_text'
+    )
+
+
+class ClassificationCache:
+    """Classification results in a SQLite database, keyed by NDC, prompt id and prompt version."""
+
+    def __init__(self, path: str, prompt_id: str, prompt_version: str):
+        self.prompt_id = prompt_id
+        self.prompt_version = prompt_version
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS classifications (
+                ndc TEXT NOT NULL,
+                prompt_id TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                brand_status TEXT,
+                generic_alternative_available INTEGER,
+                generic_manufacturers TEXT,
+                reasoning TEXT,
+                input_tokens INTEGER,
+                output_tokens INTEGER,
+                classified_at TEXT NOT NULL,
+                PRIMARY KEY (ndc, prompt_id, prompt_version)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get_many(self, ndcs) -> dict[str, dict]:
+        """Returns the cached results of the NDCs by NDC, for the current prompt id and version."""
+        results = {}
+        ndcs = list(ndcs)
+        # SQLite limits the number of parameters of a statement
+        for i in range(0, len(ndcs), 500):
+            chunk = ndcs[i:i + 500]
+            rows = self.conn.execute(
+                f"""
+                SELECT ndc, brand_status, generic_alternative_available, generic_manufacturers, reasoning,
+                       input_tokens, output_tokens
+                FROM classifications
+                WHERE prompt_id = ? AND prompt_version = ? AND ndc IN ({', '.join('?' * len(chunk))})
+                """,
+                (self.prompt_id, self.prompt_version, *chunk)
+            )
+            for ndc, brand_status, available, manufacturers, reasoning, input_tokens, output_tokens in rows:
+                results[ndc] = {
+                    'brand_status': brand_status,
+                    'generic_alternative_available': bool(available) if available is not None else None,
+                    'generic_manufacturers': manufacturers,
+                    'reasoning': reasoning,
+                    'input_tokens': input_tokens,
+                    'output_tokens': output_tokens,
+                }
+        return results
+
+    def put_many(self, results: dict[str, dict]):
+        """Stores results by NDC in one transaction, replacing older results of the same prompt version."""
+        now = datetime.now(timezone.utc).isoformat()
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT OR REPLACE INTO classifications (
+                    ndc, prompt_id, prompt_version, brand_status, generic_alternative_available,
+                    generic_manufacturers, reasoning, input_tokens, output_tokens, classified_at
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (
+                        ndc, self.prompt_id, self.prompt_version, result['brand_status'],
+                        result['generic_alternative_available'], result['generic_manufacturers'], result['reasoning'],
+                        result.get('input_tokens'), result.get('output_tokens'), now,
+                    )
+                    for ndc, result in results.items()
+                ]
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+def parse_result(body: dict) -> dict:
+    """Parses a Responses API response body into a cache result. Raises ValueError if the answer is not valid."""
+    response_data = json.loads(get_output_text(body))
+    usage = body.get('usage') or {}
+    available = response_data.get('generic_alternative_available')
+    return {
+        'brand_status': response_data.get('brand_status', ''),
+        'generic_alternative_available': available if isinstance(available, bool) else str(available).lower() == 'true',
+        'generic_manufacturers': json.dumps(response_data.get('generic_manufacturers', [])),
+        'reasoning': response_data.get('reasoning', ''),
+        'input_tokens': usage.get('input_tokens'),
+        'output_tokens': usage.get('output_tokens'),
+    }
+
+
+def parse_batch_output(lines) -> tuple[dict[str, dict], dict[str, str]]:
+    """
+    Parses the output lines of a batch, in the format of the Batch API.
+
+    Returns:
+        The results by custom id (the NDC) and the errors by custom id.
+    """
+    results = {}
+    errors = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        custom_id = record['custom_id']
+        response = record.get('response') or {}
+        if record.get('error') or response.get('status_code') != 200:
+            errors[custom_id] = str(record.get('error') or response.get('body'))
+            continue
+        try:
+            results[custom_id] = parse_result(response['body'])
+        except (ValueError, KeyError) as e:
+            errors[custom_id] = f"Invalid answer: {e}"
+    return results, errors
+
+
+class LocalBatchRunner:
+    """Runs a batch against the Responses API with a few concurrent requests, answering in the Batch API format."""
+
+    def __init__(self, client, max_workers: int = 8):
+        self.client = client
+        self.max_workers = max_workers
+
+    def _run_request(self, request: dict) -> str:
+        try:
+            response = self.client.responses.create(**request['body'])
+            output = {'status_code': 200, 'body': response.model_dump()}
+            return json.dumps({'custom_id': request['custom_id'], 'response': output, 'error': None})
+        except Exception as e:
+            return json.dumps({'custom_id': request['custom_id'], 'response': None, 'error': {'message': str(e)}})
+
+    def run(self, requests: list[dict]) -> list[str]:
+        """Runs the requests and returns the output lines."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self._run_request, requests))
+
+
+class OpenAIBatchRunner:
+    """Submits a batch to the OpenAI Batch API and waits for its output."""
+
+    def __init__(self, client, poll_interval: float = 30.0):
+        self.client = client
+        self.poll_interval = poll_interval
+
+    def run(self, requests: list[dict]) -> list[str]:
+        """Uploads the requests, creates the batch, waits for it to end and returns the output lines."""
+        content = '\n'.join(json.dumps(request) for request in requests).encode()
+        input_file = self.client.files.create(file=('batch.jsonl', content), purpose='batch')
+        batch = self.client.batches.create(
+            input_file_id=input_file.id, endpoint='/v1/responses', completion_window='24h'
+        )
+        print(f"Submitted batch {batch.id} with {len(requests)} requests")
+        while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+            time.sleep(self.poll_interval)
+            batch = self.client.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            print(f"Batch {batch.id}: {batch.status}, {counts.completed}/{counts.total} done, {counts.failed} failed")
+
+        lines = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                lines.extend(self.client.files.content(file_id).text.splitlines())
+        return lines
@@ -1,68 +1,124 @@
+#!/usr/bin/env python3
+"""
+Classifies the products of the report as brand or generic with the LLM.
+
+Results are cached per NDC, prompt id and prompt version in a SQLite database, see
+classification_cache.py. Only NDCs missing from the cache are sent to the model, in batches of
+--batch-size requests, and each batch is stored before the next one is sent, so an interrupted run
+resumes where it stopped. The output CSV is written once at the end.
+
+Usage:
+    python experiments/generic-classification/predict.py [--limit 1000] [--backend batch]
+"""
+
+import os
+import argparse
+
 import dotenv
 import pandas as pd
-import json
 from openai import OpenAI
 
-dotenv.load_dotenv()
+from classification_cache import (
+    RESULT_FIELDS, ClassificationCache, LocalBatchRunner, OpenAIBatchRunner, normalize_ndc, parse_batch_output
+)
 
-client = OpenAI()
+dotenv.load_dotenv()
 
 dir_path = "experiments/generic-classification/"
-df = pd.read_csv(dir_path + 'product-report-full.csv')
-output_file = dir_path + 'product-report-top-1000-with-predictions.csv'
-
-print(df.shape)
-
-# Add new columns to the dataframe
-df['brand_status'] = None
-df['generic_alternative_available'] = None
-df['generic_manufacturers'] = None
-df['reasoning'] = None
-
-print(df.shape)
-
-for index, row in df.iterrows():
-    print(f"Processing row {index + 1}/{len(df)}: {row['Product Description']}")
-    
-    try:
-        response = client.responses.create(
-            prompt={
-                "id": "pmpt_686a6cae5a5081939975224e71d812f10848a83d45ec9a02",
-                "version": "4",
-                "variables": {
-                    "ndc": str(row['NDC']),
-                    "ingredient": row['Primary Ingredient HIC4 Desc'],
-                    "product": row['Product Description'],
-                    "route": row['Route Desc']
-                }
+PROMPT_ID = "pmpt_686a6cae5a5081939975224e71d812f10848a83d45ec9a02"
+PROMPT_VERSION = "4"
+
+
+def build_request(ndc: str, row) -> dict:
+    """Returns the batch request classifying the product of a report row, identified by its NDC."""
+    return {
+        'custom_id': ndc,
+        'method': 'POST',
+        'url': '/v1/responses',
+        'body': {
+            'prompt': {
+                'id': PROMPT_ID,
+                'version': PROMPT_VERSION,
+                'variables': {
+                    'ndc': str(row['NDC']),
+                    'ingredient': row['Primary Ingredient HIC4 Desc'],
+                    'product': row['Product Description'],
+                    'route': row['Route Desc'],
+                },
             }
-        )
-        
-        # Parse the JSON response
-        response_data = json.loads(response.output_text)
-        
-        # Populate the new columns
-        df.at[index, 'brand_status'] = response_data.get('brand_status', '')
-        df.at[index, 'generic_alternative_available'] = response_data.get('generic_alternative_available', '')
-        df.at[index, 'generic_manufacturers'] = json.dumps(response_data.get('generic_manufacturers', []))
-        df.at[index, 'reasoning'] = response_data.get('reasoning', '')
-        
-        print(f"  - Brand Status: {response_data.get('brand_status', 'N/A')}")
-        print(f"  - Generic Available: {response_data.get('generic_alternative_available', 'N/A')}")
-        
-    except Exception as e:
-        print(f"  - Error processing row {index + 1}: {str(e)}")
-        # Set default values for failed rows
-        df.at[index, 'brand_status'] = 'ERROR'
-        df.at[index, 'generic_alternative_available'] = False
-        df.at[index, 'generic_manufacturers'] = '[]'
-        df.at[index, 'reasoning'] = f'Error: {str(e)}'
-
-    # Save the updated dataframe
-    df.to_csv(output_file, index=False)
-    
-    # Stop after 1000 rows
-    if index >= 1000:
-        break
-
-print(f"\nProcessing complete! Results saved to {output_file}")
+        },
+    }
+
+
+def get_cost(results, input_price: float, output_price: float) -> float:
+    """Returns the cost of the results from their token usage, prices being per million tokens."""
+    return sum(
+        (result.get('input_tokens') or 0) * input_price + (result.get('output_tokens') or 0) * output_price
+        for result in results
+    ) / 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", default=dir_path + "product-report-full.csv")
+    parser.add_argument("--output", default=dir_path + "product-report-top-1000-with-predictions.csv")
+    parser.add_argument("--cache", default=os.environ.get("CLASSIFICATION_CACHE_PATH", dir_path + "classification-cache.sqlite3"))
+    parser.add_argument("--limit", type=int, help="Only classify the first rows of the report. All rows by default.")
+    parser.add_argument("--batch-size", type=int, default=500, help="Requests per batch.")
+    parser.add_argument("--backend", choices=("local", "batch"), default="local",
+                        help="'batch' submits to the OpenAI Batch API, 'local' calls the Responses API directly.")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent requests of the local backend.")
+    parser.add_argument("--input-price", type=float, default=2.0, help="Price per million input tokens.")
+    parser.add_argument("--output-price", type=float, default=8.0, help="Price per million output tokens.")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    if args.limit is not None:
+        df = df.head(args.limit).copy()
+    ndcs = [normalize_ndc(value) for value in df['NDC']]
+    distinct = set(ndcs) - {None}
+    print(f"{len(df)} report rows, {len(distinct)} distinct NDCs")
+
+    cache = ClassificationCache(args.cache, PROMPT_ID, PROMPT_VERSION)
+    results = cache.get_many(distinct)
+    cached = set(results)
+
+    # One request per NDC missing from the cache, built from its first report row
+    requests = {}
+    for ndc, (_, row) in zip(ndcs, df.iterrows()):
+        if ndc is not None and ndc not in results and ndc not in requests:
+            requests[ndc] = build_request(ndc, row)
+    print(f"{len(cached)} NDCs cached, {len(requests)} to classify")
+
+    client = OpenAI()
+    runner = OpenAIBatchRunner(client) if args.backend == "batch" else LocalBatchRunner(client, args.workers)
+    pending = list(requests.values())
+    failed = {}
+    for i in range(0, len(pending), args.batch_size):
+        batch = pending[i:i + args.batch_size]
+        batch_results, batch_errors = parse_batch_output(runner.run(batch))
+        cache.put_many(batch_results)
+        results.update(batch_results)
+        failed.update(batch_errors)
+        print(f"Classified {min(i + args.batch_size, len(pending))}/{len(pending)} NDCs, {len(failed)} failed so far")
+    cache.close()
+
+    for ndc, error in list(failed.items())[:10]:
+        print(f"  - Error classifying NDC {ndc}: {error}")
+
+    # Failed NDCs are not cached, so the next run tries them again
+    for field in RESULT_FIELDS:
+        df[field] = [results.get(ndc, {}).get(field) for ndc in ndcs]
+    df.loc[[ndc in failed for ndc in ndcs], 'brand_status'] = 'ERROR'
+    df.to_csv(args.output, index=False)
+
+    hit_rate = len(cached) / len(distinct) if distinct else 0.0
+    saved = get_cost((results[ndc] for ndc in cached), args.input_price, args.output_price)
+    spent = get_cost((results[ndc] for ndc in requests if ndc in results), args.input_price, args.output_price)
+    print(f"Cache hit rate: {hit_rate:.1%} of NDCs ({len(cached)}/{len(distinct)})")
+    print(f"Cost: ${spent:.2f} spent on {len(requests)} NDCs, ${saved:.2f} saved by the cache")
+    print(f"\nProcessing complete! Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,71 +1,137 @@
-# %%
-import pandas as pd
-import glob
-
-# %%
-dates = ["2025-05-23", "2025-05-29", "2025-05-30", "2025-05-31", "2025-06-06","2025-06-08", "2025-06-10"]
-
-# %% [markdown]
-# ## ParMed
-
-# %%
-parmed_columns = [
-    'itemId', 'ndc', 'price',
-    'description', 'manufacturer', 'strength'
-    ]
-tables = []
-for date in dates:
-    print(f"./data/parmed-{date}.csv")
-    df = pd.read_csv(f"./data/parmed-{date}.csv")
-    # df = df[df['itemId'].isin(item_numbers)]
-    print(df.shape)
-    df = df[parmed_columns]
-    df['date'] = date
-    tables.append(df)
-
-df_parmed = pd.concat(tables)
-
-# %%
-df_parmed_describe = df_parmed.groupby('itemId')['price'].describe()
-df_parmed_describe['delta'] = df_parmed_describe['max'] - df_parmed_describe['min']
-df_parmed_describe = df_parmed_describe.sort_values('delta', ascending=False)
-
-# %%
-df_parmed = df_parmed_describe.merge(df_parmed.drop_duplicates(subset=['itemId']), how ='left', left_index=True, right_on='itemId')
-
-# %%
-df_parmed = df_parmed.drop(columns=['date'])
-df_parmed.to_csv('./data/parmed_deltas.csv', index=False)
-
-# %% [markdown]
-# ## BluPax
-
-# %%
-blupax_columns = [
-    'id', 'wac', 'awp', 'ndc_formatted', 'price', 'unit_price',
-    'description', 'product_size', 'manufacturer_name', 'brand', 'strength'
-    ]
-tables = []
-for date in dates:
-    print(f"./data/blupax-{date}.csv")
-    df = pd.read_csv(f"./data/blupax-{date}.csv")
-    print(df.shape)
-    df = df[blupax_columns]
-    df['date'] = date
-    tables.append(df)
-
-df_blupax = pd.concat(tables)
-
-# %%
-df_blupax_describe = df_blupax.groupby('id')['price'].describe()
-df_blupax_describe['delta'] = df_blupax_describe['max'] - df_blupax_describe['min']
-df_blupax_describe = df_blupax_describe.sort_values('delta', ascending=False)
-
-# %%
-df_blupax = df_blupax_describe.merge(df_blupax.drop_duplicates(subset=['id']), how ='left', left_index=True, right_on='id')
-
-# %%
-df_blupax = df_blupax.drop(columns=['date'])
-df_blupax.to_csv('./data/blupax_delta.csv', index=False)
+#!/usr/bin/env python3
+"""
+Computes per-item price statistics and deltas over a date range for both wholesalers.
 
+The statistics are computed inside Postgres from wholesaler_tracking.daily_price_rollup with window
+functions, and only the result rows are streamed back through a server-side cursor into
+data/parmed_deltas.csv and data/blupax_delta.csv. Time and memory depend on the number of items,
+not on the number of days times the catalog size.
 
+Usage:
+    python -m scripts.analyze --start 2025-05-23 --end 2025-06-10 [--output-dir data]
+"""
+
+import os
+import csv
+import time
+import argparse
+from datetime import date, timedelta
+
+import dotenv
+import psycopg2
+
+dotenv.load_dotenv()
+
+# Output file, key column, price field and descriptive attributes of each wholesaler
+ANALYSES = {
+    "parmed": ("parmed_deltas.csv", "itemId", "price", ["ndc", "description", "manufacturer", "strength"]),
+    "blupax": ("blupax_delta.csv", "id", "price", [
+        "wac", "awp", "ndc_formatted", "description", "product_size", "manufacturer_name", "brand", "strength"
+    ]),
+}
+
+STATISTIC_COLUMNS = [
+    "days", "count", "min", "max", "mean", "std", "delta", "first_price", "last_price", "change", "price_changes"
+]
+
+# Fetched from the server-side cursor per round trip
+FETCH_SIZE = 10000
+
+
+def build_delta_query(key_column: str, attribute_columns: list[str]) -> str:
+    """
+    Builds the per-item statistics query over one wholesaler's daily rollups.
+
+    The window functions find each item's first and last price of the range and the number of days
+    on which its price differed from the previous observed day. The attributes are joined from
+    latest_price after aggregating, so each item is joined once.
+    """
+    attributes = "".join(f",\n           latest.attributes->>'{column}' AS \"{column}\"" for column in attribute_columns)
+    return f"""
+    WITH days AS (
+        SELECT item_key, day, min_price, max_price, last_price, sample_count,
+               LAG(last_price) OVER item_days AS previous_price,
+               FIRST_VALUE(first_price) OVER item_days AS period_first_price,
+               LAST_VALUE(last_price) OVER (item_days ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) AS period_last_price
+        FROM wholesaler_tracking.daily_price_rollup
+        WHERE wholesaler = %(wholesaler)s AND price_field = %(price_field)s AND day BETWEEN %(start)s AND %(end)s
+        WINDOW item_days AS (PARTITION BY item_key ORDER BY day)
+    ),
+    stats AS (
+        SELECT item_key,
+               COUNT(*) AS days,
+               SUM(sample_count) AS count,
+               MIN(min_price) AS min,
+               MAX(max_price) AS max,
+               AVG(last_price) AS mean,
+               STDDEV_SAMP(last_price) AS std,
+               MAX(max_price) - MIN(min_price) AS delta,
+               MIN(period_first_price) AS first_price,
+               MIN(period_last_price) AS last_price,
+               MIN(period_last_price) - MIN(period_first_price) AS change,
+               COUNT(*) FILTER (WHERE last_price IS DISTINCT FROM previous_price AND previous_price IS NOT NULL) AS price_changes
+        FROM days
+        GROUP BY item_key
+    )
+    SELECT stats.item_key AS "{key_column}", {", ".join(f"stats.{column}" for column in STATISTIC_COLUMNS)}{attributes}
+    FROM stats
+    LEFT JOIN wholesaler_tracking.latest_price latest
+        ON latest.wholesaler = %(wholesaler)s AND latest.price_field = %(price_field)s AND latest.item_key = stats.item_key
+    ORDER BY stats.delta DESC NULLS LAST, stats.item_key
+    """
+
+
+def export_deltas(conn, wholesaler: str, start: date, end: date, output_dir: str) -> int:
+    """
+    Streams one wholesaler's price statistics into its CSV file.
+
+    Returns:
+        The number of items written.
+    """
+    filename, key_column, price_field, attribute_columns = ANALYSES[wholesaler]
+    path = os.path.join(output_dir, filename)
+    started = time.perf_counter()
+
+    row_count = 0
+    with conn, conn.cursor(name=f"{wholesaler}_deltas") as cur, open(path, "w", encoding="utf-8", newline="") as f:
+        cur.itersize = FETCH_SIZE
+        cur.execute(
+            build_delta_query(key_column, attribute_columns),
+            {"wholesaler": wholesaler, "price_field": price_field, "start": start, "end": end}
+        )
+        writer = csv.writer(f)
+        writer.writerow([key_column, *STATISTIC_COLUMNS, *attribute_columns])
+        for row in cur:
+            writer.writerow(row)
+            row_count += 1
+
+    print(f"Saved {row_count} {wholesaler} items into {path} in {time.perf_counter() - started:.2f}s.")
+    return row_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=date.fromisoformat, help="First day of the range (default: 30 days before --end).")
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today(), help="Last day of the range (default: today).")
+    parser.add_argument("--wholesaler", choices=sorted(ANALYSES), help="Analyze a single wholesaler.")
+    parser.add_argument("--output-dir", default="./data", help="Directory of the output CSV files.")
+    args = parser.parse_args()
+    start = args.start or args.end - timedelta(days=30)
+
+    pg_conn_str = os.environ.get("POSTGRES_CONNECTION_STRING")
+    if not pg_conn_str:
+        print("POSTGRES_CONNECTION_STRING is not set in environment variables.")
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"Analyzing prices from {start} to {args.end}...")
+    conn = psycopg2.connect(dsn=pg_conn_str)
+    try:
+        for wholesaler in [args.wholesaler] if args.wholesaler else sorted(ANALYSES):
+            export_deltas(conn, wholesaler, start, args.end, args.output_dir)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Loads legacy daily CSV snapshots (data/parmed-YYYY-MM-DD.csv, data/blupax-YYYY-MM-DD.csv) into Postgres.
+
+Files are parsed in a process pool. Every worker maps its file through the wholesaler's schema, the
+same column definitions the scrapers write with, and loads it with COPY using the date of the
+filename as scraped_at. The monthly partitions of all files are created beforehand. The rows, the
+latest-price and daily rollups and a marker in wholesaler_tracking.backfill_files are written in
+one transaction per file. Files that are already
+marked are skipped, so an interrupted backfill can simply be started again.
+
+Usage:
+    python -m scripts.backfill [--data-dir data] [--workers 4] [--wholesaler parmed]
+"""
+
+import os
+import re
+import csv
+import sys
+import glob
+import time
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import dotenv
+import psycopg2
+
+from src.scrapers.schema import get_schema
+from src.scrapers.blupax_scraper import BLUPAX_SCHEMA  # noqa: F401 - registers the schema
+from src.scrapers.parmed_scraper import PARMED_SCHEMA  # noqa: F401 - registers the schema
+from src.scrapers.writer import save_quarantined
+from src.utils.bulk_load import copy_rows
+from src.utils.partitions import ensure_monthly_partitions, is_partitioned
+from src.utils.price_rollup import update_price_rollups
+
+dotenv.load_dotenv()
+
+FILENAME_PATTERN = re.compile(r"^(parmed|blupax)-(\d{4}-\d{2}-\d{2})\.csv$")
+
+# Legacy files may contain very long description fields
+csv.field_size_limit(sys.maxsize)
+
+# Connection of the worker process, opened once by the pool initializer
+_conn = None
+
+
+def discover_files(data_dir: str, wholesaler: str | None = None) -> list[tuple[str, str, datetime]]:
+    """
+    Finds the daily snapshot files of a directory.
+
+    Returns:
+        (path, wholesaler, scraped_at) tuples sorted by date, scraped_at being midnight UTC of the filename date.
+    """
+    files = []
+    for path in glob.glob(os.path.join(data_dir, "*.csv")):
+        match = FILENAME_PATTERN.match(os.path.basename(path))
+        if not match or (wholesaler and match.group(1) != wholesaler):
+            continue
+        scraped_at = datetime.strptime(match.group(2), "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        files.append((path, match.group(1), scraped_at))
+    return sorted(files, key=lambda file: (file[2], file[1]))
+
+
+def read_items(path: str) -> list[dict]:
+    """Reads a CSV snapshot as items. Empty cells, which is how pandas wrote missing values, become None."""
+    with open(path, encoding="utf-8", newline="") as f:
+        return [{key: value if value != "" else None for key, value in row.items()} for row in csv.DictReader(f)]
+
+
+def ensure_partitions(dsn: str, files: list[tuple[str, str, datetime]]):
+    """
+    Creates the monthly partitions of all the files before they are loaded.
+
+    Workers creating the partition of the same month concurrently would fail on one another, so the
+    partitions are created once here, from the first to the last month of each wholesaler.
+    """
+    conn = psycopg2.connect(dsn=dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            for wholesaler in sorted({file[1] for file in files}):
+                table = get_schema(wholesaler).table
+                if not is_partitioned(cur, table):
+                    continue
+                days = [scraped_at.date() for _, name, scraped_at in files if name == wholesaler]
+                created = ensure_monthly_partitions(cur, table, min(days), max(days))
+                print(f"Created {len(created)} partitions of {table}.")
+    finally:
+        conn.close()
+
+
+def _init_worker(dsn: str):
+    global _conn
+    _conn = psycopg2.connect(dsn=dsn)
+
+
+def load_file(path: str, wholesaler: str, scraped_at: datetime) -> tuple[str, int, int, int, float] | None:
+    """
+    Loads one file in a single transaction. Runs in a worker process.
+
+    Returns:
+        (filename, rows, quarantined, bytes, seconds), or None if the file was already loaded.
+    """
+    start = time.perf_counter()
+    schema = get_schema(wholesaler)
+    filename = os.path.basename(path)
+
+    with _conn, _conn.cursor() as cur:
+        # The marker row is taken first: a concurrent or earlier load of the same file makes this a no-op
+        cur.execute(
+            """
+            INSERT INTO wholesaler_tracking.backfill_files (filename, wholesaler, scraped_at, row_count, quarantined_count)
+            VALUES (%s, %s, %s, 0, 0)
+            ON CONFLICT (filename) DO NOTHING
+            """,
+            (filename, wholesaler, scraped_at)
+        )
+        if cur.rowcount == 0:
+            return None
+
+        coerced = schema.coerce(read_items(path))
+        if coerced.quarantined:
+            save_quarantined(cur, schema.name, schema.item_key, coerced.quarantined, scraped_at)
+
+        row_count, byte_count = copy_rows(cur, schema.table, schema.column_names, coerced.as_tuples(), {"scraped_at": scraped_at})
+        update_price_rollups(
+            cur, schema.name, schema.item_key, schema.price_fields, schema.attribute_fields, coerced.as_dicts(), scraped_at
+        )
+        cur.execute(
+            "UPDATE wholesaler_tracking.backfill_files SET row_count = %s, quarantined_count = %s WHERE filename = %s",
+            (row_count, len(coerced.quarantined), filename)
+        )
+    return filename, row_count, len(coerced.quarantined), byte_count, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="./data", help="Directory of the daily CSV snapshots.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Number of worker processes.")
+    parser.add_argument("--wholesaler", choices=["parmed", "blupax"], help="Only load the files of one wholesaler.")
+    args = parser.parse_args()
+
+    pg_conn_str = os.environ.get("POSTGRES_CONNECTION_STRING")
+    if not pg_conn_str:
+        print("POSTGRES_CONNECTION_STRING is not set in environment variables.")
+        return
+
+    files = discover_files(args.data_dir, args.wholesaler)
+    print(f"Found {len(files)} snapshot files in {args.data_dir}.")
+    if not files:
+        return
+
+    ensure_partitions(pg_conn_str, files)
+
+    start = time.perf_counter()
+    total_rows = total_bytes = loaded = skipped = failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(pg_conn_str,)) as executor:
+        futures = {executor.submit(load_file, *file): file[0] for file in files}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Failed to load {futures[future]}: {e}")
+                continue
+            if result is None:
+                skipped += 1
+                continue
+
+            filename, row_count, quarantined_count, byte_count, elapsed = result
+            loaded += 1
+            total_rows += row_count
+            total_bytes += byte_count
+            print(f"Loaded {filename}: {row_count} rows ({quarantined_count} quarantined) in {elapsed:.2f}s "
+                  f"({row_count / max(elapsed, 1e-9):,.0f} rows/s).")
+
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {loaded} files, skipped {skipped} already loaded, {failed} failed.")
+    print(f"{total_rows} rows ({total_bytes / 1_000_000:.1f} MB) in {elapsed:.2f}s: "
+          f"{total_rows / max(elapsed, 1e-9):,.0f} rows/s, {total_bytes / 1_000_000 / max(elapsed, 1e-9):.1f} MB/s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the Postgres write stage with synthetic ParMed-shaped rows.
+
+Always measures how fast rows are encoded into the COPY text format. If POSTGRES_CONNECTION_STRING
+is set, also loads the rows into a temporary table with COPY and with execute_values.
+
+Usage:
+    python -m scripts.benchmark_copy --rows 50000
+"""
+
+import os
+import time
+import random
+import argparse
+import dotenv
+import psycopg2
+
+from src.utils.bulk_load import CopyRowStream, copy_rows, insert_rows
+
+dotenv.load_dotenv()
+
+COLUMNS = [f"col_{i}" for i in range(36)]
+
+
+def make_rows(count: int) -> list[tuple]:
+    """Builds rows with a mix of text, integer, numeric and boolean values."""
+    rows = []
+    for i in range(count):
+        text_values = tuple(f"value {i} of {column}\twith tab" for column in COLUMNS[:30])
+        rows.append(text_values + (i, random.randint(1, 500), round(random.uniform(1, 500), 2), True, False, None))
+    return rows
+
+
+def report(label: str, row_count: int, byte_count: int, elapsed: float):
+    megabytes = byte_count / 1_000_000
+    print(f"{label:>16}: {row_count} rows, {megabytes:.2f} MB in {elapsed:.2f}s "
+          f"({row_count / elapsed:,.0f} rows/s, {megabytes / elapsed:.1f} MB/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000, help="Number of synthetic rows.")
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+
+    start = time.perf_counter()
+    stream = CopyRowStream(rows)
+    while stream.read(1 << 16):
+        pass
+    report("encode", stream.row_count, stream.byte_count, time.perf_counter() - start)
+
+    pg_conn_str = os.environ.get("POSTGRES_CONNECTION_STRING")
+    if not pg_conn_str:
+        print("POSTGRES_CONNECTION_STRING is not set, skipping the database benchmark.")
+        return
+
+    table_sql = ", ".join(
+        [f"{column} TEXT" for column in COLUMNS[:30]]
+        + ["col_30 INTEGER", "col_31 INTEGER", "col_32 NUMERIC", "col_33 BOOLEAN", "col_34 BOOLEAN", "col_35 TEXT"]
+    )
+    conn = psycopg2.connect(dsn=pg_conn_str)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(f"CREATE TEMP TABLE benchmark_copy ({table_sql})")
+
+            start = time.perf_counter()
+            row_count, byte_count = copy_rows(cur, "benchmark_copy", COLUMNS, rows)
+            report("COPY", row_count, byte_count, time.perf_counter() - start)
+
+            cur.execute("TRUNCATE benchmark_copy")
+            start = time.perf_counter()
+            row_count = insert_rows(cur, "benchmark_copy", COLUMNS, rows)
+            report("execute_values", row_count, byte_count, time.perf_counter() - start)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
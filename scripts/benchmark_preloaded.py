@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmarks extracting the BluPax PRELOADED_DATA.SPECIALS_PRODUCTS_DATA block from a page.
+
+Compares the previous approach (decode the whole page, lazy regex, json.loads of the copied match)
+with the bracket-balancing extractor working on the raw bytes. Uses saved pages when given,
+otherwise a synthetic page with nested products, and checks that both return the same items.
+
+Usage:
+    python -m scripts.benchmark_preloaded --products 20000
+    python -m scripts.benchmark_preloaded --page saved/specials.html --repeat 20
+"""
+
+import re
+import json
+import time
+import random
+import argparse
+
+from src.utils.preloaded_data import extract_preloaded_data, orjson
+
+NAME = "SPECIALS_PRODUCTS_DATA"
+
+
+def make_page(product_count: int, tricky: bool = False) -> bytes:
+    """
+    Builds a page with the products block between other scripts.
+
+    Products always contain nested objects. Tricky pages also have `};` inside strings, a
+    pretty-printed block and another statement in the same script, so the end of the block has to
+    be found by balancing brackets. The previous regex does not handle them.
+    """
+    trailer = "\nPRELOADED_DATA.PAGE_INFO = {\"page\": 1};" if tricky else ""
+    description = "Product {} 10mg {{coated}}; \"tablets\"" if tricky else "Product {} 10mg coated tablets"
+    products = [
+        {
+            "id": i,
+            "description": description.format(i),
+            "price": round(random.uniform(1, 500), 2),
+            "attributes": {"strength": "10mg", "package": {"size": 100, "unit": "EA"}},
+            "tags": ["generic", {"rank": i % 7}],
+        }
+        for i in range(product_count)
+    ]
+    filler = "<div class=\"row\">" + "lorem ipsum " * 200 + "</div>\n"
+    return (
+        "<html><head><script>PRELOADED_DATA.SESSION = {\"uid\": 42};</script></head><body>\n"
+        + filler * 200
+        + f"<script>PRELOADED_DATA.{NAME} = {json.dumps({'data': products}, indent=1 if tricky else None)};{trailer}</script>\n"
+        + filler * 200
+        + "</body></html>"
+    ).encode()
+
+
+def extract_with_regex(body: bytes) -> list[dict] | None:
+    """The previous extraction: whole-page decode, lazy regex and json.loads."""
+    match = re.search(r"PRELOADED_DATA\.SPECIALS_PRODUCTS_DATA\s*=\s*(\{.*?\});", body.decode())
+    if not match:
+        return None
+    try:
+        return json.loads(match.group(1)).get("data", [])
+    except json.JSONDecodeError:
+        return None
+
+
+def extract_from_bytes(body: bytes) -> list[dict] | None:
+    block = extract_preloaded_data(body, [NAME]).get(NAME)
+    return block.get("data", []) if block is not None else None
+
+
+def measure(label: str, extract, body: bytes, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = extract(body)
+    elapsed = (time.perf_counter() - start) / repeat
+    megabytes = len(body) / 1_000_000
+    print(f"{label:>8}: {elapsed * 1000:.1f} ms per page ({megabytes / elapsed:.0f} MB/s)")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--page", action="append", help="A saved BluPax specials page. Can be repeated.")
+    parser.add_argument("--products", type=int, default=20_000, help="Products on the synthetic page.")
+    parser.add_argument("--repeat", type=int, default=10, help="Extractions per page.")
+    args = parser.parse_args()
+
+    pages = []
+    for path in args.page or []:
+        with open(path, "rb") as f:
+            pages.append((path, f.read()))
+    if not pages:
+        pages.append((f"synthetic page with {args.products} products", make_page(args.products)))
+        pages.append((f"synthetic page with {args.products} products and `}};` in strings", make_page(args.products, tricky=True)))
+
+    print(f"JSON backend: {'orjson' if orjson is not None else 'json'}")
+    for label, body in pages:
+        print(f"{label} ({len(body) / 1_000_000:.1f} MB):")
+        old_items, old_elapsed = measure("regex", extract_with_regex, body, args.repeat)
+        new_items, new_elapsed = measure("bytes", extract_from_bytes, body, args.repeat)
+        if old_items is None:
+            print(f"     regex: failed to extract the block, extractor found {len(new_items or [])} products")
+        elif old_items != new_items:
+            print(f"     regex: returned different products ({len(old_items)} vs {len(new_items or [])})")
+        else:
+            print(f"   speedup: {old_elapsed / new_elapsed:.1f}x, identical results ({len(new_items)} products)")
+
+
+if __name__ == "__main__":
+    main()
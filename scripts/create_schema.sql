@@ -89,3 +89,150 @@ CREATE TABLE IF NOT EXISTS wholesaler_tracking.blupax (
     is_wishlisted BOOLEAN,
     is_gpi_restriction BOOLEAN
 );
+
+
+-- Access tokens captured by the browser login, reused across runs until they expire
+CREATE TABLE IF NOT EXISTS wholesaler_tracking.access_tokens (
+    name TEXT PRIMARY KEY,
+    token TEXT NOT NULL,
+    captured_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+
+-- Change-only snapshots (SNAPSHOT_MODE=changes): rows are written only when an item is new,
+-- changed or disappeared. Rows written in full-snapshot mode have a NULL change_type.
+ALTER TABLE wholesaler_tracking.parmed ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE wholesaler_tracking.parmed ADD COLUMN IF NOT EXISTS change_type TEXT;
+ALTER TABLE wholesaler_tracking.blupax ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE wholesaler_tracking.blupax ADD COLUMN IF NOT EXISTS change_type TEXT;
+
+-- Latest known state per item, compared against each run
+CREATE TABLE IF NOT EXISTS wholesaler_tracking.item_state (
+    wholesaler TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    content_hash TEXT,
+    present BOOLEAN NOT NULL DEFAULT TRUE,
+    changed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (wholesaler, item_key)
+);
+
+-- Full snapshot of a given day: the latest row of every item up to that day, unless it disappeared.
+-- Full-snapshot rows only count for the day they were scraped on.
+CREATE OR REPLACE FUNCTION wholesaler_tracking.parmed_snapshot(snapshot_date DATE)
+RETURNS SETOF wholesaler_tracking.parmed
+LANGUAGE sql STABLE AS $$
+    SELECT latest.*
+    FROM (
+        SELECT DISTINCT ON (itemId) *
+        FROM wholesaler_tracking.parmed
+        WHERE scraped_at < snapshot_date + 1
+          AND (change_type IS NOT NULL OR scraped_at >= snapshot_date)
+        ORDER BY itemId, scraped_at DESC
+    ) latest
+    WHERE latest.change_type IS DISTINCT FROM 'disappeared'
+$$;
+
+CREATE OR REPLACE FUNCTION wholesaler_tracking.blupax_snapshot(snapshot_date DATE)
+RETURNS SETOF wholesaler_tracking.blupax
+LANGUAGE sql STABLE AS $$
+    SELECT latest.*
+    FROM (
+        SELECT DISTINCT ON (id) *
+        FROM wholesaler_tracking.blupax
+        WHERE scraped_at < snapshot_date + 1
+          AND (change_type IS NOT NULL OR scraped_at >= snapshot_date)
+        ORDER BY id, scraped_at DESC
+    ) latest
+    WHERE latest.change_type IS DISTINCT FROM 'disappeared'
+$$;
+
+-- Daily snapshots reconstructed for every day since the first scrape
+CREATE OR REPLACE VIEW wholesaler_tracking.parmed_daily_snapshots AS
+SELECT days.snapshot_date, snapshot.*
+FROM (
+    SELECT generate_series(MIN(scraped_at)::date, CURRENT_DATE, INTERVAL '1 day')::date AS snapshot_date
+    FROM wholesaler_tracking.parmed
+) days
+CROSS JOIN LATERAL wholesaler_tracking.parmed_snapshot(days.snapshot_date) snapshot;
+
+CREATE OR REPLACE VIEW wholesaler_tracking.blupax_daily_snapshots AS
+SELECT days.snapshot_date, snapshot.*
+FROM (
+    SELECT generate_series(MIN(scraped_at)::date, CURRENT_DATE, INTERVAL '1 day')::date AS snapshot_date
+    FROM wholesaler_tracking.blupax
+) days
+CROSS JOIN LATERAL wholesaler_tracking.blupax_snapshot(days.snapshot_date) snapshot;
+
+
+-- Scraped items that failed type coercion, kept with the reasons instead of failing their batch
+CREATE TABLE IF NOT EXISTS wholesaler_tracking.quarantine (
+    id BIGSERIAL PRIMARY KEY,
+    wholesaler TEXT NOT NULL,
+    item_key TEXT,
+    errors JSONB NOT NULL,
+    payload JSONB NOT NULL,
+    scraped_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+
+-- Latest and all-time min/max price of every item, maintained at ingest
+CREATE TABLE IF NOT EXISTS wholesaler_tracking.latest_price (
+    wholesaler TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    price_field TEXT NOT NULL,
+    price NUMERIC,
+    min_price NUMERIC,
+    max_price NUMERIC,
+    sample_count INTEGER NOT NULL DEFAULT 1,
+    first_seen_at TIMESTAMPTZ NOT NULL,
+    scraped_at TIMESTAMPTZ NOT NULL,
+    attributes JSONB,
+    -- When the price, minimum price or attributes last changed, the watermark of incremental exports
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (wholesaler, item_key, price_field)
+);
+
+CREATE INDEX IF NOT EXISTS latest_price_updated_idx ON wholesaler_tracking.latest_price (wholesaler, price_field, updated_at);
+
+-- Daily min/max/first/last price of every item, maintained at ingest
+CREATE TABLE IF NOT EXISTS wholesaler_tracking.daily_price_rollup (
+    wholesaler TEXT NOT NULL,
+    item_key TEXT NOT NULL,
+    price_field TEXT NOT NULL,
+    day DATE NOT NULL,
+    min_price NUMERIC,
+    max_price NUMERIC,
+    first_price NUMERIC,
+    last_price NUMERIC,
+    first_seen_at TIMESTAMPTZ NOT NULL,
+    last_seen_at TIMESTAMPTZ NOT NULL,
+    sample_count INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (wholesaler, item_key, price_field, day)
+);
+
+CREATE INDEX IF NOT EXISTS daily_price_rollup_day_idx ON wholesaler_tracking.daily_price_rollup (wholesaler, day);
+
+-- Legacy daily CSV snapshots loaded by scripts/backfill.py, one row per file
+CREATE TABLE IF NOT EXISTS wholesaler_tracking.backfill_files (
+    filename TEXT PRIMARY KEY,
+    wholesaler TEXT NOT NULL,
+    scraped_at TIMESTAMPTZ NOT NULL,
+    row_count INTEGER NOT NULL,
+    quarantined_count INTEGER NOT NULL,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Fingerprints of fetched pages, used in change-only mode to skip pages that did not change
+CREATE TABLE IF NOT EXISTS wholesaler_tracking.page_fingerprints (
+    wholesaler TEXT NOT NULL,
+    page_key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    item_keys TEXT[] NOT NULL DEFAULT '{}',
+    unchanged_runs INTEGER NOT NULL DEFAULT 0,
+    checked_at TIMESTAMPTZ NOT NULL,
+    changed_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (wholesaler, page_key)
+);
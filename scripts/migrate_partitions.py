@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Converts wholesaler_tracking.parmed and wholesaler_tracking.blupax to monthly range partitions on scraped_at.
+
+For each table the script:
+1. Creates a partitioned copy of the table with monthly partitions and the item/date and NDC indexes.
+2. Copies the existing rows in batches of --batch-days days, committing after every batch, while the
+   scrapers keep writing to the original table. An interrupted migration resumes where it stopped.
+   A scraper run stamps all of its rows with its start time and commits them batch by batch, so
+   scraped_at is not commit-ordered: this step stops --settle-hours before now, where no run is
+   still writing.
+3. Copies the remaining rows, skipping those already copied, and swaps the tables in one short
+   transaction. The original table is kept as <table>_legacy.
+4. Re-applies scripts/create_schema.sql so the snapshot functions and views point at the new table.
+
+Already partitioned tables only get their indexes and upcoming partitions ensured, which is also what
+every scraper run does before writing.
+
+Usage:
+    python -m scripts.migrate_partitions [--table parmed|blupax] [--batch-days 7] [--settle-hours 24] [--months-ahead 2]
+"""
+
+import os
+import time
+import argparse
+from datetime import timedelta
+
+import dotenv
+import psycopg2
+
+from src.utils.partitions import (
+    PARTITION_INDEXES, add_months, ensure_default_partition, ensure_future_partitions, ensure_indexes,
+    ensure_monthly_partitions, is_partitioned, month_start
+)
+
+dotenv.load_dotenv()
+
+SCHEMA = "wholesaler_tracking"
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "create_schema.sql")
+
+
+def copy_in_batches(conn, source: str, target: str, batch: timedelta, settle: timedelta):
+    """
+    Copies the rows of source that are newer than the newest row of target, one committed batch at a time.
+
+    Rows written less than settle ago are left to copy_remaining, as a running scraper may still commit
+    rows with an older scraped_at than rows already visible.
+    """
+    with conn, conn.cursor() as cur:
+        cur.execute(f"SELECT MAX(scraped_at) FROM {target}")
+        watermark = cur.fetchone()[0]
+        cur.execute(f"SELECT MIN(scraped_at), LEAST(MAX(scraped_at), NOW() - %s) FROM {source}", (settle,))
+        first, last = cur.fetchone()
+
+    if last is None or (watermark is not None and watermark >= last):
+        return
+    if watermark is None:
+        # Start just before the oldest row so that it is included by the exclusive lower bound
+        watermark = first - timedelta(microseconds=1)
+    else:
+        print(f"Resuming {source} after {watermark.isoformat()}.")
+
+    total = 0
+    start = time.perf_counter()
+    while watermark < last:
+        upper = min(watermark + batch, last)
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                f"INSERT INTO {target} SELECT * FROM {source} WHERE scraped_at > %s AND scraped_at <= %s",
+                (watermark, upper)
+            )
+            total += cur.rowcount
+        print(f"  copied up to {upper.isoformat()} ({total} rows, {total / (time.perf_counter() - start):,.0f} rows/s)")
+        watermark = upper
+
+
+def copy_remaining(cur, source: str, target: str, key: tuple[str, ...], since) -> int:
+    """
+    Copies the rows of source newer than since that are not in target yet, matched on the item key.
+
+    Returns:
+        The number of copied rows.
+    """
+    # Rows without an item key are matched too, or every pass would copy them again. scraped_at is
+    # compared with = so the index is used; the rows selected never have a NULL scraped_at.
+    matches = ' AND '.join(
+        f"t.{column} = s.{column}" if column == 'scraped_at' else f"t.{column} IS NOT DISTINCT FROM s.{column}"
+        for column in key
+    )
+    cur.execute(
+        f"""
+        INSERT INTO {target}
+        SELECT * FROM {source} s
+        WHERE s.scraped_at > COALESCE(%s::timestamptz, '-infinity'::timestamptz)
+        AND NOT EXISTS (SELECT 1 FROM {target} t WHERE {matches})
+        """,
+        (since,)
+    )
+    return cur.rowcount
+
+
+def rename_partitions(cur, wholesaler: str) -> int:
+    """
+    Renames the partitions and indexes of the staging table after the table it replaces, e.g.
+    parmed_partitioned_p202506 to parmed_p202506. Indexes of the legacy table holding one of the
+    names are renamed to <wholesaler>_legacy_<suffix> first.
+
+    Returns:
+        The number of renamed relations.
+    """
+    prefix = f"{wholesaler}_partitioned_"
+    cur.execute(
+        """
+        SELECT c.relname FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname LIKE %s AND c.relkind IN ('r', 'p', 'i', 'I')
+        ORDER BY c.relname
+        """,
+        (SCHEMA, prefix.replace('_', '\\_') + '%')
+    )
+    names = [row[0] for row in cur.fetchall()]
+    for name in names:
+        suffix = name[len(prefix):]
+        cur.execute("SELECT to_regclass(%s)", (f"{SCHEMA}.{wholesaler}_{suffix}",))
+        if cur.fetchone()[0] is not None:
+            cur.execute(f"ALTER TABLE {SCHEMA}.{wholesaler}_{suffix} RENAME TO {wholesaler}_legacy_{suffix}")
+        cur.execute(f"ALTER TABLE {SCHEMA}.{name} RENAME TO {wholesaler}_{suffix}")
+    return len(names)
+
+
+def migrate_table(conn, wholesaler: str, batch: timedelta, settle: timedelta, months_ahead: int):
+    """Migrates one wholesaler table to monthly partitions."""
+    table = f"{SCHEMA}.{wholesaler}"
+    staging = f"{SCHEMA}.{wholesaler}_partitioned"
+
+    with conn, conn.cursor() as cur:
+        if is_partitioned(cur, table):
+            print(f"{table} is already partitioned, ensuring indexes and upcoming partitions.")
+            ensure_indexes(cur, table, wholesaler)
+            created = ensure_future_partitions(cur, table, months_ahead)
+            print(f"Created partitions: {', '.join(created) or 'none'}")
+            return
+
+        print(f"Creating {staging}...")
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS) PARTITION BY RANGE (scraped_at)")
+        # Partition bounds are in UTC, so the first month is too
+        cur.execute(
+            f"SELECT (COALESCE(MIN(scraped_at), NOW()) AT TIME ZONE 'UTC')::date, (NOW() AT TIME ZONE 'UTC')::date FROM {table}"
+        )
+        first_day, today = cur.fetchone()
+        created = ensure_monthly_partitions(cur, staging, first_day, add_months(month_start(today), months_ahead))
+        # Rows outside the monthly partitions, e.g. with a bad clock, must not fail the copy
+        if ensure_default_partition(cur, staging):
+            created.append(f"{wholesaler}_partitioned_default")
+        print(f"Created {len(created)} partitions.")
+        ensure_indexes(cur, staging, wholesaler)
+
+    print(f"Copying {table} into {staging}...")
+    copy_in_batches(conn, table, staging, batch, settle)
+
+    # Every row up to the watermark was committed before it was copied
+    with conn, conn.cursor() as cur:
+        cur.execute(f"SELECT MAX(scraped_at) FROM {staging}")
+        watermark = cur.fetchone()[0]
+    key = PARTITION_INDEXES[wholesaler][0][0]
+
+    # Most of the remaining rows are copied before the lock, so the scrapers are blocked only briefly
+    print(f"Copying the rows of {table} written since {watermark.isoformat() if watermark else 'the start'}...")
+    with conn, conn.cursor() as cur:
+        print(f"  copied {copy_remaining(cur, table, staging, key, watermark)} rows")
+
+    print(f"Swapping {table} with {staging}...")
+    with conn, conn.cursor() as cur:
+        cur.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        print(f"  copied {copy_remaining(cur, table, staging, key, watermark)} rows under the lock")
+        # The snapshot functions and views are bound to the old table and are recreated from the schema file
+        cur.execute(f"DROP FUNCTION IF EXISTS {SCHEMA}.{wholesaler}_snapshot(DATE) CASCADE")
+        cur.execute(f"ALTER TABLE {table} RENAME TO {wholesaler}_legacy")
+        cur.execute(f"ALTER TABLE {staging} RENAME TO {wholesaler}")
+        # Partitions keep their names otherwise, which the scrapers' partition upkeep would not recognize
+        print(f"  renamed {rename_partitions(cur, wholesaler)} partitions and indexes")
+    print(f"{table} is now partitioned, the original rows are kept in {table}_legacy.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--table", choices=sorted(PARTITION_INDEXES), help="Migrate a single table.")
+    parser.add_argument("--batch-days", type=int, default=7, help="Days of rows copied per transaction.")
+    parser.add_argument("--settle-hours", type=int, default=24,
+                        help="Age of the rows copied in batches. Must exceed the duration of a scraper run.")
+    parser.add_argument("--months-ahead", type=int, default=2, help="Months of partitions created in advance.")
+    args = parser.parse_args()
+
+    pg_conn_str = os.environ.get("POSTGRES_CONNECTION_STRING")
+    if not pg_conn_str:
+        print("POSTGRES_CONNECTION_STRING is not set in environment variables.")
+        return
+
+    conn = psycopg2.connect(dsn=pg_conn_str)
+    try:
+        for wholesaler in [args.table] if args.table else sorted(PARTITION_INDEXES):
+            migrate_table(
+                conn, wholesaler, timedelta(days=args.batch_days), timedelta(hours=args.settle_hours), args.months_ahead
+            )
+
+        with conn, conn.cursor() as cur, open(SCHEMA_FILE, encoding="utf-8") as f:
+            cur.execute(f.read())
+        print("Schema objects re-applied.")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,9 @@ import dotenv
 import asyncio
 
 from .scrapers import BlupaxScraper, ParmedScraper
+from .utils.metrics import metrics
+from .utils.db_pool import close_db_pool
+from .utils.http_client import close_http_client
 
 dotenv.load_dotenv()
 
@@ -14,8 +17,13 @@ async def main():
     ]
 
     tasks = [scraper.run() for scraper in scrapers]
-    await asyncio.gather(*tasks)
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await close_http_client()
+        await close_db_pool()
 
+    metrics.report()
     print("\nAll scraping processes finished.")
 
 
@@ -1,127 +1,212 @@
 import os
 import abc
-import json
-import psycopg2
-from psycopg2.extras import execute_values
+import asyncio
+from typing import AsyncIterator
 from dateutil.utils import today
-from datetime import datetime, timezone
+
+from .schema import WholesalerSchema
+from .writer import SnapshotWriter
+from ..utils.archive import get_archive_dir
+from ..utils.db_pool import get_db_pool
+from ..utils.fingerprints import FingerprintStore
+
+# Number of items written to Postgres per transaction
+DEFAULT_BATCH_SIZE = 1000
+# Number of fetched pages that may wait for the writer before fetching pauses
+DEFAULT_QUEUE_SIZE = 8
 
 
 class BaseScraper(abc.ABC):
-    """An abstract base class for scrapers."""
+    """
+    An abstract base class for scrapers.
+
+    Subclasses implement either get_data, returning all items at once, or iter_data, yielding
+    items page by page so that they are written while the next pages are fetched.
+    """
 
-    def __init__(self, scraper_name: str):
+    # Declares the table, typed columns and item key the scraper's data is stored with
+    schema: WholesalerSchema | None = None
+
+    def __init__(self, scraper_name: str, batch_size: int = DEFAULT_BATCH_SIZE, queue_size: int = DEFAULT_QUEUE_SIZE):
         """
         Initializes the scraper with a name.
 
         Args:
             scraper_name: The name of the scraper, used for filenames.
+            batch_size: The number of items written to Postgres per transaction.
+            queue_size: The number of fetched pages buffered for the writer before fetching pauses.
         """
+        if type(self).get_data is BaseScraper.get_data and type(self).iter_data is BaseScraper.iter_data:
+            raise TypeError(f"{type(self).__name__} must implement get_data or iter_data.")
+
         self.scraper_name = scraper_name
+        self.batch_size = batch_size
+        self.queue_size = queue_size
         self.today_timestamp = today().strftime('%Y-%m-%d')
         self.csv_filename = f'{self.scraper_name}-{self.today_timestamp}.csv'
+        # SNAPSHOT_MODE=changes stores only new, changed and disappeared items instead of full snapshots
+        self.change_only = os.environ.get("SNAPSHOT_MODE", "full") == "changes" and self.schema is not None
+        # Page fingerprints of the previous run, only used in change-only mode
+        self.fingerprints: FingerprintStore | None = None
+        # Pages that could not be fetched in this run, which then only saw part of the catalog
+        self.fetch_failures: list[str] = []
+
+    @property
+    def item_key(self) -> str | None:
+        """The field identifying an item across runs."""
+        return self.schema.item_key if self.schema else None
 
-    @abc.abstractmethod
     async def get_data(self) -> list[dict]:
         """
-        Fetches and returns data. Must be implemented by subclasses.
-        This method should be asynchronous.
+        Fetches and returns all data. This method should be asynchronous.
+        The default implementation collects the batches yielded by iter_data.
         """
-        raise NotImplementedError
+        items = []
+        async for batch in self.iter_data():
+            items.extend(batch)
+        if self.item_key:
+            items = self._deduplicate(items, self.item_key)
+        return items
+
+    async def iter_data(self) -> AsyncIterator[list[dict]]:
+        """
+        Yields the data in batches, e.g. one page at a time, as it is fetched.
+        The default implementation yields everything returned by get_data as a single batch.
+        """
+        yield await self.get_data()
 
-    def _clean_null_bytes(self, value):
-        """Removes null bytes from string values to prevent PostgreSQL insertion errors."""
-        if isinstance(value, str):
-            return value.replace('\x00', '')
-        return value
+    def _deduplicate(self, data: list[dict], key: str, seen: set | None = None) -> list[dict]:
+        """
+        Removes items with a repeated key, keeping the first occurrence and the original order.
 
-    def _clean_data(self, data: list[dict]) -> list[dict]:
-        """Cleans null bytes from all string values in the data."""
-        cleaned_data = []
+        Args:
+            data: The items to de-duplicate.
+            key: The field identifying an item.
+            seen: Keys already seen in earlier batches. Updated with the keys of this batch.
+        """
+        seen = set() if seen is None else seen
+        unique_data = []
         for item in data:
-            cleaned_item = {}
-            for key, value in item.items():
-                cleaned_item[key] = self._clean_null_bytes(value)
-            cleaned_data.append(cleaned_item)
-        return cleaned_data
-
-    def _save_to_postgres(self, data: list[dict]):
-        """Saves the provided data to the Postgres database."""
-        if not data:
-            print(f"No data found for {self.scraper_name}.")
-            return
-
-        print(f"Found {len(data)} items for {self.scraper_name}.")
-
-        # Clean data to remove null bytes
-        cleaned_data = self._clean_data(data)
-
-        # Postgres connection string from environment
-        pg_conn_str = os.environ.get("POSTGRES_CONNECTION_STRING")
-        if not pg_conn_str:
+            value = item.get(key)
+            if value is not None and value in seen:
+                continue
+            seen.add(value)
+            unique_data.append(item)
+        return unique_data
+
+    def _record_fetch_failure(self, page: str):
+        """Records a page that could not be fetched, so that the run is not treated as a complete snapshot."""
+        self.fetch_failures.append(page)
+
+    def _conditional_headers(self, page_key: str) -> dict:
+        """Returns the conditional request headers of a page, if unchanged pages can be skipped."""
+        return self.fingerprints.conditional_headers(page_key) if self.fingerprints else {}
+
+    def _is_unchanged(self, page_key: str, response) -> bool:
+        """Returns whether a page is unchanged since the previous run, in which case it needs no parsing."""
+        return self.fingerprints is not None and self.fingerprints.is_unchanged(page_key, response)
+
+    def _record_page(self, page_key: str, items: list[dict]):
+        """Records the items parsed from a changed page with its fingerprint."""
+        if self.fingerprints is not None:
+            self.fingerprints.record_items(page_key, [str(item.get(self.item_key)) for item in items])
+
+    def _discard_page(self, page_key: str):
+        """Forgets the fingerprint of a page so that it is always parsed."""
+        if self.fingerprints is not None:
+            self.fingerprints.discard(page_key)
+
+    def _create_writer(self) -> SnapshotWriter | None:
+        """Creates the writer for this run, or returns None if the database is not configured."""
+        if self.schema is None:
+            print(f"No schema declared for {self.scraper_name}.")
+            return None
+
+        pool = get_db_pool()
+        if pool is None:
             print("POSTGRES_CONNECTION_STRING is not set in environment variables.")
-            return
-
-        # Table and columns per scraper
-        if self.scraper_name == "parmed":
-            table = '"wholesaler_tracking".parmed'
-            columns = [
-                "cin", "itemId", "sku", "description", "ndc", "manufacturer", "strength", "packQuantity", "color",
-                "unitOfSale", "form", "specialHandling", "labelSize", "brandName", "caseQty", "gcn",
-                "temperature", "hin", "price", "allocatedQuantity", "gcnCount", "isLowestPriceFlag",
-                "isWatchListItem", "isFavListItem", "unavailabilityReason", "ndc2", "isSubscriable",
-                "isSubscribed", "isNegotiable", "isNegotiated", "isNegotiatePending", "rtrnable_flg", "remsFlag",
-                "gtin", "shape", "he"
-            ]
-        elif self.scraper_name == "blupax":
-            table = '"wholesaler_tracking".blupax'
-            columns = [
-                "id", "wac", "awp", "unit_price", "price", "website_url", "ndc_formatted", "item_number",
-                "display_item_number", "description", "product_size", "manufacturer_name", "brand", "strength",
-                "is_available", "short_dated", "manufacturer_short_name", "expiration_date", "extension_date",
-                "quantity", "eta", "is_eta_delayed", "active", "is_short_dated", "cloudflare_image_url",
-                "branding_type", "generic_name", "can_add_to_cart", "create_date", "display_name", "lot_number",
-                "dosage_form", "item_group_filter", "availability_status", "show_short_dated_label",
-                "display_dea_class", "hide_dea_icon", "restricted_by_dea", "last_ordered_date", "is_wishlisted",
-                "is_gpi_restriction"
-            ]
-        else:
-            print(f"Unknown scraper name: {self.scraper_name}")
-            return
-
-        # Prepare rows for insertion
-        rows = []
-        for item in cleaned_data:
-            row = [item.get(col) for col in columns]
-            rows.append(row)
-
-        insert_columns = ", ".join(columns)
-        placeholders = ", ".join(["%s"] * len(columns))
-        sql = f"INSERT INTO {table} ({insert_columns}, scraped_at) VALUES %s"
-
-        # Add scraped_at timestamp for each row
-        now = datetime.now(timezone.utc)
-        rows_with_ts = [tuple(row + [now]) for row in rows]
+            return None
+
+        return SnapshotWriter(self.schema, pool, change_only=self.change_only)
 
+    async def _produce(self, queue: asyncio.Queue):
+        """Puts the fetched batches on the queue, waiting while it is full, and a final None."""
         try:
-            conn = psycopg2.connect(dsn=pg_conn_str)
-            with conn:
-                with conn.cursor() as cur:
-                    execute_values(cur, sql, rows_with_ts)
-            print(f"Inserted {len(rows)} rows into {table}.")
-        except Exception as e:
-            print(f"An error occurred while inserting into Postgres: {e}")
-        finally:
-            if 'conn' in locals():
-                conn.close()
+            async for batch in self.iter_data():
+                await queue.put(batch)
+        except Exception:
+            # Let the consumer drain the queue, the error is raised again when the producer is awaited
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def _consume(self, queue: asyncio.Queue, writer: SnapshotWriter | None) -> int:
+        """Writes the queued items in fixed-size batches and returns the number of items."""
+        seen = set()
+        pending = []
+        item_count = 0
+        while (batch := await queue.get()) is not None:
+            if self.item_key:
+                batch = self._deduplicate(batch, self.item_key, seen)
+            item_count += len(batch)
+            if writer is None:
+                continue
+            pending.extend(batch)
+            while len(pending) >= self.batch_size:
+                chunk, pending = pending[:self.batch_size], pending[self.batch_size:]
+                await writer.write(chunk)
+
+        if writer is not None and pending:
+            await writer.write(pending)
+        return item_count
 
     async def run(self):
-        """Orchestrates the scraper's execution."""
+        """
+        Orchestrates the scraper's execution.
+
+        Fetched pages flow through a bounded queue into the writer, so writing a batch overlaps
+        with fetching the next pages and fetching pauses while the writer falls behind. In change-only
+        mode, pages that did not change since the previous run are skipped without parsing them, and
+        their items are folded into the price rollups with their previous prices. Pages are never
+        skipped while the snapshot archive is enabled, as it must receive every item.
+
+        A run in which pages could not be fetched only saw part of the catalog: its items are still
+        written, but no items are recorded as disappeared and the page fingerprints are not saved.
+        """
         print(f"Running {self.scraper_name} scraper...")
+        self.fetch_failures = []
+        writer = self._create_writer()
+        producer = None
         try:
-            data = await self.get_data()
-            self._save_to_postgres(data)
+            if writer is not None and self.change_only:
+                if get_archive_dir():
+                    # The archive holds full snapshots, which skipped pages would leave holes in
+                    print(f"SNAPSHOT_ARCHIVE_DIR is set, {self.scraper_name} parses every page.")
+                else:
+                    self.fingerprints = FingerprintStore(self.schema.name, writer.pool)
+                    await self.fingerprints.load()
+
+            queue = asyncio.Queue(maxsize=self.queue_size)
+            producer = asyncio.create_task(self._produce(queue))
+            item_count = await self._consume(queue, writer)
+            await producer
+            complete = not self.fetch_failures
+            if not complete:
+                print(f"{self.scraper_name} run is incomplete: {len(self.fetch_failures)} pages could not be fetched "
+                      f"({', '.join(self.fetch_failures[:5])}{', ...' if len(self.fetch_failures) > 5 else ''}).")
+            unchanged_keys = self.fingerprints.unchanged_item_keys() if self.fingerprints else set()
+            if item_count == 0 and not unchanged_keys:
+                print(f"No data found for {self.scraper_name}.")
+            elif writer is not None:
+                if unchanged_keys:
+                    # Items of skipped pages are still present and observed today, with their previous prices
+                    await writer.observe_unchanged(unchanged_keys)
+                await writer.finish(complete=complete)
+                if self.fingerprints and complete:
+                    await self.fingerprints.save()
         except Exception as e:
             print(f"An error occurred while running the {self.scraper_name} scraper: {e}")
         finally:
+            if producer is not None and not producer.done():
+                producer.cancel()
             print(f"{self.scraper_name} scraper finished.")
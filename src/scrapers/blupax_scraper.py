@@ -1,19 +1,115 @@
 import os
 import re
-import json
 import asyncio
+from collections import deque
+from typing import AsyncIterator
 
-from ..utils.core import make_http_request
+from ..utils.http_client import async_http_request, set_host_rate
+from ..utils.preloaded_data import extract_preloaded_data
 from .base import BaseScraper
+from .schema import Column, WholesalerSchema, register_schema
+
+
+BLUPAX_HOST = "www.blupaxpharma.com"
+# Listing pages the catalog crawl starts from; category pages are discovered from their links
+CATALOG_START_PATHS = ("/shop",)
+CATEGORY_LINK_PATTERN = re.compile(rb'href="(/shop/category/[^"?#/]+)/?"')
+
+# Fingerprint key of the specials page
+SPECIALS_PAGE_KEY = "specials"
+# The PRELOADED_DATA block of the specials page holding the products
+SPECIALS_DATA_NAME = "SPECIALS_PRODUCTS_DATA"
+
+BLUPAX_SCHEMA = register_schema(WholesalerSchema(
+    name="blupax",
+    table='"wholesaler_tracking".blupax',
+    columns=(
+        Column("id"),
+        Column("wac", "NUMERIC"),
+        Column("awp", "NUMERIC"),
+        Column("unit_price", "NUMERIC"),
+        Column("price", "NUMERIC"),
+        Column("website_url"),
+        Column("ndc_formatted"),
+        Column("item_number"),
+        Column("display_item_number"),
+        Column("description"),
+        Column("product_size"),
+        Column("manufacturer_name"),
+        Column("brand"),
+        Column("strength"),
+        Column("is_available", "BOOLEAN"),
+        Column("short_dated"),
+        Column("manufacturer_short_name"),
+        Column("expiration_date"),
+        Column("extension_date"),
+        Column("quantity", "INTEGER"),
+        Column("eta"),
+        Column("is_eta_delayed", "BOOLEAN"),
+        Column("active", "BOOLEAN"),
+        Column("is_short_dated", "BOOLEAN"),
+        Column("cloudflare_image_url"),
+        Column("branding_type"),
+        Column("generic_name"),
+        Column("can_add_to_cart", "BOOLEAN"),
+        Column("create_date"),
+        Column("display_name"),
+        Column("lot_number"),
+        Column("dosage_form"),
+        Column("item_group_filter"),
+        Column("availability_status"),
+        Column("show_short_dated_label", "BOOLEAN"),
+        Column("display_dea_class"),
+        Column("hide_dea_icon", "BOOLEAN"),
+        Column("restricted_by_dea", "BOOLEAN"),
+        Column("last_ordered_date"),
+        Column("is_wishlisted", "BOOLEAN"),
+        Column("is_gpi_restriction", "BOOLEAN")
+    ),
+    item_key="id",
+    change_fields=("wac", "awp", "unit_price", "price", "quantity", "is_available", "availability_status"),
+    price_fields=("price", "unit_price"),
+    attribute_fields=(
+        "ndc_formatted", "wac", "awp", "description", "product_size", "manufacturer_name", "brand", "strength",
+        "branding_type", "generic_name"
+    )
+))
 
 
 class BlupaxScraper(BaseScraper):
-    def __init__(self):
+    schema = BLUPAX_SCHEMA
+
+    def __init__(
+        self,
+        full_catalog: bool | None = None,
+        catalog_paths: list[str] | None = None,
+        max_concurrency: int = 4,
+        requests_per_second: float = 2.0,
+        max_pages: int = 1000
+    ):
+        """
+        Initializes the BluPax scraper.
+
+        Args:
+            full_catalog: If True, crawls the category and listing pages in addition to the specials.
+                Defaults to BLUPAX_CRAWL_MODE=catalog in the environment.
+            catalog_paths: The listing pages the crawl starts from.
+            max_concurrency: The maximum number of listing pages fetched at the same time.
+            requests_per_second: The rate limit applied to all requests to the BluPax host during the crawl.
+            max_pages: The maximum number of listing pages fetched in one run.
+        """
         super().__init__('blupax')
+        if full_catalog is None:
+            full_catalog = os.environ.get("BLUPAX_CRAWL_MODE", "specials") == "catalog"
+        self.full_catalog = full_catalog
+        self.catalog_paths = list(catalog_paths or CATALOG_START_PATHS)
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.max_pages = max_pages
 
-    def _get_request_parameters(self):
+    def _get_request_parameters(self, path: str = "/specials"):
         """Defines and returns the URL, headers, and cookies for the HTTP request."""
-        base_url = "https://www.blupaxpharma.com/specials"
+        base_url = f"https://{BLUPAX_HOST}{path}"
 
         headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36',
@@ -30,32 +126,124 @@ class BlupaxScraper(BaseScraper):
 
         return base_url, headers, cookies
 
-    async def get_data(self) -> list[dict]:
-        """Extracts JSON data from the response and returns it as a list of dictionaries."""
+    async def _get_specials(self) -> list[dict]:
+        """Extracts the specials from the preloaded data of the specials page."""
         url, headers, cookies = self._get_request_parameters()
-        response = make_http_request(method="GET", url=url, headers=headers, cookies=cookies)
+        headers.update(self._conditional_headers(SPECIALS_PAGE_KEY))
+        response = await async_http_request(method="GET", url=url, headers=headers, cookies=cookies, sticky_key=self.scraper_name)
 
         if not response:
             print("No response from Blupax.")
+            self._record_fetch_failure(SPECIALS_PAGE_KEY)
+            return []
+        if self._is_unchanged(SPECIALS_PAGE_KEY, response):
+            print("Blupax specials page is unchanged since the previous run.")
             return []
 
-        match = re.search(r"PRELOADED_DATA\.SPECIALS_PRODUCTS_DATA\s*=\s*(\{.*?\});", response.text)
-        if not match:
-            print("Could not find PRELOADED_DATA.SPECIALS_PRODUCTS_DATA in the response.")
+        blocks = extract_preloaded_data(response.content, [SPECIALS_DATA_NAME])
+        if SPECIALS_DATA_NAME not in blocks:
+            print(f"Could not find PRELOADED_DATA.{SPECIALS_DATA_NAME} in the response.")
+            self._record_fetch_failure(SPECIALS_PAGE_KEY)
             return []
 
-        json_data_string = match.group(1)
+        items = blocks[SPECIALS_DATA_NAME].get('data', [])
+        self._record_page(SPECIALS_PAGE_KEY, items)
+        return items
+
+    @staticmethod
+    def _find_products(blocks: dict) -> list[dict] | None:
+        """
+        Returns the products of all preloaded blocks shaped like {'data': [{'id': ...}, ...]},
+        or None if the page has no such block at all.
+        """
+        products = None
+        for block in blocks.values():
+            data = block.get('data') if isinstance(block, dict) else None
+            if isinstance(data, list):
+                if products is None:
+                    products = []
+                products.extend(item for item in data if isinstance(item, dict) and 'id' in item)
+        return products
+
+    async def _fetch_listing(self, path: str, page_no: int, semaphore: asyncio.Semaphore) -> tuple[list[dict], list[str]] | None:
+        """Fetches a listing page and returns its products and the category pages it links to, or None if it failed."""
+        url, headers, cookies = self._get_request_parameters(path if page_no == 1 else f"{path}/page/{page_no}")
+        async with semaphore:
+            response = await async_http_request(method="GET", url=url, headers=headers, cookies=cookies, sticky_key=self.scraper_name)
+        if not response:
+            print(f"No response from Blupax for {url}.")
+            self._record_fetch_failure(url)
+            return None
+
+        body = response.content
+        products = self._find_products(extract_preloaded_data(body))
+        if products is None:
+            print(f"Could not find the PRELOADED_DATA products in {url}.")
+            self._record_fetch_failure(url)
+            return None
+        categories = list(dict.fromkeys(link.decode() for link in CATEGORY_LINK_PATTERN.findall(body)))
+        return products, categories
+
+    async def _iter_catalog(self) -> AsyncIterator[list[dict]]:
+        """
+        Crawls the listing pages breadth-first and yields the new products of each page.
+
+        Every listing is paginated until a page has no products that were not seen before, and every
+        linked category is crawled once. Pages are fetched concurrently in a window ahead of the
+        consumer, at the host's rate limit. Failed pages and pages left over at max_pages are recorded
+        as fetch failures, as the products behind them were not seen.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        frontier = deque((path, 1) for path in self.catalog_paths)
+        queued = set(self.catalog_paths)
+        seen_ids = set()
+        pending = {}
+        page_count = 0
         try:
-            newest_items_data = json.loads(json_data_string)
-            return newest_items_data.get('data', [])
-        except json.JSONDecodeError as e:
-            print(f"Error decoding JSON: {e}")
-            print(f"Extracted string was: {json_data_string}")
-            return []
-        except KeyError:
-            print("The key 'data' was not found in the JSON.")
-            return []
+            while frontier or pending:
+                while frontier and len(pending) < self.max_concurrency * 2 and page_count < self.max_pages:
+                    path, page_no = frontier.popleft()
+                    pending[asyncio.create_task(self._fetch_listing(path, page_no, semaphore))] = (path, page_no)
+                    page_count += 1
+                if not pending:
+                    break
+
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    path, page_no = pending.pop(task)
+                    result = task.result()
+                    if result is None:
+                        continue
+                    products, categories = result
+                    for category in categories:
+                        if category not in queued:
+                            queued.add(category)
+                            frontier.append((category, 1))
+
+                    new_products = [product for product in products if product['id'] not in seen_ids]
+                    seen_ids.update(product['id'] for product in new_products)
+                    if new_products:
+                        frontier.append((path, page_no + 1))
+                        yield new_products
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if frontier:
+            print(f"Stopped the Blupax catalog crawl at the limit of {self.max_pages} pages.")
+            self._record_fetch_failure(f"{len(frontier)} listing pages over the limit of {self.max_pages}")
+        print(f"Crawled {page_count} Blupax listing pages ({len(queued)} listings), {len(seen_ids)} products.")
+
+    async def iter_data(self) -> AsyncIterator[list[dict]]:
+        """Yields the specials and, in full-catalog mode, the products of every listing page."""
+        yield await self._get_specials()
+        if not self.full_catalog:
+            return
 
+        set_host_rate(BLUPAX_HOST, self.requests_per_second)
+        async for products in self._iter_catalog():
+            yield products
 
 async def main():
     """Main function to orchestrate the script execution."""
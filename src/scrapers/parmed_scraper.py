@@ -1,16 +1,110 @@
+import os
 import json
+import math
+import time
 import asyncio
+import itertools
+from collections import deque
+from typing import AsyncIterator
 
-from ..utils.core import make_http_request
+from ..utils.fingerprints import payload_fingerprint
+from ..utils.http_client import async_http_request
 from ..utils.browser import get_parmed_token
 from .base import BaseScraper
+from .schema import Column, WholesalerSchema, register_schema
+from .sharding import (
+    ShardResult, empty_facets, get_facet_values, plan_facet_shards, print_shard_report, shards_cover_catalog
+)
+
+
+# Keys under which the ParMed product API may report the total number of matching items.
+TOTAL_COUNT_KEYS = ("totalCount", "totalItems", "totalRecords", "totalItemCount", "total")
+
+# Returned by _fetch_page for pages that did not change since the previous run
+UNCHANGED_PAGE = {"itemList": [], "unchanged": True}
+
+
+PARMED_SCHEMA = register_schema(WholesalerSchema(
+    name="parmed",
+    table='"wholesaler_tracking".parmed',
+    columns=(
+        Column("cin"),
+        Column("itemId"),
+        Column("sku"),
+        Column("description"),
+        Column("ndc"),
+        Column("manufacturer"),
+        Column("strength"),
+        Column("packQuantity", "INTEGER"),
+        Column("color"),
+        Column("unitOfSale"),
+        Column("form"),
+        Column("specialHandling"),
+        Column("labelSize"),
+        Column("brandName"),
+        Column("caseQty", "INTEGER"),
+        Column("gcn"),
+        Column("temperature"),
+        Column("hin"),
+        Column("price", "NUMERIC"),
+        Column("allocatedQuantity", "INTEGER"),
+        Column("gcnCount", "INTEGER"),
+        Column("isLowestPriceFlag", "BOOLEAN"),
+        Column("isWatchListItem", "BOOLEAN"),
+        Column("isFavListItem", "BOOLEAN"),
+        Column("unavailabilityReason"),
+        Column("ndc2"),
+        Column("isSubscriable", "BOOLEAN"),
+        Column("isSubscribed", "BOOLEAN"),
+        Column("isNegotiable", "BOOLEAN"),
+        Column("isNegotiated", "BOOLEAN"),
+        Column("isNegotiatePending", "BOOLEAN"),
+        Column("rtrnable_flg"),
+        Column("remsFlag"),
+        Column("gtin"),
+        Column("shape"),
+        Column("he")
+    ),
+    item_key="itemId",
+    change_fields=("price", "allocatedQuantity", "unavailabilityReason"),
+    price_fields=("price",),
+    attribute_fields=("ndc", "description", "manufacturer", "brandName", "strength", "labelSize", "packQuantity")
+))
 
 
 class ParmedScraper(BaseScraper):
-    def __init__(self):
+    schema = PARMED_SCHEMA
+
+    def __init__(
+        self,
+        full_catalog: bool = True,
+        page_size: int = 100,
+        max_concurrency: int = 4,
+        shard_facet: str | None = None,
+        shard_values: list[str] | None = None
+    ):
+        """
+        Initializes the ParMed scraper.
+
+        Args:
+            full_catalog: If True, crawls every page of the catalog. Otherwise only the first page is fetched.
+            page_size: The number of items requested per page.
+            max_concurrency: The maximum number of page requests in flight at the same time.
+            shard_facet: If set, splits the crawl into one shard per value of this facet (e.g. 'manufacturer').
+                Defaults to PARMED_SHARD_FACET in the environment.
+            shard_values: The facet values to shard on. Defaults to the comma separated PARMED_SHARD_VALUES
+                in the environment, and is discovered from the first response when neither is set.
+        """
         super().__init__('parmed')
+        self.full_catalog = full_catalog
+        self.page_size = page_size
+        self.max_concurrency = max_concurrency
+        self.shard_facet = shard_facet or os.environ.get("PARMED_SHARD_FACET") or None
+        if shard_values is None:
+            shard_values = [value.strip() for value in os.environ.get("PARMED_SHARD_VALUES", "").split(',') if value.strip()]
+        self.shard_values = shard_values or None
 
-    def _get_request_parameters(self, access_token):
+    def _get_request_parameters(self, access_token, page_no: int = 0, facets: dict | None = None):
         """Defines and returns the URL, headers, and data payload for the API request."""
         url = 'https://api.cardinalhealth.com/pharmacon/product/kinray/external/v1/product'
 
@@ -34,40 +128,203 @@ class ParmedScraper(BaseScraper):
         }
 
         data = {
-            "pageSize": 10,
+            "pageSize": self.page_size,
             "searchKeyword": "",
             "shipToNum": "2057158677",
             "soldToNum": "2057158677",
             "userDetailNum": 53981,
-            "pageNo": 0,
-            "facets": {
-                "manufacturer": [],
-                "strength": [],
-                "form": [],
-                "labelsize": []
-            },
+            "pageNo": page_no,
+            "facets": facets or empty_facets(),
             "sortOrder": None,
             "sortParam": None
         }
 
         return url, headers, data
 
-    async def get_data(self) -> list[dict]:
-        """Fetches and returns data from the ParMed API."""
-        access_token = await get_parmed_token()
+    @staticmethod
+    def _get_total_count(json_response: dict) -> int | None:
+        """Returns the total item count reported by the API, or None if the response does not include one."""
+        for key in TOTAL_COUNT_KEYS:
+            value = json_response.get(key)
+            if isinstance(value, (int, str)) and str(value).isdigit():
+                return int(value)
+        return None
+
+    async def _probe_token(self, access_token) -> bool:
+        """Checks whether the API accepts the access token with a single-item request."""
         url, headers, data = self._get_request_parameters(access_token)
-        response = make_http_request(method="POST", url=url, headers=headers, data=data)
+        data["pageSize"] = 1
+        response = await async_http_request(method="POST", url=url, headers=headers, data=data, sticky_key=self.scraper_name)
+        return response is not None
+
+    @staticmethod
+    def _get_page_key(page_no: int, facets: dict | None = None) -> str:
+        """Returns the fingerprint key of a page, distinguishing the pages of different shards."""
+        if not facets:
+            return str(page_no)
+        return f"{payload_fingerprint(json.dumps(facets, sort_keys=True).encode())[:12]}:{page_no}"
+
+    async def _fetch_page(
+        self, access_token, page_no: int, semaphore: asyncio.Semaphore, facets: dict | None = None
+    ) -> dict | None:
+        """
+        Fetches a single page of the catalog and returns the decoded JSON response.
+
+        Pages after the first are returned as UNCHANGED_PAGE without decoding when they did not change
+        since the previous run. The first page is always decoded, as it carries the total count and facets.
+        Pages that could not be fetched or decoded are recorded as fetch failures and returned as None.
+        """
+        url, headers, data = self._get_request_parameters(access_token, page_no=page_no, facets=facets)
+        page_key = self._get_page_key(page_no, facets)
+        if page_no > 0:
+            headers.update(self._conditional_headers(page_key))
+        async with semaphore:
+            response = await async_http_request(method="POST", url=url, headers=headers, data=data, sticky_key=self.scraper_name)
 
         if not response:
-            print("No response from ParMed.")
-            return []
+            print(f"No response from ParMed for page {page_no}.")
+            self._record_fetch_failure(page_key)
+            return None
+        if page_no > 0 and self._is_unchanged(page_key, response):
+            return UNCHANGED_PAGE
 
         try:
             json_response = response.json()
-            return json_response.get('itemList', [])
         except json.JSONDecodeError:
-            print("Response content (not JSON):", response.text)
-            return []
+            print(f"Response content for page {page_no} (not JSON):", response.text)
+            self._record_fetch_failure(page_key)
+            return None
+        if page_no > 0:
+            items = json_response.get('itemList') or []
+            # Only full pages are skipped in later runs, a short page has to be seen to end the crawl
+            if len(items) == self.page_size:
+                self._record_page(page_key, items)
+            else:
+                self._discard_page(page_key)
+        return json_response
+
+    async def _iter_pages(
+        self, access_token, semaphore: asyncio.Semaphore, facets: dict | None = None, first_page: dict | None = None
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Yields the item lists of the catalog, or of the part selected by the facets, in page order.
+
+        Pages are fetched concurrently in a sliding window ahead of the page being yielded, so a
+        slow consumer holds back fetching instead of letting fetched pages pile up.
+
+        Args:
+            access_token: The ParMed access token.
+            semaphore: Limits the number of page requests in flight.
+            facets: The facets payload selecting a shard of the catalog.
+            first_page: The already fetched first page response, if any.
+        """
+        if first_page is None:
+            first_page = await self._fetch_page(access_token, 0, semaphore, facets)
+            if first_page is None:
+                return
+
+        page = first_page.get('itemList') or []
+        yield page
+        if not self.full_catalog or len(page) < self.page_size:
+            return
+
+        total_count = self._get_total_count(first_page)
+        if total_count is not None:
+            page_count = math.ceil(total_count / self.page_size)
+            print(f"ParMed reports {total_count} items across {page_count} pages.")
+            page_numbers = iter(range(1, page_count))
+        else:
+            # Without a total count, keep fetching until a page comes back short
+            page_numbers = itertools.count(1)
+
+        window = self.max_concurrency * 2
+        pending = deque()
+        try:
+            while True:
+                while len(pending) < window and (page_no := next(page_numbers, None)) is not None:
+                    pending.append(asyncio.create_task(self._fetch_page(access_token, page_no, semaphore, facets)))
+                if not pending:
+                    break
+
+                json_response = await pending.popleft()
+                if json_response is UNCHANGED_PAGE:
+                    # Only full pages are skipped, so a skipped page never ends the catalog
+                    continue
+                if json_response is None:
+                    # A failed page is not an empty one. Without a total count it is unknown whether
+                    # more pages follow, so the crawl stops, the failure marking the run incomplete
+                    if total_count is None:
+                        break
+                    continue
+                page = json_response.get('itemList') or []
+                yield page
+                if total_count is None and len(page) < self.page_size:
+                    break
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _crawl_shard(self, access_token, semaphore: asyncio.Semaphore, facets: dict) -> ShardResult:
+        """Crawls a single facet shard and records its item count and timing."""
+        start = time.perf_counter()
+        first_page = await self._fetch_page(access_token, 0, semaphore, facets)
+        pages = []
+        if first_page is not None:
+            pages = [page async for page in self._iter_pages(access_token, semaphore, facets, first_page=first_page)]
+        items = [item for page in pages for item in page]
+        return ShardResult(
+            facets=facets,
+            total_count=self._get_total_count(first_page) if first_page is not None else None,
+            item_count=len(items),
+            page_count=len(pages),
+            elapsed=time.perf_counter() - start,
+            items=items
+        )
+
+    async def _iter_shards(self, access_token, semaphore: asyncio.Semaphore) -> AsyncIterator[list[dict]]:
+        """
+        Splits the catalog by the configured facet, crawls all shards in parallel and yields each finished shard.
+
+        The unfiltered first page is always fetched, as its total count is needed to check that the shards
+        cover the whole catalog. A sharded run that cannot be shown to be complete is recorded as a fetch
+        failure, so that items missing from every shard are not marked as disappeared.
+        """
+        first_page = await self._fetch_page(access_token, 0, semaphore)
+        if first_page is None:
+            return
+        shard_values = self.shard_values or get_facet_values(first_page, self.shard_facet)
+
+        if not shard_values:
+            print(f"No values found for facet '{self.shard_facet}', crawling without shards.")
+            async for page in self._iter_pages(access_token, semaphore, first_page=first_page):
+                yield page
+            return
+
+        shards = plan_facet_shards(self.shard_facet, shard_values)
+        print(f"Crawling ParMed in {len(shards)} shards by {self.shard_facet}...")
+        results = []
+        for shard in asyncio.as_completed([self._crawl_shard(access_token, semaphore, facets) for facets in shards]):
+            result = await shard
+            yield result.items
+            result.items = []
+            results.append(result)
+        print_shard_report(results)
+
+        catalog_total = self._get_total_count(first_page)
+        if not shards_cover_catalog(results, catalog_total):
+            print(f"ParMed shards by {self.shard_facet} do not cover the catalog of {catalog_total} items, "
+                  "the run is not treated as a complete snapshot.")
+            self._record_fetch_failure(f"shards:{self.shard_facet}")
+
+    async def iter_data(self) -> AsyncIterator[list[dict]]:
+        """Fetches data from the ParMed API and yields it page by page (or shard by shard)."""
+        access_token = await get_parmed_token(validate=self._probe_token)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        pages = self._iter_shards(access_token, semaphore) if self.shard_facet else self._iter_pages(access_token, semaphore)
+        async for page in pages:
+            yield page
 
 
 async def main():
@@ -0,0 +1,222 @@
+import json
+from decimal import Decimal, InvalidOperation
+from dataclasses import dataclass, field
+
+# Errors raised by a coercer for a value it cannot convert (InvalidOperation is an ArithmeticError)
+COERCION_ERRORS = (ValueError, TypeError, ArithmeticError)
+# Values treated as booleans when a wholesaler sends them as strings
+TRUE_STRINGS = {'true', 't', 'yes', 'y', '1'}
+FALSE_STRINGS = {'false', 'f', 'no', 'n', '0'}
+# Range of the PostgreSQL INTEGER type
+INTEGER_MIN = -2 ** 31
+INTEGER_MAX = 2 ** 31 - 1
+
+
+def to_text(value):
+    """Coerces a value to TEXT, stripping null bytes that PostgreSQL rejects."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.replace('\x00', '') if '\x00' in value else value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+def to_integer(value):
+    """Coerces a value to INTEGER. Raises ValueError for booleans and values that are not whole numbers in range."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"{value!r} is not an integer")
+    number = None
+    if isinstance(value, int):
+        number = int(value)
+    elif isinstance(value, float) and value.is_integer():
+        number = int(value)
+    elif isinstance(value, str):
+        text = value.strip().replace(',', '')
+        if text.lstrip('-').isdigit():
+            number = int(text)
+        else:
+            decimal = Decimal(text)
+            if decimal == decimal.to_integral_value():
+                number = int(decimal)
+    if number is None:
+        raise ValueError(f"{value!r} is not an integer")
+    if not INTEGER_MIN <= number <= INTEGER_MAX:
+        raise ValueError(f"{value!r} is out of range for an integer")
+    return number
+
+
+def to_numeric(value):
+    """Coerces a value to NUMERIC. Currency symbols and thousands separators are removed from strings."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"{value!r} is not a number")
+    if isinstance(value, (int, float, Decimal)):
+        return value
+    if isinstance(value, str):
+        try:
+            return Decimal(value.strip().replace('$', '').replace(',', ''))
+        except InvalidOperation:
+            pass
+    raise ValueError(f"{value!r} is not a number")
+
+
+def to_boolean(value):
+    """Coerces a value to BOOLEAN. Raises ValueError for strings that are not a recognized truth value."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in TRUE_STRINGS:
+            return True
+        if text in FALSE_STRINGS:
+            return False
+    raise ValueError(f"{value!r} is not a boolean")
+
+
+COERCERS = {
+    'TEXT': to_text,
+    'INTEGER': to_integer,
+    'NUMERIC': to_numeric,
+    'BOOLEAN': to_boolean,
+}
+
+
+@dataclass(frozen=True)
+class Column:
+    """A column of a wholesaler table and where its value comes from in the scraped JSON."""
+    name: str
+    pg_type: str = 'TEXT'
+    # Dotted path of the value in the source item, defaults to the column name
+    path: str | None = None
+
+    def __post_init__(self):
+        if self.pg_type not in COERCERS:
+            raise ValueError(f"Unsupported type {self.pg_type} for column {self.name}.")
+
+    @property
+    def path_parts(self) -> tuple[str, ...]:
+        return tuple((self.path or self.name).split('.'))
+
+
+def _get_path(item: dict, parts: tuple[str, ...]):
+    value = item
+    for part in parts:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+@dataclass
+class CoercedBatch:
+    """A batch of items coerced column by column, with the items that failed coercion set aside."""
+    column_names: list[str]
+    columns: list[list]
+    valid_indices: list[int]
+    quarantined: list[tuple[dict, dict[str, str]]] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.valid_indices)
+
+    def as_tuples(self) -> list[tuple]:
+        """Returns the valid rows as tuples in column order."""
+        rows = zip(*self.columns)
+        if not self.quarantined:
+            return list(rows)
+        valid = set(self.valid_indices)
+        return [row for index, row in enumerate(rows) if index in valid]
+
+    def valid_columns(self) -> list[list]:
+        """Returns the values of the valid rows, one list per column."""
+        if not self.quarantined:
+            return self.columns
+        return [[values[index] for index in self.valid_indices] for values in self.columns]
+
+    def as_dicts(self) -> list[dict]:
+        """Returns the valid rows as dictionaries keyed by column name."""
+        return [dict(zip(self.column_names, row)) for row in self.as_tuples()]
+
+
+@dataclass(frozen=True)
+class WholesalerSchema:
+    """Declares how a wholesaler's items are stored: the table, its typed columns and how items are identified."""
+    name: str
+    table: str
+    columns: tuple[Column, ...]
+    # The column identifying an item across runs
+    item_key: str
+    # The columns whose changes are recorded in change-only mode
+    change_fields: tuple[str, ...] = ()
+    # The price columns tracked in the latest_price and daily_price_rollup tables
+    price_fields: tuple[str, ...] = ()
+    # The descriptive columns stored with an item's latest price
+    attribute_fields: tuple[str, ...] = ()
+
+    @property
+    def column_names(self) -> list[str]:
+        return [column.name for column in self.columns]
+
+    def coerce(self, items: list[dict]) -> CoercedBatch:
+        """
+        Extracts and coerces the items column by column.
+
+        Each column is converted in a single pass over the batch. Only when a column contains a value
+        that cannot be converted are its values converted one by one to find the failing items, which
+        are quarantined with the reason instead of failing the whole batch.
+        """
+        errors: dict[int, dict[str, str]] = {}
+        columns = []
+        for column in self.columns:
+            parts = column.path_parts
+            if len(parts) == 1:
+                raw = [item.get(parts[0]) for item in items]
+            else:
+                raw = [_get_path(item, parts) for item in items]
+
+            convert = COERCERS[column.pg_type]
+            try:
+                values = list(map(convert, raw))
+            except COERCION_ERRORS:
+                values = []
+                for index, value in enumerate(raw):
+                    try:
+                        values.append(convert(value))
+                    except COERCION_ERRORS as e:
+                        errors.setdefault(index, {})[column.name] = str(e)
+                        values.append(None)
+            columns.append(values)
+
+        valid_indices = [index for index in range(len(items)) if index not in errors]
+        quarantined = [(items[index], errors[index]) for index in sorted(errors)]
+        return CoercedBatch(self.column_names, columns, valid_indices, quarantined)
+
+    def create_table_sql(self) -> str:
+        """Returns the CREATE TABLE statement matching the declared columns."""
+        definitions = ",\n".join(f"    {column.name} {column.pg_type}" for column in self.columns)
+        return (f"CREATE TABLE IF NOT EXISTS {self.table} (\n"
+                f"    scraped_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),\n{definitions}\n);")
+
+
+SCHEMAS: dict[str, WholesalerSchema] = {}
+
+
+def register_schema(schema: WholesalerSchema) -> WholesalerSchema:
+    """Adds a wholesaler schema to the registry and returns it."""
+    SCHEMAS[schema.name] = schema
+    return schema
+
+
+def get_schema(name: str) -> WholesalerSchema:
+    """Returns the registered schema of a wholesaler."""
+    if name not in SCHEMAS:
+        raise KeyError(f"No schema registered for wholesaler '{name}'.")
+    return SCHEMAS[name]
@@ -0,0 +1,94 @@
+from dataclasses import dataclass, field
+
+# Facets accepted by the ParMed product API.
+FACET_NAMES = ("manufacturer", "strength", "form", "labelsize")
+
+
+@dataclass
+class ShardResult:
+    """Item count and timing of a single crawled shard."""
+    facets: dict[str, list[str]]
+    total_count: int | None = None
+    item_count: int = 0
+    page_count: int = 0
+    elapsed: float = 0.0
+    items: list[dict] = field(default_factory=list, repr=False)
+
+    @property
+    def label(self) -> str:
+        """Returns a readable name for the shard, e.g. 'manufacturer=PFIZER'."""
+        selected = [f"{name}={','.join(values)}" for name, values in self.facets.items() if values]
+        return "; ".join(selected) or "unsharded"
+
+
+def empty_facets() -> dict[str, list[str]]:
+    """Returns a facets payload that does not filter on anything."""
+    return {name: [] for name in FACET_NAMES}
+
+
+def plan_facet_shards(facet_name: str, values: list[str]) -> list[dict[str, list[str]]]:
+    """
+    Splits the catalog into one shard per facet value.
+
+    Args:
+        facet_name: The facet to shard on, e.g. 'manufacturer'.
+        values: The facet values, one shard is planned for each distinct value.
+
+    Returns:
+        A list of facets payloads, one per shard.
+    """
+    if facet_name not in FACET_NAMES:
+        raise ValueError(f"Unknown facet '{facet_name}'. Expected one of: {', '.join(FACET_NAMES)}.")
+
+    shards = []
+    for value in dict.fromkeys(values):
+        facets = empty_facets()
+        facets[facet_name] = [value]
+        shards.append(facets)
+    return shards
+
+
+def get_facet_values(json_response: dict, facet_name: str) -> list[str]:
+    """
+    Extracts the available values of a facet from a product API response.
+
+    The facet listing is read from the 'facets' key, either as a mapping of facet name to values
+    or as a list of facet objects. Values may be plain strings or objects with a name/value field.
+    """
+    facets = json_response.get('facets') or json_response.get('facetList') or {}
+    if isinstance(facets, list):
+        entries = next(
+            (facet.get('values') or facet.get('facetValues') or [] for facet in facets
+             if isinstance(facet, dict) and str(facet.get('name', '')).lower() == facet_name),
+            []
+        )
+    else:
+        entries = next((value for key, value in facets.items() if key.lower() == facet_name), [])
+
+    values = []
+    for entry in entries or []:
+        if isinstance(entry, dict):
+            entry = entry.get('value') or entry.get('name')
+        if entry:
+            values.append(str(entry))
+    return values
+
+
+def shards_cover_catalog(results: list[ShardResult], catalog_total: int | None) -> bool:
+    """
+    Checks that the shards together account for every item of the unfiltered catalog.
+
+    Items without a value for the sharded facet, or facet values missing from a truncated facet
+    listing, fall outside every shard. They show up as shard totals that add up to less than the
+    catalog total. Coverage cannot be verified when the API does not report the totals.
+    """
+    if catalog_total is None or any(result.total_count is None for result in results):
+        return False
+    return sum(result.total_count for result in results) >= catalog_total
+
+
+def print_shard_report(results: list[ShardResult]):
+    """Prints the per-shard item counts and timings of a sharded crawl."""
+    print(f"Crawled {len(results)} shards:")
+    for result in sorted(results, key=lambda r: r.elapsed, reverse=True):
+        print(f"  {result.label}: {result.item_count} items, {result.page_count} pages, {result.elapsed:.2f}s")
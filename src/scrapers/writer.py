@@ -0,0 +1,195 @@
+import json
+import asyncio
+from datetime import datetime, timezone
+
+from psycopg2.extras import execute_values
+
+from .schema import CoercedBatch, WholesalerSchema
+from ..utils.archive import SnapshotArchiveWriter, get_archive_dir
+from ..utils.bulk_load import bulk_insert
+from ..utils.db_pool import AsyncPostgresPool
+from ..utils.partitions import ensure_future_partitions
+from ..utils.price_rollup import observe_unchanged_prices, update_price_rollups
+from ..utils.change_capture import SnapshotChanges, diff_items, find_disappeared, load_item_state, save_item_state
+
+# Item keys of unchanged pages folded into the rollups per statement
+OBSERVE_CHUNK_SIZE = 10000
+
+
+def save_quarantined(cur, wholesaler: str, item_key: str, quarantined: list[tuple[dict, dict]], scraped_at):
+    """Stores items that failed type coercion together with the reasons, so they can be inspected and replayed."""
+    execute_values(
+        cur,
+        """
+        INSERT INTO wholesaler_tracking.quarantine (wholesaler, item_key, errors, payload, scraped_at)
+        VALUES %s
+        """,
+        [
+            # JSONB cannot store null characters
+            (wholesaler, None if item.get(item_key) is None else str(item.get(item_key)),
+             json.dumps(errors), json.dumps(item, default=str).replace('\\u0000', ''), scraped_at)
+            for item, errors in quarantined
+        ]
+    )
+
+
+class SnapshotWriter:
+    """
+    Writes one run of a scraper to Postgres in batches.
+
+    Every batch is coerced to the wholesaler's schema and written in its own transaction on a
+    connection borrowed from the shared pool, so writers of different scrapers run concurrently.
+    Items that fail coercion go to the quarantine table instead of failing the batch. All batches
+    of a run share the same scraped_at timestamp. Each batch also updates the latest_price and
+    daily_price_rollup tables in the transaction that inserts it. If the table is partitioned, the
+    upcoming monthly partitions are created before the first batch. If SNAPSHOT_ARCHIVE_DIR is set,
+    the full snapshot is also written to the Parquet archive, which is why scrapers do not skip
+    unchanged pages then. In change-only mode the item state is loaded once, each batch writes its
+    new and changed items, items of skipped pages are folded into the rollups by observe_unchanged(),
+    and finish() records the items that disappeared.
+    """
+
+    def __init__(self, schema: WholesalerSchema, pool: AsyncPostgresPool, change_only: bool = False):
+        self.schema = schema
+        self.pool = pool
+        self.change_only = change_only
+        self.scraped_at = datetime.now(timezone.utc)
+        self.row_count = 0
+        self.item_count = 0
+        self.quarantined_count = 0
+        # Only the counts of the run are kept, the rows are released once written
+        self.changes = SnapshotChanges()
+        self._state = None
+        self._seen: set[str] = set()
+        self._partitions_ready = False
+        archive_dir = get_archive_dir()
+        self._archive = SnapshotArchiveWriter(
+            archive_dir, schema.name, [(column.name, column.pg_type) for column in schema.columns], self.scraped_at
+        ) if archive_dir else None
+
+    def _ensure_partitions(self, conn):
+        with conn, conn.cursor() as cur:
+            created = ensure_future_partitions(cur, self.schema.table)
+        if created:
+            print(f"Created partitions {', '.join(created)} for {self.schema.table}.")
+
+    def _load_state(self, conn) -> dict:
+        with conn, conn.cursor() as cur:
+            return load_item_state(cur, self.schema.name)
+
+    def _quarantine(self, conn, quarantined: list[tuple[dict, dict]]):
+        with conn, conn.cursor() as cur:
+            save_quarantined(cur, self.schema.name, self.schema.item_key, quarantined, self.scraped_at)
+
+    def _update_rollups(self, cur, items: list[dict]):
+        update_price_rollups(
+            cur, self.schema.name, self.schema.item_key, self.schema.price_fields, self.schema.attribute_fields,
+            items, self.scraped_at
+        )
+
+    def _save_rollups(self, conn, items: list[dict]):
+        with conn, conn.cursor() as cur:
+            self._update_rollups(cur, items)
+
+    def _insert_changes(self, conn, changes: SnapshotChanges, items: list[dict]) -> int:
+        columns = [*self.schema.column_names, "content_hash", "change_type"]
+        rows = [tuple(row.get(column) for column in columns) for row in changes.rows]
+
+        def on_loaded(cur):
+            save_item_state(cur, self.schema.name, changes, self.scraped_at)
+            self._update_rollups(cur, items)
+
+        return bulk_insert(conn, self.schema.table, columns, rows, {"scraped_at": self.scraped_at}, on_loaded=on_loaded)
+
+    def _insert_rows(self, conn, coerced: CoercedBatch) -> int:
+        return bulk_insert(
+            conn,
+            self.schema.table,
+            self.schema.column_names,
+            coerced.as_tuples(),
+            {"scraped_at": self.scraped_at},
+            on_loaded=lambda cur: self._update_rollups(cur, coerced.as_dicts())
+        )
+
+    async def _write_changes(self, changes: SnapshotChanges, items: list[dict]):
+        self.changes.merge_counts(changes)
+        if changes.rows:
+            self.row_count += await self.pool.run(self._insert_changes, changes, items)
+        elif items:
+            # Unchanged items are still observed today
+            await self.pool.run(self._save_rollups, items)
+
+    async def write(self, batch: list[dict]):
+        """Coerces a batch of items and writes it in its own transaction."""
+        if not batch:
+            return
+        self.item_count += len(batch)
+        if not self._partitions_ready:
+            await self.pool.run(self._ensure_partitions)
+            self._partitions_ready = True
+
+        coerced = self.schema.coerce(batch)
+        if coerced.quarantined:
+            self.quarantined_count += len(coerced.quarantined)
+            print(f"Quarantined {len(coerced.quarantined)} {self.schema.name} items that failed type coercion.")
+            await self.pool.run(self._quarantine, coerced.quarantined)
+            # Quarantined items are still present, they must not be reported as disappeared
+            self._seen.update(str(item.get(self.schema.item_key)) for item, _ in coerced.quarantined)
+
+        if self._archive is not None and len(coerced):
+            # The archive always receives the full snapshot, also in change-only mode
+            await asyncio.to_thread(self._archive.write_columns, coerced.valid_columns())
+
+        if not self.change_only:
+            if len(coerced):
+                self.row_count += await self.pool.run(self._insert_rows, coerced)
+            return
+
+        if self._state is None:
+            self._state = await self.pool.run(self._load_state)
+        items = coerced.as_dicts()
+        changes = diff_items(items, self.schema.item_key, self.schema.change_fields, self._state, self._seen)
+        await self._write_changes(changes, items)
+
+    def mark_seen(self, item_keys):
+        """Counts items as present that were not written, e.g. because their page did not change."""
+        self._seen.update(item_keys)
+
+    def _observe_unchanged(self, conn, item_keys: list[str]) -> int:
+        with conn, conn.cursor() as cur:
+            return observe_unchanged_prices(cur, self.schema.name, item_keys, self.scraped_at)
+
+    async def observe_unchanged(self, item_keys):
+        """
+        Records items of pages that did not change as seen today and counts them as present.
+
+        Their prices are unchanged, so the latest_price and daily_price_rollup tables are updated from
+        the latest known prices. Items already written by this run are not counted twice.
+        """
+        keys = sorted(set(item_keys) - self._seen)
+        for i in range(0, len(keys), OBSERVE_CHUNK_SIZE):
+            await self.pool.run(self._observe_unchanged, keys[i:i + OBSERVE_CHUNK_SIZE])
+        self.mark_seen(keys)
+
+    async def finish(self, complete: bool = True):
+        """
+        Completes a successful run. In change-only mode, records the items that were not seen.
+
+        Args:
+            complete: False if the run did not see the whole catalog, e.g. because pages could not be
+                fetched. Items that were not seen are then not recorded as disappeared.
+        """
+        if self.change_only and not complete:
+            print(f"Skipping disappeared {self.schema.name} items, the run did not see the whole catalog.")
+        elif self.change_only and self._state is None and self._seen:
+            # No batch was written, e.g. because every page was unchanged, but items of pages that are gone can still have disappeared
+            self._state = await self.pool.run(self._load_state)
+        if self.change_only and complete and self._state is not None:
+            await self._write_changes(find_disappeared(self.schema.item_key, self._state, self._seen), [])
+            print(f"{self.schema.name} changes: {self.changes.summary()}.")
+        if self._archive is not None:
+            path = await asyncio.to_thread(self._archive.close)
+            if path:
+                print(f"Archived {self._archive.row_count} {self.schema.name} rows into {path}.")
+        print(f"Saved {self.row_count} rows for {self.item_count} {self.schema.name} items into {self.schema.table} "
+              f"({self.quarantined_count} quarantined).")
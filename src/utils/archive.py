@@ -0,0 +1,122 @@
+import os
+import uuid
+from datetime import date, datetime, timezone
+from typing import Sequence
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+
+# Arrow types of the declared Postgres column types. Prices are archived as doubles for analysis.
+ARROW_TYPES = {
+    "TEXT": pa.string(),
+    "INTEGER": pa.int64(),
+    "NUMERIC": pa.float64(),
+    "BOOLEAN": pa.bool_(),
+}
+
+SCRAPED_AT_TYPE = pa.timestamp("us", tz="UTC")
+
+# Partition directories: <root>/wholesaler=<name>/date=<YYYY-MM-DD>/<file>.parquet
+PARTITIONING = ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive")
+
+
+def get_archive_dir() -> str | None:
+    """Returns the snapshot archive directory, or None when archiving is disabled."""
+    return os.environ.get("SNAPSHOT_ARCHIVE_DIR") or None
+
+
+def to_arrow_array(values: list, arrow_type: pa.DataType) -> pa.Array:
+    # Arrow does not convert decimals to doubles, and a mix of decimals and floats cannot be inferred at all
+    if pa.types.is_floating(arrow_type):
+        return pa.array([None if value is None else float(value) for value in values], type=arrow_type)
+    return pa.array(values, type=arrow_type)
+
+
+class SnapshotArchiveWriter:
+    """
+    Writes one run of a wholesaler to a Parquet file in the snapshot archive.
+
+    Batches are appended as row groups, compressed with zstd and dictionary-encoded. The file is
+    written under a hidden name and only renamed into its date partition by close(), so readers
+    never see the snapshot of a failed or running run.
+    """
+
+    def __init__(self, root: str, wholesaler: str, column_types: Sequence[tuple[str, str]], scraped_at: datetime):
+        self.scraped_at = scraped_at
+        directory = os.path.join(root, f"wholesaler={wholesaler}", f"date={scraped_at.astimezone(timezone.utc):%Y-%m-%d}")
+        filename = f"{scraped_at.astimezone(timezone.utc):%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+        self.path = os.path.join(directory, filename)
+        self._temp_path = os.path.join(directory, f".{filename}.tmp")
+        self.schema = pa.schema(
+            [(name, ARROW_TYPES[pg_type]) for name, pg_type in column_types] + [("scraped_at", SCRAPED_AT_TYPE)]
+        )
+        self.row_count = 0
+        self._writer = None
+
+    def write_columns(self, columns: list[list]):
+        """Appends a batch given as one list of values per column, in schema order."""
+        row_count = len(columns[0]) if columns else 0
+        if not row_count:
+            return
+        arrays = [to_arrow_array(values, field.type) for values, field in zip(columns, self.schema)]
+        arrays.append(pa.array([self.scraped_at] * row_count, type=SCRAPED_AT_TYPE))
+
+        if self._writer is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._writer = pq.ParquetWriter(self._temp_path, self.schema, compression="zstd", use_dictionary=True)
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.row_count += row_count
+
+    def close(self) -> str | None:
+        """Completes the file and publishes it in its partition. Returns its path, or None if nothing was written."""
+        if self._writer is None:
+            return None
+        self._writer.close()
+        self._writer = None
+        os.replace(self._temp_path, self.path)
+        return self.path
+
+
+def open_archive(wholesaler: str, archive_dir: str | None = None) -> ds.Dataset:
+    """Opens the archived snapshots of a wholesaler as a dataset over memory-mapped files."""
+    root = archive_dir or get_archive_dir() or "archive"
+    return ds.dataset(
+        os.path.join(root, f"wholesaler={wholesaler}"),
+        format="parquet",
+        partitioning=PARTITIONING,
+        filesystem=pafs.LocalFileSystem(use_mmap=True)
+    )
+
+
+def read_archive(
+    wholesaler: str,
+    start: date,
+    end: date,
+    columns: list[str] | None = None,
+    filter: ds.Expression | None = None,
+    archive_dir: str | None = None
+) -> pa.Table:
+    """
+    Reads the archived snapshots of a wholesaler between two dates, both included.
+
+    Only the date partitions of the range are opened, only the requested columns are read, and the
+    filter is pushed down to skip row groups by their statistics before rows are filtered.
+
+    Args:
+        wholesaler: The wholesaler name, e.g. 'parmed'.
+        start: The first day to read.
+        end: The last day to read.
+        columns: The columns to read, or None for all of them.
+        filter: A predicate such as ds.field('price') > 10.
+        archive_dir: The archive directory, by default SNAPSHOT_ARCHIVE_DIR or ./archive.
+
+    Returns:
+        The matching rows as an Arrow table. Use .to_pandas() for a DataFrame.
+    """
+    predicate = (ds.field("date") >= start.isoformat()) & (ds.field("date") <= end.isoformat())
+    if filter is not None:
+        predicate = predicate & filter
+    return open_archive(wholesaler, archive_dir).to_table(columns=columns, filter=predicate)
@@ -1,18 +1,41 @@
 import os
+import time
 import dotenv
 import asyncio
 from langchain_openai import ChatOpenAI
 from browser_use import Agent, BrowserSession
 from playwright.async_api import async_playwright, BrowserContext
 
-from .core import setup_proxy
+from .proxy_pool import get_proxy_pool
+from .token_store import get_token_store
 
 dotenv.load_dotenv()
 
-llm = ChatOpenAI(model="gpt-4.1", temperature=0.0)
+llm = None
 
 captured_token = None
 token_found = False
+token_event: asyncio.Event | None = None
+
+# Selectors used by the scripted login, the LLM agent only takes over when they stop matching
+PARMED_LOGIN_SELECTORS = {
+    "sign_in": 'a:has-text("Sign In"), button:has-text("Sign In")',
+    "username": 'input[type="email"], input[name*="user" i], input[id*="user" i]',
+    "password": 'input[type="password"]',
+    "submit": 'button[type="submit"], input[type="submit"], button:has-text("Sign In"), button:has-text("Log In")',
+}
+SCRIPTED_LOGIN_TIMEOUT_SECONDS = 20
+
+# Serializes token lookups so concurrent scrapers share a single login
+token_lock = asyncio.Lock()
+
+
+def get_llm():
+    """Returns the LLM of the login agent, created on first use as only the fallback path needs it."""
+    global llm
+    if llm is None:
+        llm = ChatOpenAI(model="gpt-4.1", temperature=0.0)
+    return llm
 
 async def handle_request(route, browser_context: BrowserContext | None):
     global captured_token
@@ -24,6 +47,8 @@ async def handle_request(route, browser_context: BrowserContext | None):
             captured_token = headers["access-token"]
             token_found = True
             print(f"Access Token captured (access-token): {captured_token}")
+            if token_event:
+                token_event.set()
             if browser_context:
                 await browser_context.close()
             return
@@ -31,13 +56,47 @@ async def handle_request(route, browser_context: BrowserContext | None):
     await route.continue_()
 
 
-async def get_parmed_token():
+async def scripted_login(page) -> bool:
+    """
+    Logs in by filling the Sign In form with PARMED_LOGIN_SELECTORS and waits for the access token.
+
+    Returns:
+        Whether the token was captured within SCRIPTED_LOGIN_TIMEOUT_SECONDS.
+    """
+    username = os.getenv('PARMED_USERNAME')
+    password = os.getenv('PARMED_PASSWORD')
+    if not username or not password:
+        print("PARMED_USERNAME or PARMED_PASSWORD is not set, skipping the scripted login.")
+        return False
+
+    timeout_ms = SCRIPTED_LOGIN_TIMEOUT_SECONDS * 1000
+    try:
+        async with asyncio.timeout(SCRIPTED_LOGIN_TIMEOUT_SECONDS):
+            await page.click(PARMED_LOGIN_SELECTORS["sign_in"], timeout=timeout_ms)
+            await page.fill(PARMED_LOGIN_SELECTORS["username"], username, timeout=timeout_ms)
+            await page.fill(PARMED_LOGIN_SELECTORS["password"], password, timeout=timeout_ms)
+            await page.click(PARMED_LOGIN_SELECTORS["submit"], timeout=timeout_ms)
+            await token_event.wait()
+        return True
+    except Exception as e:
+        # handle_request closes the context once the token is captured, which can interrupt the last step
+        if token_found:
+            return True
+        print(f"Scripted login failed: {type(e).__name__}: {e}")
+        return False
+
+
+async def login_for_parmed_token():
+    """Logs in to ParMed in a browser and returns the access token captured from the API requests."""
     global captured_token
+    global token_found
+    global token_event
+    captured_token = None
+    token_found = False
+    token_event = asyncio.Event()
     async with async_playwright() as p:
-        launch_options = setup_proxy(validate_proxy=False, browser_format=True)
-
-        if launch_options is None:
-            return None # Stop execution if proxy settings are not available
+        # Log in through the same sticky proxy session the ParMed API requests use
+        launch_options = get_proxy_pool().choose('parmed').browser_config
 
         browser_session_instance = BrowserSession(
             playwright=p,
@@ -49,40 +108,71 @@ async def get_parmed_token():
 
         await browser_session_instance.start()
 
-        page = await browser_session_instance.get_current_page()
-
-        if not page:
-            print("ERROR: Could not get current page from browser_session after start().")
-            await browser_session_instance.stop() # Ensure browser is closed
-            return None
-
-        # Use the page object to set up route handling
-        await page.route("https://api.cardinalhealth.com/**", lambda route: handle_request(route, page.context))
-
-        print(f"Navigating to https://www.parmed.com/home using page from BrowserSession...")
-        await page.goto(
-            'https://www.parmed.com/home',
-            # wait_until='domcontentloaded'
-        )
-
-        agent = Agent(
-            browser_session=browser_session_instance,
-            task=f"You are on the Parmed website. Login to the website via the 'Sign In' button on the top right of the page. Use the username {os.getenv('PARMED_USERNAME')} and the password {os.getenv('PARMED_PASSWORD')}. If you are already loggend in to the website - do nothing.",
-            llm=llm,
-            use_vision=False,
-            enable_memory=False
-        )
-
-        print("Running agent to log in...")
-        await agent.run()
-        print("Agent finished.")
-
-        # Ensure the browser session is stopped after the task is complete
-        await browser_session_instance.stop()
+        try:
+            page = await browser_session_instance.get_current_page()
+
+            if not page:
+                print("ERROR: Could not get current page from browser_session after start().")
+                return None
+
+            # Use the page object to set up route handling
+            await page.route("https://api.cardinalhealth.com/**", lambda route: handle_request(route, page.context))
+
+            print(f"Navigating to https://www.parmed.com/home using page from BrowserSession...")
+            await page.goto(
+                'https://www.parmed.com/home',
+                # wait_until='domcontentloaded'
+            )
+
+            start = time.perf_counter()
+            print("Logging in with the scripted login...")
+            if await scripted_login(page):
+                print(f"Logged in via scripted login in {time.perf_counter() - start:.1f}s.")
+            else:
+                agent = Agent(
+                    browser_session=browser_session_instance,
+                    task=f"You are on the Parmed website. Login to the website via the 'Sign In' button on the top right of the page. Use the username {os.getenv('PARMED_USERNAME')} and the password {os.getenv('PARMED_PASSWORD')}. If you are already loggend in to the website - do nothing.",
+                    llm=get_llm(),
+                    use_vision=False,
+                    enable_memory=False
+                )
+
+                start = time.perf_counter()
+                print("Running agent to log in...")
+                await agent.run()
+                print(f"Agent finished in {time.perf_counter() - start:.1f}s (token captured: {token_found}).")
+        finally:
+            # Ensure the browser session is stopped, also when the login raised
+            await browser_session_instance.stop()
 
         print(f"Final captured token: {captured_token}")
         return captured_token
 
 
+async def get_parmed_token(validate=None, force_refresh: bool = False):
+    """
+    Returns a ParMed access token, logging in through the browser only when no usable token is stored.
+
+    Args:
+        validate: An optional coroutine function that probes the API with a token and returns whether it was accepted.
+        force_refresh: If True, skips the stored token and always logs in.
+    """
+    async with token_lock:
+        store = get_token_store('parmed')
+
+        if not force_refresh:
+            token = await asyncio.to_thread(store.get)
+            if token and (validate is None or await validate(token)):
+                return token
+            if token:
+                print("Cached ParMed token was rejected, logging in again.")
+                await asyncio.to_thread(store.invalidate)
+
+        token = await login_for_parmed_token()
+        if token:
+            await asyncio.to_thread(store.save, token)
+        return token
+
+
 if __name__ == "__main__":
     asyncio.run(get_parmed_token())
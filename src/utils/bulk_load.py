@@ -0,0 +1,171 @@
+import io
+import re
+import json
+import time
+from datetime import date, datetime
+from typing import Callable, Iterable, Sequence
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+# Characters that must be escaped in PostgreSQL's COPY text format (null bytes are dropped)
+COPY_SPECIAL_CHARACTERS = re.compile(r'[\\\t\n\r\x00]')
+COPY_NULL = '\\N'
+
+
+def _escape_copy_text(value: str) -> str:
+    """Escapes a string for the COPY text format, skipping the work for strings without special characters."""
+    if COPY_SPECIAL_CHARACTERS.search(value) is None:
+        return value
+    return (value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+            .replace('\r', '\\r').replace('\x00', ''))
+
+
+def encode_copy_value(value) -> str:
+    """Encodes a single value in PostgreSQL's COPY text format. Null bytes are stripped."""
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, str):
+        return _escape_copy_text(value)
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return _escape_copy_text(json.dumps(value))
+    return _escape_copy_text(str(value))
+
+
+class CopyRowStream(io.TextIOBase):
+    """
+    A read-only file that encodes rows lazily in COPY text format.
+
+    psycopg2 pulls the data with read(size), so only a small window of the rows is encoded
+    at any time instead of building the whole buffer up front.
+    """
+
+    def __init__(self, rows: Iterable[Sequence], suffix_values: Sequence = ()):
+        """
+        Args:
+            rows: The rows to encode, each a sequence of values in column order.
+            suffix_values: Values appended to every row, e.g. the scrape timestamp.
+        """
+        self._rows = iter(rows)
+        self._suffix = ''.join('\t' + encode_copy_value(value) for value in suffix_values) + '\n'
+        self._buffer = ''
+        self.row_count = 0
+        self.byte_count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def _encode_row(self, row: Sequence) -> str:
+        return '\t'.join([encode_copy_value(value) for value in row]) + self._suffix
+
+    def read(self, size: int = -1) -> str:
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            row = next(self._rows, None)
+            if row is None:
+                break
+            line = self._encode_row(row)
+            chunks.append(line)
+            length += len(line)
+            self.row_count += 1
+
+        data = ''.join(chunks)
+        if size >= 0:
+            data, self._buffer = data[:size], data[size:]
+        else:
+            self._buffer = ''
+        # psycopg2 sends the text encoded, so non-ASCII characters count with their UTF-8 length
+        self.byte_count += len(data.encode('utf-8'))
+        return data
+
+
+def copy_rows(cur, table: str, columns: Sequence[str], rows: Iterable[Sequence], extra_columns: dict | None = None) -> tuple[int, int]:
+    """
+    Streams rows into a table with COPY FROM STDIN.
+
+    Args:
+        cur: An open cursor.
+        table: The qualified table name.
+        columns: The columns of the rows.
+        rows: The rows to load, each a sequence of values in column order.
+        extra_columns: Columns with the same value for every row, e.g. {'scraped_at': now}.
+
+    Returns:
+        The number of rows and bytes sent.
+    """
+    extra_columns = extra_columns or {}
+    stream = CopyRowStream(rows, list(extra_columns.values()))
+    column_list = ", ".join([*columns, *extra_columns.keys()])
+    cur.copy_expert(f"COPY {table} ({column_list}) FROM STDIN", stream, size=1 << 16)
+    return stream.row_count, stream.byte_count
+
+
+def _strip_null_bytes(value):
+    """Removes null bytes from string values to prevent PostgreSQL insertion errors."""
+    if isinstance(value, str):
+        return value.replace('\x00', '')
+    return value
+
+
+def insert_rows(cur, table: str, columns: Sequence[str], rows: Iterable[Sequence], extra_columns: dict | None = None) -> int:
+    """Inserts rows with execute_values. Used when COPY is not available."""
+    extra_columns = extra_columns or {}
+    extra_values = tuple(extra_columns.values())
+    values = [tuple(map(_strip_null_bytes, row)) + extra_values for row in rows]
+    column_list = ", ".join([*columns, *extra_columns.keys()])
+    execute_values(cur, f"INSERT INTO {table} ({column_list}) VALUES %s", values)
+    return len(values)
+
+
+def bulk_insert(
+    conn,
+    table: str,
+    columns: Sequence[str],
+    rows: Sequence[Sequence],
+    extra_columns: dict | None = None,
+    on_loaded: Callable | None = None
+) -> int:
+    """
+    Loads rows into a table in one transaction, with COPY and falling back to execute_values.
+
+    Only a failed COPY falls back: it is rolled back to a savepoint and the rows are inserted with
+    execute_values in the same transaction. Errors of on_loaded roll back the whole transaction and
+    are raised. Prints the row count and throughput of the write.
+
+    Args:
+        conn: An open connection.
+        table: The qualified table name.
+        columns: The columns of the rows.
+        rows: The rows to load, each a sequence of values in column order.
+        extra_columns: Columns with the same value for every row, e.g. {'scraped_at': now}.
+        on_loaded: Called with the cursor after the rows are loaded, to make further writes in the same transaction.
+
+    Returns:
+        The number of inserted rows.
+    """
+    with conn, conn.cursor() as cur:
+        start = time.perf_counter()
+        cur.execute("SAVEPOINT bulk_copy")
+        try:
+            row_count, byte_count = copy_rows(cur, table, columns, rows, extra_columns)
+            cur.execute("RELEASE SAVEPOINT bulk_copy")
+            elapsed = time.perf_counter() - start
+            megabytes = byte_count / 1_000_000
+            print(f"COPY loaded {row_count} rows ({megabytes:.2f} MB) into {table} in {elapsed:.2f}s ({megabytes / max(elapsed, 1e-9):.1f} MB/s).")
+        except psycopg2.Error as e:
+            print(f"COPY into {table} failed, falling back to execute_values: {e}")
+            cur.execute("ROLLBACK TO SAVEPOINT bulk_copy")
+            start = time.perf_counter()
+            row_count = insert_rows(cur, table, columns, rows, extra_columns)
+            print(f"execute_values inserted {row_count} rows into {table} in {time.perf_counter() - start:.2f}s.")
+
+        if on_loaded is not None:
+            on_loaded(cur)
+    return row_count
@@ -0,0 +1,140 @@
+import json
+import hashlib
+from dataclasses import dataclass, field
+from typing import Sequence
+
+from psycopg2.extras import execute_values
+
+NEW = 'new'
+CHANGED = 'changed'
+DISAPPEARED = 'disappeared'
+
+
+def content_hash(item: dict, fields: Sequence[str]) -> str:
+    """Returns a compact hash of the compared fields of an item."""
+    payload = json.dumps([item.get(name) for name in fields], default=str, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode(), digest_size=8).hexdigest()
+
+
+@dataclass
+class SnapshotChanges:
+    """The rows to write for one run and the item state updates that go with them."""
+    rows: list[dict] = field(default_factory=list)
+    state_updates: list[tuple[str, str | None, bool]] = field(default_factory=list)
+    new_count: int = 0
+    changed_count: int = 0
+    disappeared_count: int = 0
+    unchanged_count: int = 0
+
+    def merge(self, other: "SnapshotChanges"):
+        """Adds the rows, state updates and counts of another set of changes."""
+        self.rows += other.rows
+        self.state_updates += other.state_updates
+        self.merge_counts(other)
+
+    def merge_counts(self, other: "SnapshotChanges"):
+        """Adds only the counts of another set of changes, e.g. to total a run without keeping its rows."""
+        self.new_count += other.new_count
+        self.changed_count += other.changed_count
+        self.disappeared_count += other.disappeared_count
+        self.unchanged_count += other.unchanged_count
+
+    def summary(self) -> str:
+        return (f"{self.new_count} new, {self.changed_count} changed, "
+                f"{self.disappeared_count} disappeared, {self.unchanged_count} unchanged")
+
+
+def diff_items(
+    items: list[dict],
+    key: str,
+    fields: Sequence[str],
+    state: dict[str, tuple[str, bool]],
+    seen: set[str]
+) -> SnapshotChanges:
+    """
+    Compares a batch of scraped items with the latest known state of each item.
+
+    Args:
+        items: The scraped items.
+        key: The field identifying an item, e.g. 'itemId'.
+        fields: The fields whose changes are recorded, e.g. price and availability.
+        state: The latest known (content hash, present) per item key.
+        seen: The item keys already handled in this run. Updated with the keys of this batch.
+
+    Returns:
+        The new and changed items, with 'content_hash' and 'change_type' set, and the matching state updates.
+    """
+    changes = SnapshotChanges()
+    for item in items:
+        item_key = item.get(key)
+        if item_key is None or str(item_key) in seen:
+            continue
+        item_key = str(item_key)
+        seen.add(item_key)
+
+        item_hash = content_hash(item, fields)
+        previous = state.get(item_key)
+        if previous is not None and previous[1] and previous[0] == item_hash:
+            changes.unchanged_count += 1
+            continue
+
+        if previous is None or not previous[1]:
+            change_type = NEW
+            changes.new_count += 1
+        else:
+            change_type = CHANGED
+            changes.changed_count += 1
+        changes.rows.append({**item, 'content_hash': item_hash, 'change_type': change_type})
+        changes.state_updates.append((item_key, item_hash, True))
+    return changes
+
+
+def find_disappeared(key: str, state: dict[str, tuple[str, bool]], seen: set[str]) -> SnapshotChanges:
+    """Returns a tombstone row and state update for every present item that was not seen in this run."""
+    changes = SnapshotChanges()
+    for item_key, (_, present) in state.items():
+        if present and item_key not in seen:
+            changes.disappeared_count += 1
+            changes.rows.append({key: item_key, 'change_type': DISAPPEARED})
+            changes.state_updates.append((item_key, None, False))
+    return changes
+
+
+def diff_snapshot(items: list[dict], key: str, fields: Sequence[str], state: dict[str, tuple[str, bool]]) -> SnapshotChanges:
+    """
+    Compares a complete scraped snapshot with the latest known state of each item.
+
+    Returns the new and changed items, a tombstone row for every item that disappeared,
+    and the matching state updates.
+    """
+    seen = set()
+    changes = diff_items(items, key, fields, state, seen)
+    changes.merge(find_disappeared(key, state, seen))
+    return changes
+
+
+def load_item_state(cur, wholesaler: str) -> dict[str, tuple[str, bool]]:
+    """Loads the latest known content hash and presence of every item of a wholesaler."""
+    cur.execute(
+        "SELECT item_key, content_hash, present FROM wholesaler_tracking.item_state WHERE wholesaler = %s",
+        (wholesaler,)
+    )
+    return {item_key: (item_hash, present) for item_key, item_hash, present in cur}
+
+
+def save_item_state(cur, wholesaler: str, changes: SnapshotChanges, scraped_at):
+    """Records the state updates of a run. Unchanged items keep their existing state rows."""
+    if not changes.state_updates:
+        return
+    execute_values(
+        cur,
+        """
+        INSERT INTO wholesaler_tracking.item_state (wholesaler, item_key, content_hash, present, changed_at)
+        VALUES %s
+        ON CONFLICT (wholesaler, item_key) DO UPDATE
+        SET content_hash = COALESCE(EXCLUDED.content_hash, item_state.content_hash),
+            present = EXCLUDED.present,
+            changed_at = EXCLUDED.changed_at
+        """,
+        [(wholesaler, item_key, item_hash, present, scraped_at) for item_key, item_hash, present in changes.state_updates]
+    )
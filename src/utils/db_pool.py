@@ -0,0 +1,81 @@
+import os
+import asyncio
+from typing import Callable
+from contextlib import asynccontextmanager
+
+from psycopg2.pool import ThreadedConnectionPool
+
+DEFAULT_POOL_SIZE = 4
+
+
+class AsyncPostgresPool:
+    """
+    A Postgres connection pool shared by all scrapers.
+
+    Connections come from a psycopg2 ThreadedConnectionPool and every blocking call runs in a
+    worker thread, so database I/O never blocks the event loop. Callers wait for a free connection
+    instead of failing when all of them are in use.
+    """
+
+    def __init__(self, dsn: str, min_size: int = 1, max_size: int = DEFAULT_POOL_SIZE):
+        """
+        Args:
+            dsn: The Postgres connection string.
+            min_size: The number of connections opened up front.
+            max_size: The maximum number of open connections.
+        """
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self._semaphore = asyncio.Semaphore(max_size)
+        self._pool: ThreadedConnectionPool | None = None
+
+    async def _get_pool(self) -> ThreadedConnectionPool:
+        if self._pool is None:
+            self._pool = await asyncio.to_thread(ThreadedConnectionPool, self.min_size, self.max_size, dsn=self.dsn)
+        return self._pool
+
+    @asynccontextmanager
+    async def connection(self):
+        """Borrows a connection from the pool for the duration of the block."""
+        async with self._semaphore:
+            pool = await self._get_pool()
+            conn = await asyncio.to_thread(pool.getconn)
+            try:
+                yield conn
+            finally:
+                # Connections left in a failed state are discarded instead of being reused
+                await asyncio.to_thread(pool.putconn, conn, close=bool(conn.closed))
+
+    async def run(self, func: Callable, *args):
+        """Calls func(conn, *args) in a worker thread with a pooled connection and returns its result."""
+        async with self.connection() as conn:
+            return await asyncio.to_thread(func, conn, *args)
+
+    async def close(self):
+        """Closes all pooled connections."""
+        if self._pool is not None:
+            await asyncio.to_thread(self._pool.closeall)
+            self._pool = None
+
+
+_pool: AsyncPostgresPool | None = None
+
+
+def get_db_pool() -> AsyncPostgresPool | None:
+    """Returns the process-wide connection pool, or None if POSTGRES_CONNECTION_STRING is not set."""
+    global _pool
+    if _pool is None:
+        pg_conn_str = os.environ.get("POSTGRES_CONNECTION_STRING")
+        if not pg_conn_str:
+            return None
+        _pool = AsyncPostgresPool(pg_conn_str, max_size=int(os.environ.get("POSTGRES_POOL_SIZE", DEFAULT_POOL_SIZE)))
+    return _pool
+
+
+async def close_db_pool():
+    """Closes the process-wide connection pool."""
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -0,0 +1,150 @@
+import hashlib
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from psycopg2.extras import execute_values
+
+from .db_pool import AsyncPostgresPool
+from .metrics import metrics
+
+
+def payload_fingerprint(body: bytes) -> str:
+    """Returns a compact hash of a response body."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+@dataclass
+class PageFingerprint:
+    """What is known about a page from the run that last fetched it."""
+    fingerprint: str
+    etag: str | None = None
+    last_modified: str | None = None
+    # Keys of the items on the page, so that skipped pages still count their items as present
+    item_keys: list[str] = field(default_factory=list)
+
+
+class FingerprintStore:
+    """
+    Fingerprints of the pages of one wholesaler, used to skip pages that did not change since the last run.
+
+    A page is unchanged when the server answers a conditional request with 304 Not Modified, or when
+    the body hashes to the stored fingerprint. New fingerprints are kept in memory and only saved by
+    save(), after the run's items have been written, so a failed run never hides changes from the next one.
+    """
+
+    def __init__(self, wholesaler: str, pool: AsyncPostgresPool):
+        self.wholesaler = wholesaler
+        self.pool = pool
+        self.previous: dict[str, PageFingerprint] = {}
+        self.updates: dict[str, PageFingerprint] = {}
+        self.unchanged: set[str] = set()
+
+    def _load(self, conn) -> dict[str, PageFingerprint]:
+        with conn, conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT page_key, fingerprint, etag, last_modified, item_keys
+                FROM wholesaler_tracking.page_fingerprints
+                WHERE wholesaler = %s
+                """,
+                (self.wholesaler,)
+            )
+            return {
+                page_key: PageFingerprint(fingerprint, etag, last_modified, list(item_keys or []))
+                for page_key, fingerprint, etag, last_modified, item_keys in cur.fetchall()
+            }
+
+    async def load(self):
+        """Loads the fingerprints stored by previous runs."""
+        self.previous = await self.pool.run(self._load)
+        print(f"Loaded {len(self.previous)} page fingerprints for {self.wholesaler}.")
+
+    def conditional_headers(self, page_key: str) -> dict:
+        """Returns the If-None-Match / If-Modified-Since headers for a page fetched before."""
+        previous = self.previous.get(page_key)
+        if previous is None:
+            return {}
+        headers = {}
+        if previous.etag:
+            headers['If-None-Match'] = previous.etag
+        if previous.last_modified:
+            headers['If-Modified-Since'] = previous.last_modified
+        return headers
+
+    def is_unchanged(self, page_key: str, response) -> bool:
+        """
+        Checks a page response against the stored fingerprint.
+
+        Unchanged pages are recorded as such. For changed pages the new fingerprint is kept until
+        record_items() adds the keys of the page's items.
+        """
+        previous = self.previous.get(page_key)
+        if response.status_code == 304 and previous is not None:
+            self.unchanged.add(page_key)
+            metrics.increment("not_modified", self.wholesaler)
+            return True
+
+        fingerprint = payload_fingerprint(response.content)
+        if previous is not None and previous.fingerprint == fingerprint:
+            self.unchanged.add(page_key)
+            metrics.increment("unchanged_page", self.wholesaler)
+            return True
+
+        self.updates[page_key] = PageFingerprint(
+            fingerprint, response.headers.get('ETag'), response.headers.get('Last-Modified')
+        )
+        return False
+
+    def record_items(self, page_key: str, item_keys: list[str]):
+        """Stores the keys of the items parsed from a changed page."""
+        if page_key in self.updates:
+            self.updates[page_key].item_keys = item_keys
+
+    def discard(self, page_key: str):
+        """Drops the new fingerprint of a page that should not be skipped in later runs."""
+        self.updates.pop(page_key, None)
+
+    def unchanged_item_keys(self) -> set[str]:
+        """Returns the keys of the items on the pages skipped in this run."""
+        return {key for page_key in self.unchanged for key in self.previous[page_key].item_keys}
+
+    def _save(self, conn):
+        now = datetime.now(timezone.utc)
+        with conn, conn.cursor() as cur:
+            if self.updates:
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO wholesaler_tracking.page_fingerprints (
+                        wholesaler, page_key, fingerprint, etag, last_modified, item_keys, checked_at, changed_at
+                    )
+                    VALUES %s
+                    ON CONFLICT (wholesaler, page_key) DO UPDATE
+                    SET fingerprint = EXCLUDED.fingerprint,
+                        etag = EXCLUDED.etag,
+                        last_modified = EXCLUDED.last_modified,
+                        item_keys = EXCLUDED.item_keys,
+                        checked_at = EXCLUDED.checked_at,
+                        changed_at = EXCLUDED.changed_at,
+                        unchanged_runs = 0
+                    """,
+                    [
+                        (self.wholesaler, page_key, page.fingerprint, page.etag, page.last_modified, page.item_keys, now, now)
+                        for page_key, page in self.updates.items()
+                    ]
+                )
+            if self.unchanged:
+                # The unchanged marker: only the check time and the number of unchanged runs are updated
+                cur.execute(
+                    """
+                    UPDATE wholesaler_tracking.page_fingerprints
+                    SET checked_at = %s, unchanged_runs = unchanged_runs + 1
+                    WHERE wholesaler = %s AND page_key = ANY(%s)
+                    """,
+                    (now, self.wholesaler, list(self.unchanged))
+                )
+
+    async def save(self):
+        """Saves the fingerprints of changed pages and marks the unchanged pages as checked."""
+        await self.pool.run(self._save)
+        print(f"{self.wholesaler} pages: {len(self.updates)} changed, {len(self.unchanged)} unchanged.")
@@ -0,0 +1,278 @@
+import time
+import asyncio
+import httpx
+from typing import Optional
+from urllib.parse import urlsplit
+
+from .metrics import metrics
+from .proxy_pool import ProxyPool, get_proxy_pool
+from .resilience import CircuitBreaker, CircuitOpenError, RateLimiter, RetryPolicy, parse_retry_after
+
+# Seconds allowed for the whole request and for establishing the connection
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+# Requests in flight across all scrapers
+DEFAULT_MAX_CONCURRENCY = 16
+# Connections kept open per host and proxy
+DEFAULT_MAX_CONNECTIONS = 10
+
+
+class AsyncHttpClient:
+    """An asyncio HTTP client keeping one keep-alive connection pool per host and proxy."""
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT,
+        connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        http2: bool = True,
+        retry_policy: RetryPolicy | None = None,
+        proxy_pool: ProxyPool | None = None
+    ):
+        """
+        Initializes the client.
+
+        Args:
+            max_concurrency: The maximum number of requests in flight at the same time.
+            timeout: The default timeout of a request in seconds.
+            connect_timeout: The timeout for establishing a connection in seconds.
+            max_connections: The maximum number of connections per host and proxy.
+            http2: Whether to negotiate HTTP/2 with servers that support it.
+            retry_policy: The backoff and deadline applied to every request.
+            proxy_pool: The pool choosing a proxy for requests that do not name one.
+        """
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.http2 = http2
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = RateLimiter()
+        self.proxy_pool = proxy_pool
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._pools: dict[tuple[str, str | None], httpx.AsyncClient] = {}
+
+    def _get_breaker(self, host: str) -> CircuitBreaker:
+        """Returns the circuit breaker of a host, creating it on first use."""
+        if host not in self._breakers:
+            self._breakers[host] = CircuitBreaker()
+        return self._breakers[host]
+
+    def _get_pool(self, url: str, proxy: str | None) -> httpx.AsyncClient:
+        """Returns the connection pool for the URL's host and the proxy, creating it on first use."""
+        parts = urlsplit(url)
+        key = (f"{parts.scheme}://{parts.netloc}", proxy)
+        if key not in self._pools:
+            self._pools[key] = httpx.AsyncClient(
+                http2=self.http2,
+                proxy=proxy,
+                timeout=self.timeout,
+                follow_redirects=True,
+                limits=self.limits
+            )
+        return self._pools[key]
+
+    async def _send(
+        self,
+        method: str,
+        url: str,
+        headers: dict,
+        data: Optional[dict],
+        proxy: str | None,
+        timeout: float | None
+    ) -> httpx.Response:
+        """Sends a single attempt of a request through the pool of the URL's host."""
+        pool = self._get_pool(url, proxy)
+        async with self.semaphore:
+            return await pool.request(
+                method.upper(),
+                url,
+                headers=headers,
+                json=data if method.upper() == "POST" else None,
+                timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+            )
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: dict,
+        cookies: Optional[dict] = None,
+        data: Optional[dict] = None,
+        proxy: str | None = None,
+        timeout: float | None = None,
+        sticky_key: str | None = None
+    ) -> httpx.Response:
+        """
+        Sends a request and returns the response, retrying transient failures with backoff.
+
+        Rate limiting (429), server errors (5xx) and transport or proxy errors are retried until the
+        retry policy gives up. Every outcome is counted in the process-wide metrics. Without an
+        explicit proxy, each attempt is routed through the proxy pool's choice for the sticky key.
+
+        Raises:
+            httpx.HTTPError: For 4xx/5xx responses and transport errors that were not recovered.
+            CircuitOpenError: If the host's circuit breaker is open.
+            TimeoutError: If the request including its retries exceeds the policy's deadline.
+        """
+        headers = dict(headers)
+        if cookies:
+            headers['Cookie'] = "; ".join(f"{name}={value}" for name, value in cookies.items())
+
+        host = urlsplit(url).netloc
+        breaker = self._get_breaker(host)
+        policy = self.retry_policy
+
+        # Whether the attempt in flight is the half-open trial of the breaker, which must get an outcome
+        trial = False
+        try:
+            async with asyncio.timeout(policy.deadline):
+                attempt = 0
+                while True:
+                    attempt += 1
+                    if not breaker.allow_request():
+                        metrics.increment("circuit_open", host)
+                        raise CircuitOpenError(f"Circuit breaker for {host} is open.")
+                    trial = breaker.trial_in_progress
+                    await self.rate_limiter.wait(host)
+
+                    endpoint = None
+                    attempt_proxy = proxy
+                    if attempt_proxy is None and self.proxy_pool is not None:
+                        endpoint = self.proxy_pool.choose(sticky_key)
+                        attempt_proxy = endpoint.url
+
+                    retry_after = None
+                    start = time.perf_counter()
+                    try:
+                        response = await self._send(method, url, headers, data, attempt_proxy, timeout)
+                    except httpx.TransportError as e:
+                        if endpoint is not None:
+                            endpoint.record(time.perf_counter() - start, success=False)
+                            if sticky_key is not None and isinstance(e, httpx.ProxyError):
+                                self.proxy_pool.rotate(sticky_key)
+                        breaker.record_failure()
+                        metrics.increment("proxy_error" if isinstance(e, httpx.ProxyError) else "transport_error", host)
+                        if attempt >= policy.max_attempts:
+                            metrics.increment("gave_up", host)
+                            raise
+                        print(f"Request to {host} failed: {e!r}")
+                    else:
+                        if endpoint is not None:
+                            endpoint.record(time.perf_counter() - start, success=response.status_code != 407)
+                        metrics.increment(f"status_{response.status_code}", host)
+                        if response.status_code < 400:
+                            breaker.record_success()
+                            metrics.increment("success", host)
+                            return response
+                        if not policy.is_retryable_status(response.status_code):
+                            # The host answered, so a client error does not count against its circuit
+                            breaker.record_success()
+                            response.raise_for_status()
+                        breaker.record_failure()
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        if retry_after is not None:
+                            metrics.increment("rate_limited", host)
+                            self.rate_limiter.block(host, retry_after)
+                        if attempt >= policy.max_attempts:
+                            metrics.increment("gave_up", host)
+                            response.raise_for_status()
+
+                    # The outcome of the attempt is recorded at this point
+                    trial = False
+                    delay = policy.get_delay(attempt, retry_after)
+                    metrics.increment("retry", host)
+                    print(f"Retrying {method.upper()} {url} in {delay:.1f}s (attempt {attempt + 1}/{policy.max_attempts})...")
+                    await asyncio.sleep(delay)
+        except BaseException:
+            # A trial cancelled or timed out before its outcome was recorded counts as failed, otherwise
+            # the breaker would wait for it forever and refuse every later request to the host
+            if trial and breaker.trial_in_progress:
+                breaker.record_failure()
+            raise
+
+    async def aclose(self):
+        """Closes all connection pools."""
+        pools = list(self._pools.values())
+        self._pools.clear()
+        await asyncio.gather(*(pool.aclose() for pool in pools))
+
+
+_client: AsyncHttpClient | None = None
+
+
+def get_http_client() -> AsyncHttpClient:
+    """
+    Returns the process-wide HTTP client shared by all scrapers.
+
+    The client routes requests through the proxy pool from the environment, whose health is checked
+    in the background while the client is open.
+    """
+    global _client
+    if _client is None:
+        proxy_pool = get_proxy_pool()
+        proxy_pool.start_health_checks()
+        _client = AsyncHttpClient(proxy_pool=proxy_pool)
+    return _client
+
+
+def set_host_rate(host: str, requests_per_second: float | None):
+    """Limits the requests of all scrapers to a host, e.g. set_host_rate('www.example.com', 2)."""
+    get_http_client().rate_limiter.set_rate(host, requests_per_second)
+
+
+async def close_http_client():
+    """Closes the shared HTTP client and its connection pools."""
+    global _client
+    if _client is not None:
+        if _client.proxy_pool is not None:
+            await _client.proxy_pool.stop_health_checks()
+        await _client.aclose()
+        _client = None
+
+
+async def async_http_request(
+    method: str,
+    url: str,
+    headers: dict,
+    cookies: Optional[dict] = None,
+    data: Optional[dict] = None,
+    sticky_key: Optional[str] = None
+):
+    """
+    Makes an HTTP request (GET or POST) through the shared client and the proxy pool and returns the response.
+
+    Parameters:
+    - method (str): The HTTP method to use, either 'GET' or 'POST'.
+    - url (str): The URL to send the request to.
+    - headers (dict): The headers to include in the request.
+    - cookies (dict, optional): The cookies to include in the request.
+    - data (dict, optional): The data to send in the request body (for POST requests).
+    - sticky_key (str, optional): Keeps requests with the same key (e.g. the wholesaler) on the same proxy session.
+
+    Returns the response, or None if the request failed.
+    """
+    try:
+        response = await get_http_client().request(
+            method,
+            url,
+            headers=headers,
+            cookies=cookies,
+            data=data,
+            sticky_key=sticky_key
+        )
+        print(f"Request successful! Response status code: {response.status_code} ({response.http_version})")
+        return response
+    except httpx.HTTPError as e:
+        print(f"An error occurred during the HTTP request: {e}")
+        return None
+    except CircuitOpenError as e:
+        print(e)
+        return None
+    except TimeoutError:
+        metrics.increment("deadline_exceeded", urlsplit(url).netloc)
+        print(f"The HTTP request to {url} exceeded its deadline.")
+        return None
+    except ValueError as ve:
+        print(ve)
+        return None
@@ -0,0 +1,32 @@
+from collections import Counter
+
+
+class Metrics:
+    """Counts named outcomes per label (e.g. request outcomes per host) for the run summary."""
+
+    def __init__(self):
+        self.counters: Counter[tuple[str, str]] = Counter()
+
+    def increment(self, name: str, label: str = "", amount: int = 1):
+        """Increments the counter of an outcome."""
+        self.counters[(name, label)] += amount
+
+    def get(self, name: str, label: str = "") -> int:
+        """Returns the current value of a counter."""
+        return self.counters[(name, label)]
+
+    def reset(self):
+        """Clears all counters."""
+        self.counters.clear()
+
+    def report(self):
+        """Prints all counters grouped by label."""
+        if not self.counters:
+            return
+        print("Metrics:")
+        for (name, label), value in sorted(self.counters.items(), key=lambda item: (item[0][1], item[0][0])):
+            print(f"  {label or '-'} {name}: {value}")
+
+
+# Process-wide metrics shared by all scrapers
+metrics = Metrics()
@@ -0,0 +1,133 @@
+import re
+from datetime import date, datetime, timezone
+
+# Months of partitions created ahead of the current month
+DEFAULT_MONTHS_AHEAD = 2
+
+# Indexes of the partitioned price tables: (columns, covering columns)
+PARTITION_INDEXES = {
+    "parmed": [(("itemId", "scraped_at"), ("price",)), (("ndc",), ())],
+    "blupax": [(("id", "scraped_at"), ("price", "unit_price")), (("ndc_formatted",), ())],
+}
+
+# The range of a partition as printed by pg_get_expr(relpartbound)
+PARTITION_RANGE_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def split_table_name(table: str) -> tuple[str, str]:
+    """Splits a qualified table name such as '"wholesaler_tracking".parmed' into schema and table."""
+    schema, _, name = table.replace('"', '').rpartition('.')
+    return schema or 'public', name
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(day: date, months: int) -> date:
+    month_index = day.year * 12 + day.month - 1 + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def is_partitioned(cur, table: str) -> bool:
+    """Returns whether the table exists and is partitioned."""
+    schema, name = split_table_name(table)
+    cur.execute(
+        """
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND c.relname = %s
+        """,
+        (schema, name.lower())
+    )
+    return cur.fetchone() is not None
+
+
+def get_partition_bounds(cur, table: str) -> list[str]:
+    """Returns the bound expressions of the partitions of a table, e.g. "FOR VALUES FROM (...) TO (...)" or "DEFAULT"."""
+    schema, name = split_table_name(table)
+    cur.execute(
+        """
+        SELECT pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = %s AND p.relname = %s
+        """,
+        (schema, name.lower())
+    )
+    return [row[0] for row in cur.fetchall()]
+
+
+def get_partition_ranges(cur, table: str) -> list[tuple[datetime, datetime]]:
+    """Returns the scraped_at ranges of the range partitions of a table, whatever the partitions are named."""
+    ranges = []
+    for bound in get_partition_bounds(cur, table):
+        match = PARTITION_RANGE_PATTERN.search(bound or '')
+        if match:
+            ranges.append((datetime.fromisoformat(match.group(1)), datetime.fromisoformat(match.group(2))))
+    return ranges
+
+
+def ensure_monthly_partitions(cur, table: str, start: date, end: date) -> list[str]:
+    """
+    Creates the monthly range partitions on scraped_at from the month of start up to and including the month of end.
+
+    Months are checked against the bounds of the existing partitions rather than their names, as the
+    partitions of a migrated table keep the names they were created with.
+
+    Returns:
+        The names of the partitions that were created.
+    """
+    schema, name = split_table_name(table)
+    ranges = get_partition_ranges(cur, table)
+    created = []
+    month = month_start(start)
+    while month <= end:
+        next_month = add_months(month, 1)
+        lower = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+        upper = datetime(next_month.year, next_month.month, 1, tzinfo=timezone.utc)
+        if not any(start_at < upper and end_at > lower for start_at, end_at in ranges):
+            partition = f"{name.lower()}_p{month:%Y%m}"
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS {schema}.{partition} PARTITION OF {schema}.{name} "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{next_month.isoformat()} 00:00:00+00')"
+            )
+            created.append(partition)
+        month = next_month
+    return created
+
+
+def ensure_default_partition(cur, table: str) -> bool:
+    """
+    Creates the default partition of a table, which receives the rows outside every monthly partition.
+
+    A monthly partition cannot be created while the default partition holds rows of its month, so such
+    rows must be moved out first.
+
+    Returns:
+        Whether the partition was created.
+    """
+    schema, name = split_table_name(table)
+    if 'DEFAULT' in get_partition_bounds(cur, table):
+        return False
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {schema}.{name.lower()}_default PARTITION OF {schema}.{name} DEFAULT")
+    return True
+
+
+def ensure_future_partitions(cur, table: str, months_ahead: int = DEFAULT_MONTHS_AHEAD) -> list[str]:
+    """Creates the partitions of the current month and the coming months. Does nothing for unpartitioned tables."""
+    if not is_partitioned(cur, table):
+        return []
+    today = datetime.now(timezone.utc).date()
+    return ensure_monthly_partitions(cur, table, today, add_months(month_start(today), months_ahead))
+
+
+def ensure_indexes(cur, table: str, wholesaler: str):
+    """Creates the item/date covering index and the NDC index of a wholesaler table."""
+    schema, name = split_table_name(table)
+    for columns, include in PARTITION_INDEXES[wholesaler]:
+        index_name = f"{name.lower()}_{'_'.join(column.lower() for column in columns)}_idx"
+        include_sql = f" INCLUDE ({', '.join(include)})" if include else ""
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {schema}.{name} ({', '.join(columns)}){include_sql}")
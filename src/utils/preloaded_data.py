@@ -0,0 +1,116 @@
+import re
+import json
+from typing import Any, Iterable
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional, the standard json module is the fallback
+    orjson = None
+
+# The start of an assignment such as `PRELOADED_DATA.SPECIALS_PRODUCTS_DATA = {`
+ASSIGNMENT_PATTERN = re.compile(rb"PRELOADED_DATA\.([A-Za-z0-9_$]+)\s*=\s*(?=[\[{])")
+# A whole string, which may contain brackets, or a bracket that changes the nesting depth
+TOKEN_PATTERN = re.compile(rb'"(?:[^"\\]|\\.)*+"|[\[\]{}]', re.DOTALL)
+# Whitespace and semicolons between the end of a block and the end of its script
+TRAILING = frozenset(b" \t\r\n;")
+
+OPENING = frozenset(b"[{")
+QUOTE = ord('"')
+
+
+def find_json_end(buffer: bytes, start: int) -> int:
+    """
+    Returns the end offset of the JSON object or array starting at start.
+
+    Balances brackets while skipping whole strings, so brackets and `};` inside strings are
+    ignored. Raises ValueError if the value does not end.
+    """
+    depth = 0
+    for match in TOKEN_PATTERN.finditer(buffer, start):
+        char = buffer[match.start()]
+        if char == QUOTE:
+            continue
+        if char in OPENING:
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    raise ValueError(f"Unterminated JSON value starting at offset {start}.")
+
+
+def find_script_end(buffer: bytes, start: int) -> int:
+    """Returns the end of the statement starting at start when it is the last one of its <script> element."""
+    end = buffer.find(b"</script", start)
+    if end == -1:
+        end = len(buffer)
+    while end > start and buffer[end - 1] in TRAILING:
+        end -= 1
+    return end
+
+
+def loads(data: memoryview) -> Any:
+    """Decodes JSON from a memoryview, with orjson if it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(bytes(data))
+
+
+def decode_block(body: bytes, view: memoryview, start: int) -> tuple[Any, int]:
+    """
+    Decodes the JSON value starting at start and returns it with its end offset.
+
+    Blocks are usually alone in their script and end right before </script>, which is found at C
+    speed. When another statement follows, the parser reports where the value ended. Its offset
+    counts characters, which are bytes when the value is ASCII. Otherwise the end is found by
+    balancing brackets.
+    """
+    end = find_script_end(body, start)
+    try:
+        return loads(view[start:end]), end
+    except ValueError as e:
+        position = getattr(e, 'pos', None)
+        if position and body[start:start + position].isascii():
+            try:
+                return loads(view[start:start + position]), start + position
+            except ValueError:
+                pass
+    end = find_json_end(body, start)
+    return loads(view[start:end]), end
+
+
+def extract_preloaded_data(body: bytes, names: Iterable[str] | None = None) -> dict[str, Any]:
+    """
+    Extracts the `PRELOADED_DATA.<NAME> = {...};` blocks of a page from its raw bytes.
+
+    The page is never decoded as a whole: each block is decoded straight from a memoryview slice of
+    the body, see decode_block(). Blocks that are not valid JSON are skipped.
+
+    Args:
+        body: The raw response body.
+        names: The block names to extract, e.g. ['SPECIALS_PRODUCTS_DATA']. All blocks by default.
+
+    Returns:
+        The decoded blocks by name.
+    """
+    wanted = set(names) if names is not None else None
+    view = memoryview(body)
+    blocks = {}
+    position = 0
+    while (match := ASSIGNMENT_PATTERN.search(body, position)) is not None:
+        name = match.group(1).decode()
+        start = match.end()
+        if wanted is not None and name not in wanted:
+            position = start
+            continue
+        try:
+            blocks[name], end = decode_block(body, view, start)
+        except ValueError as e:
+            # orjson.JSONDecodeError and json.JSONDecodeError are both ValueErrors
+            print(f"Could not decode PRELOADED_DATA.{name}: {e}")
+            position = start
+            continue
+        position = end
+        if wanted is not None and wanted.issubset(blocks):
+            break
+    return blocks
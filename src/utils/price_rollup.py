@@ -0,0 +1,141 @@
+import json
+from datetime import timezone
+
+from psycopg2.extras import execute_values
+
+
+def rollup_rows(wholesaler: str, item_key: str, price_fields, attribute_fields, items: list[dict]) -> list[tuple]:
+    """
+    Builds one row per item and price field from a batch of coerced items.
+
+    Items without a key or without a value for a price field are skipped for that field. When an item
+    occurs more than once, the last occurrence wins, as a single upsert cannot update a row twice.
+
+    Returns:
+        Tuples of (wholesaler, item_key, price_field, price, attributes JSON).
+    """
+    rows = {}
+    for item in items:
+        key = item.get(item_key)
+        if key is None:
+            continue
+        attributes = None
+        for field in price_fields:
+            price = item.get(field)
+            if price is None:
+                continue
+            if attributes is None:
+                attributes = json.dumps({name: item.get(name) for name in attribute_fields}, default=str)
+            rows[(str(key), field)] = (wholesaler, str(key), field, price, attributes)
+    return list(rows.values())
+
+
+def update_price_rollups(cur, wholesaler: str, item_key: str, price_fields, attribute_fields, items: list[dict], scraped_at) -> int:
+    """
+    Folds a batch of items into the latest_price and daily_price_rollup tables.
+
+    Both tables are upserted with only the batch's rows, so the cost of a refresh depends on the size
+    of the batch and not on the history. The updated_at of a latest_price row only changes with its
+    price, minimum price or attributes. Batches may arrive out of order, e.g. from a backfill: the
+    latest and last prices are only replaced by newer observations and the first price only by older ones.
+
+    Returns:
+        The number of item prices folded in.
+    """
+    rows = rollup_rows(wholesaler, item_key, price_fields, attribute_fields, items)
+    if not rows:
+        return 0
+    day = scraped_at.astimezone(timezone.utc).date()
+
+    execute_values(
+        cur,
+        """
+        INSERT INTO wholesaler_tracking.latest_price AS latest (
+            wholesaler, item_key, price_field, price, min_price, max_price, first_seen_at, scraped_at, attributes
+        )
+        VALUES %s
+        ON CONFLICT (wholesaler, item_key, price_field) DO UPDATE
+        SET price = CASE WHEN EXCLUDED.scraped_at >= latest.scraped_at THEN EXCLUDED.price ELSE latest.price END,
+            attributes = CASE WHEN EXCLUDED.scraped_at >= latest.scraped_at THEN EXCLUDED.attributes ELSE latest.attributes END,
+            min_price = LEAST(latest.min_price, EXCLUDED.min_price),
+            max_price = GREATEST(latest.max_price, EXCLUDED.max_price),
+            sample_count = latest.sample_count + 1,
+            first_seen_at = LEAST(latest.first_seen_at, EXCLUDED.first_seen_at),
+            scraped_at = GREATEST(latest.scraped_at, EXCLUDED.scraped_at),
+            -- The watermark of incremental exports only moves when what they export changes
+            updated_at = CASE
+                WHEN EXCLUDED.scraped_at >= latest.scraped_at
+                     AND (EXCLUDED.price IS DISTINCT FROM latest.price OR EXCLUDED.attributes IS DISTINCT FROM latest.attributes)
+                THEN NOW()
+                WHEN EXCLUDED.min_price < latest.min_price THEN NOW()
+                ELSE latest.updated_at
+            END
+        """,
+        [(w, key, field, price, price, price, scraped_at, scraped_at, attributes) for w, key, field, price, attributes in rows]
+    )
+    execute_values(
+        cur,
+        """
+        INSERT INTO wholesaler_tracking.daily_price_rollup AS rollup (
+            wholesaler, item_key, price_field, day, min_price, max_price, first_price, last_price, first_seen_at, last_seen_at
+        )
+        VALUES %s
+        ON CONFLICT (wholesaler, item_key, price_field, day) DO UPDATE
+        SET min_price = LEAST(rollup.min_price, EXCLUDED.min_price),
+            max_price = GREATEST(rollup.max_price, EXCLUDED.max_price),
+            first_price = CASE WHEN EXCLUDED.first_seen_at < rollup.first_seen_at THEN EXCLUDED.first_price ELSE rollup.first_price END,
+            last_price = CASE WHEN EXCLUDED.last_seen_at >= rollup.last_seen_at THEN EXCLUDED.last_price ELSE rollup.last_price END,
+            first_seen_at = LEAST(rollup.first_seen_at, EXCLUDED.first_seen_at),
+            last_seen_at = GREATEST(rollup.last_seen_at, EXCLUDED.last_seen_at),
+            sample_count = rollup.sample_count + 1
+        """,
+        [(w, key, field, day, price, price, price, price, scraped_at, scraped_at) for w, key, field, price, _ in rows]
+    )
+    return len(rows)
+
+
+def observe_unchanged_prices(cur, wholesaler: str, item_keys: list[str], scraped_at) -> int:
+    """
+    Folds items that were seen unchanged, e.g. on a page skipped by its fingerprint, into the rollups.
+
+    Their prices and attributes are those of their latest observation, so they are taken from
+    latest_price instead of the page: the sample count and last scrape time are bumped, and the
+    day's rollup row is upserted with the latest price.
+
+    Returns:
+        The number of item prices folded in.
+    """
+    if not item_keys:
+        return 0
+    cur.execute(
+        """
+        WITH observed AS (
+            UPDATE wholesaler_tracking.latest_price AS latest
+            SET sample_count = latest.sample_count + 1,
+                scraped_at = GREATEST(latest.scraped_at, %(scraped_at)s)
+            WHERE latest.wholesaler = %(wholesaler)s AND latest.item_key = ANY(%(item_keys)s)
+            RETURNING latest.item_key, latest.price_field, latest.price
+        )
+        INSERT INTO wholesaler_tracking.daily_price_rollup AS rollup (
+            wholesaler, item_key, price_field, day, min_price, max_price, first_price, last_price, first_seen_at, last_seen_at
+        )
+        SELECT %(wholesaler)s, item_key, price_field, %(day)s, price, price, price, price, %(scraped_at)s, %(scraped_at)s
+        FROM observed
+        WHERE price IS NOT NULL
+        ON CONFLICT (wholesaler, item_key, price_field, day) DO UPDATE
+        SET min_price = LEAST(rollup.min_price, EXCLUDED.min_price),
+            max_price = GREATEST(rollup.max_price, EXCLUDED.max_price),
+            first_price = CASE WHEN EXCLUDED.first_seen_at < rollup.first_seen_at THEN EXCLUDED.first_price ELSE rollup.first_price END,
+            last_price = CASE WHEN EXCLUDED.last_seen_at >= rollup.last_seen_at THEN EXCLUDED.last_price ELSE rollup.last_price END,
+            first_seen_at = LEAST(rollup.first_seen_at, EXCLUDED.first_seen_at),
+            last_seen_at = GREATEST(rollup.last_seen_at, EXCLUDED.last_seen_at),
+            sample_count = rollup.sample_count + 1
+        """,
+        {
+            'wholesaler': wholesaler,
+            'item_keys': list(item_keys),
+            'day': scraped_at.astimezone(timezone.utc).date(),
+            'scraped_at': scraped_at,
+        }
+    )
+    return cur.rowcount
@@ -0,0 +1,164 @@
+import os
+import time
+import httpx
+import asyncio
+from dataclasses import dataclass
+from urllib.parse import quote
+
+# URL fetched through every proxy by the background health check
+HEALTH_CHECK_URL = "http://example.com"
+HEALTH_CHECK_INTERVAL_SECONDS = 60
+# Weight of the newest observation in the latency and error-rate moving averages
+EWMA_ALPHA = 0.3
+# Error rate above which a sticky session is rotated to another proxy
+MAX_STICKY_ERROR_RATE = 0.5
+
+
+@dataclass
+class ProxyEndpoint:
+    """A proxy endpoint and its observed health."""
+    server: str
+    username: str
+    password: str
+    latency: float | None = None
+    error_rate: float = 0.0
+    requests: int = 0
+    errors: int = 0
+
+    @property
+    def url(self) -> str:
+        """Returns the proxy URL with embedded credentials, as used for HTTP requests."""
+        return f"http://{quote(self.username, safe='')}:{quote(self.password, safe='')}@{self.server}"
+
+    @property
+    def browser_config(self) -> dict:
+        """Returns the proxy in the Playwright launch options format."""
+        return {"proxy": {"server": f"http://{self.server}", "username": self.username, "password": self.password}}
+
+    @property
+    def score(self) -> float:
+        """Returns the health score of the proxy, lower is better. Unmeasured proxies are tried first."""
+        if self.latency is None:
+            return 0.0
+        return self.latency * (1 + 10 * self.error_rate)
+
+    def record(self, latency: float, success: bool):
+        """Updates the moving averages with the outcome of a request."""
+        self.requests += 1
+        if not success:
+            self.errors += 1
+        self.error_rate = EWMA_ALPHA * (0.0 if success else 1.0) + (1 - EWMA_ALPHA) * self.error_rate
+        if success:
+            self.latency = latency if self.latency is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency
+
+
+class ProxyPool:
+    """Routes requests to the healthiest proxy and keeps a sticky proxy session per wholesaler."""
+
+    def __init__(self, endpoints: list[ProxyEndpoint]):
+        if not endpoints:
+            raise ValueError("A proxy pool needs at least one endpoint.")
+        self.endpoints = endpoints
+        self._sticky: dict[str, ProxyEndpoint] = {}
+        self._health_check_task: asyncio.Task | None = None
+
+    @classmethod
+    def from_env(cls) -> "ProxyPool":
+        """
+        Builds the pool from environment variables.
+
+        OX_PROXY_SERVER_ADDRESSES (comma separated) or OX_PROXY_SERVER_ADDRESS list the proxy servers,
+        OX_USERNAME and OX_PASSWORD are the credentials. If OX_SESSION_IDS (comma separated) is set,
+        one sticky session endpoint is created per server and session ID.
+        """
+        username = os.environ.get('OX_USERNAME')
+        password = os.environ.get('OX_PASSWORD')
+        addresses = os.environ.get('OX_PROXY_SERVER_ADDRESSES') or os.environ.get('OX_PROXY_SERVER_ADDRESS')
+
+        if not (addresses and username and password):
+            raise ValueError("OX_PROXY_SERVER_ADDRESS, OX_USERNAME, and OX_PASSWORD environment variables must be set.")
+
+        servers = [address.strip().split('//', 1)[-1] for address in addresses.split(',') if address.strip()]
+        session_ids = [session_id.strip() for session_id in os.environ.get('OX_SESSION_IDS', '').split(',') if session_id.strip()]
+
+        endpoints = []
+        for server in servers:
+            if session_ids:
+                endpoints += [ProxyEndpoint(server, f"{username}-sessid-{session_id}", password) for session_id in session_ids]
+            else:
+                endpoints.append(ProxyEndpoint(server, username, password))
+        return cls(endpoints)
+
+    def choose(self, sticky_key: str | None = None) -> ProxyEndpoint:
+        """
+        Returns the proxy to use for a request.
+
+        Args:
+            sticky_key: Requests with the same key (e.g. the wholesaler name) keep using the same proxy
+                until its error rate gets too high.
+        """
+        if sticky_key is not None:
+            endpoint = self._sticky.get(sticky_key)
+            if endpoint is not None and endpoint.error_rate <= MAX_STICKY_ERROR_RATE:
+                return endpoint
+
+        # Prefer proxies that are not already pinned to another wholesaler
+        pinned = {id(endpoint) for endpoint in self._sticky.values()}
+        endpoint = min(self.endpoints, key=lambda e: (e.score, id(e) in pinned))
+
+        if sticky_key is not None:
+            if sticky_key in self._sticky:
+                print(f"Rotating proxy session for {sticky_key} to {endpoint.server} ({endpoint.username}).")
+            self._sticky[sticky_key] = endpoint
+        return endpoint
+
+    def rotate(self, sticky_key: str):
+        """Drops the sticky proxy of a key so that its next request picks the healthiest proxy."""
+        self._sticky.pop(sticky_key, None)
+
+    async def _check(self, endpoint: ProxyEndpoint):
+        """Measures the latency of a proxy with a request to the health check URL."""
+        start = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(proxy=endpoint.url, timeout=10) as client:
+                response = await client.get(HEALTH_CHECK_URL)
+                response.raise_for_status()
+            endpoint.record(time.perf_counter() - start, success=True)
+        except httpx.HTTPError as e:
+            endpoint.record(time.perf_counter() - start, success=False)
+            print(f"Proxy health check failed for {endpoint.server} ({endpoint.username}): {e!r}")
+
+    async def health_check(self):
+        """Checks all proxies concurrently."""
+        await asyncio.gather(*(self._check(endpoint) for endpoint in self.endpoints))
+
+    async def _run_health_checks(self, interval: float):
+        while True:
+            await self.health_check()
+            await asyncio.sleep(interval)
+
+    def start_health_checks(self, interval: float = HEALTH_CHECK_INTERVAL_SECONDS):
+        """Starts checking the proxies in the background of the running event loop, if not already started."""
+        if self._health_check_task is None or self._health_check_task.done():
+            self._health_check_task = asyncio.create_task(self._run_health_checks(interval))
+
+    async def stop_health_checks(self):
+        """Stops the background health checks."""
+        if self._health_check_task is not None:
+            self._health_check_task.cancel()
+            try:
+                await self._health_check_task
+            except asyncio.CancelledError:
+                pass
+            self._health_check_task = None
+
+
+_pool: ProxyPool | None = None
+
+
+def get_proxy_pool() -> ProxyPool:
+    """Returns the process-wide proxy pool, built from the environment on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ProxyPool.from_env()
+    return _pool
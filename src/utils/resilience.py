@@ -0,0 +1,144 @@
+import time
+import random
+import asyncio
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Status codes worth retrying: rate limiting and transient server or gateway errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised when a request is refused because the host's circuit breaker is open."""
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by a number of attempts and an overall deadline."""
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 0.5, max_delay: float = 30.0, deadline: float = 120.0):
+        """
+        Initializes the retry policy.
+
+        Args:
+            max_attempts: The maximum number of attempts per request, including the first one.
+            base_delay: The delay in seconds before the first retry, doubled with every attempt.
+            max_delay: The upper bound of a single delay in seconds.
+            deadline: The maximum number of seconds a request may take including all retries.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def is_retryable_status(self, status_code: int) -> bool:
+        """Returns whether a response with this status code should be retried."""
+        return status_code in RETRYABLE_STATUS_CODES
+
+    def get_delay(self, attempt: int, retry_after: float | None = None) -> float:
+        """Returns the delay before the given retry attempt (1-based), honoring a Retry-After value if larger."""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Parses a Retry-After header given either in seconds or as an HTTP date. Returns the delay in seconds."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateLimiter:
+    """
+    Holds back requests to a host after it asked to slow down with a Retry-After header.
+
+    Hosts can also be given a steady rate, in which case every request reserves the next free
+    slot so that concurrent requests are spread out instead of sent in a burst.
+    """
+
+    def __init__(self):
+        self._blocked_until: dict[str, float] = {}
+        self._intervals: dict[str, float] = {}
+        self._next_slot: dict[str, float] = {}
+
+    def set_rate(self, host: str, requests_per_second: float | None):
+        """Limits requests to the host to the given rate. None removes the limit."""
+        if requests_per_second:
+            self._intervals[host] = 1.0 / requests_per_second
+        else:
+            self._intervals.pop(host, None)
+
+    def block(self, host: str, seconds: float):
+        """Blocks requests to the host for the given number of seconds."""
+        until = time.monotonic() + seconds
+        self._blocked_until[host] = max(until, self._blocked_until.get(host, 0.0))
+
+    async def wait(self, host: str):
+        """Waits until requests to the host are allowed again and, for rate-limited hosts, for the next slot."""
+        now = time.monotonic()
+        start = max(now, self._blocked_until.get(host, 0.0))
+        interval = self._intervals.get(host)
+        if interval is not None:
+            start = max(start, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = start + interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a host after consecutive failures.
+
+    After failure_threshold consecutive failures the circuit opens and requests are refused.
+    Once reset_timeout seconds have passed a single trial request is let through (half-open);
+    its success closes the circuit again, its failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.trial_in_progress = False
+
+    @property
+    def state(self) -> str:
+        """Returns 'closed', 'open' or 'half-open'."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow_request(self) -> bool:
+        """Returns whether a request may be sent, reserving the trial request when half-open."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_progress:
+            self.trial_in_progress = True
+            return True
+        return False
+
+    def record_success(self):
+        """Closes the circuit after a successful request."""
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+
+    def record_failure(self):
+        """Counts a failed request and opens the circuit once the threshold is reached."""
+        self.failures += 1
+        self.trial_in_progress = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import base64
+import psycopg2
+
+# Lifetime assumed for tokens that do not carry their own expiry.
+DEFAULT_TOKEN_TTL_SECONDS = 3600
+# Tokens this close to expiry are refreshed proactively instead of being reused.
+REFRESH_MARGIN_SECONDS = 300
+
+
+def get_token_expiry(token: str, captured_at: float, default_ttl: int = DEFAULT_TOKEN_TTL_SECONDS) -> float:
+    """
+    Returns the expiry timestamp of a token.
+
+    JWT tokens are decoded (without verification) to read their 'exp' claim. Any other token
+    is assumed to live for the default TTL from the moment it was captured.
+    """
+    parts = token.split('.')
+    if len(parts) == 3:
+        try:
+            payload = parts[1] + '=' * (-len(parts[1]) % 4)
+            claims = json.loads(base64.urlsafe_b64decode(payload))
+            if isinstance(claims.get('exp'), (int, float)):
+                return float(claims['exp'])
+        except (ValueError, TypeError):
+            pass
+    return captured_at + default_ttl
+
+
+class TokenStore:
+    """Persists an access token with its expiry so it can be reused across runs and scrapers."""
+
+    def __init__(self, name: str, path: str | None = None, refresh_margin: int = REFRESH_MARGIN_SECONDS):
+        """
+        Initializes the token store.
+
+        Args:
+            name: The name of the token, e.g. 'parmed'.
+            path: The JSON file the token is persisted to.
+            refresh_margin: The number of seconds before expiry at which a token is no longer handed out.
+        """
+        self.name = name
+        self.path = path or os.path.join(os.environ.get('TOKEN_CACHE_DIR', '.cache'), f'{name}-token.json')
+        self.refresh_margin = refresh_margin
+
+    def _read(self) -> dict | None:
+        """Reads the persisted token record."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, record: dict | None):
+        """Persists the token record, or removes it if the record is None."""
+        if record is None:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, self.path)
+
+    def get(self) -> str | None:
+        """Returns the stored token if it is not expired or about to expire, otherwise None."""
+        try:
+            record = self._read()
+        except Exception as e:
+            print(f"Could not read the cached {self.name} token: {e}")
+            return None
+
+        if not record or not record.get('token'):
+            return None
+
+        remaining = record.get('expires_at', 0) - time.time()
+        if remaining <= self.refresh_margin:
+            print(f"Cached {self.name} token expires in {remaining:.0f}s, refreshing.")
+            return None
+
+        print(f"Using cached {self.name} token (expires in {remaining / 60:.0f} min).")
+        return record['token']
+
+    def save(self, token: str, expires_at: float | None = None):
+        """Persists a freshly captured token together with its observed expiry."""
+        captured_at = time.time()
+        record = {
+            'token': token,
+            'captured_at': captured_at,
+            'expires_at': expires_at or get_token_expiry(token, captured_at),
+        }
+        try:
+            self._write(record)
+        except Exception as e:
+            print(f"Could not persist the {self.name} token: {e}")
+
+    def invalidate(self):
+        """Removes the stored token, e.g. after it was rejected by the API."""
+        try:
+            self._write(None)
+        except Exception as e:
+            print(f"Could not invalidate the cached {self.name} token: {e}")
+
+
+class PostgresTokenStore(TokenStore):
+    """A token store backed by the wholesaler_tracking.access_tokens table, for hosts without a persistent disk."""
+
+    def __init__(self, name: str, pg_conn_str: str, refresh_margin: int = REFRESH_MARGIN_SECONDS):
+        super().__init__(name, refresh_margin=refresh_margin)
+        self.pg_conn_str = pg_conn_str
+
+    def _read(self) -> dict | None:
+        conn = psycopg2.connect(dsn=self.pg_conn_str)
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute(
+                    "SELECT token, extract(epoch FROM captured_at), extract(epoch FROM expires_at) "
+                    "FROM wholesaler_tracking.access_tokens WHERE name = %s",
+                    (self.name,)
+                )
+                row = cur.fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {'token': row[0], 'captured_at': float(row[1]), 'expires_at': float(row[2])}
+
+    def _write(self, record: dict | None):
+        conn = psycopg2.connect(dsn=self.pg_conn_str)
+        try:
+            with conn, conn.cursor() as cur:
+                if record is None:
+                    cur.execute("DELETE FROM wholesaler_tracking.access_tokens WHERE name = %s", (self.name,))
+                    return
+                cur.execute(
+                    """
+                    INSERT INTO wholesaler_tracking.access_tokens (name, token, captured_at, expires_at)
+                    VALUES (%s, %s, to_timestamp(%s), to_timestamp(%s))
+                    ON CONFLICT (name) DO UPDATE
+                    SET token = EXCLUDED.token, captured_at = EXCLUDED.captured_at, expires_at = EXCLUDED.expires_at
+                    """,
+                    (self.name, record['token'], record['captured_at'], record['expires_at'])
+                )
+        finally:
+            conn.close()
+
+
+def get_token_store(name: str) -> TokenStore:
+    """Returns the Postgres-backed token store when a database is configured, otherwise the file-backed one."""
+    pg_conn_str = os.environ.get("POSTGRES_CONNECTION_STRING")
+    if pg_conn_str:
+        return PostgresTokenStore(name, pg_conn_str)
+    return TokenStore(name)
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from src.utils.archive import SnapshotArchiveWriter, read_archive, to_arrow_array
+
+
+class TestArchive(unittest.TestCase):
+    """Test suite for the Parquet snapshot archive."""
+
+    column_types = [('itemId', 'TEXT'), ('price', 'NUMERIC'), ('packQuantity', 'INTEGER'), ('isWatchListItem', 'BOOLEAN')]
+
+    def write_snapshot(self, root, scraped_at, columns):
+        writer = SnapshotArchiveWriter(root, 'parmed', self.column_types, scraped_at)
+        writer.write_columns(columns)
+        return writer
+
+    def test_read_range_with_projection_and_filter(self):
+        """Tests that only the requested days, columns and matching rows are read."""
+        with tempfile.TemporaryDirectory() as root:
+            for day, prices in ((1, ['1.50', '20']), (2, ['1.75', '21']), (3, ['2.00', '22'])):
+                writer = self.write_snapshot(
+                    root,
+                    datetime(2025, 6, day, 12, tzinfo=timezone.utc),
+                    [['a', 'b'], [Decimal(price) for price in prices], [1, None], [True, False]]
+                )
+                writer.close()
+
+            table = read_archive(
+                'parmed', date(2025, 6, 2), date(2025, 6, 3),
+                columns=['itemId', 'price', 'date'], filter=ds.field('price') < 10, archive_dir=root
+            )
+
+            self.assertEqual(table.column_names, ['itemId', 'price', 'date'])
+            self.assertEqual(sorted(table.to_pylist(), key=lambda row: row['date']), [
+                {'itemId': 'a', 'price': 1.75, 'date': '2025-06-02'},
+                {'itemId': 'a', 'price': 2.0, 'date': '2025-06-03'},
+            ])
+
+    def test_unfinished_snapshot_is_not_visible(self):
+        """Tests that a snapshot is only published when its writer is closed."""
+        with tempfile.TemporaryDirectory() as root:
+            writer = self.write_snapshot(
+                root, datetime(2025, 6, 1, tzinfo=timezone.utc), [['a'], [Decimal('1')], [1], [None]]
+            )
+            self.assertEqual(read_archive('parmed', date(2025, 6, 1), date(2025, 6, 1), archive_dir=root).num_rows, 0)
+
+            path = writer.close()
+
+            self.assertTrue(os.path.exists(path))
+            table = read_archive('parmed', date(2025, 6, 1), date(2025, 6, 1), archive_dir=root)
+            self.assertEqual(table.column('scraped_at').to_pylist(), [datetime(2025, 6, 1, tzinfo=timezone.utc)])
+
+    def test_mixed_decimal_and_float_prices(self):
+        """Tests that prices mixing decimals, floats and nulls are converted to doubles."""
+        array = to_arrow_array([Decimal('1.5'), 2.5, None, 3], pa.float64())
+
+        self.assertEqual(array.type, pa.float64())
+        self.assertEqual(array.to_pylist(), [1.5, 2.5, None, 3.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
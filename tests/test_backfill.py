@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timezone
+from unittest.mock import patch
+
+from scripts.backfill import discover_files, ensure_partitions, read_items
+from src.scrapers.parmed_scraper import PARMED_SCHEMA
+
+
+class TestBackfill(unittest.TestCase):
+    """Test suite for discovering and parsing legacy CSV snapshots."""
+
+    def test_discover_files_by_name(self):
+        """Tests that snapshot files are found with the date of their name, sorted by date."""
+        with tempfile.TemporaryDirectory() as data_dir:
+            for name in ('parmed-2025-06-10.csv', 'blupax-2025-05-23.csv', 'parmed_deltas.csv', 'notes.txt'):
+                open(os.path.join(data_dir, name), 'w').close()
+
+            files = discover_files(data_dir)
+
+            self.assertEqual([(os.path.basename(path), wholesaler, scraped_at) for path, wholesaler, scraped_at in files], [
+                ('blupax-2025-05-23.csv', 'blupax', datetime(2025, 5, 23, tzinfo=timezone.utc)),
+                ('parmed-2025-06-10.csv', 'parmed', datetime(2025, 6, 10, tzinfo=timezone.utc)),
+            ])
+            self.assertEqual(len(discover_files(data_dir, 'parmed')), 1)
+
+    def test_read_items_maps_through_schema(self):
+        """Tests that pandas-written cells are coerced to the schema types, with empty cells as NULL."""
+        with tempfile.TemporaryDirectory() as data_dir:
+            path = os.path.join(data_dir, 'parmed-2025-06-10.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('itemId,price,packQuantity,isWatchListItem,description\n')
+                f.write('A1,12.5,100.0,False,\n')
+
+            row = PARMED_SCHEMA.coerce(read_items(path)).as_dicts()[0]
+
+            self.assertEqual(row['itemId'], 'A1')
+            self.assertEqual(str(row['price']), '12.5')
+            self.assertEqual(row['packQuantity'], 100)
+            self.assertIs(row['isWatchListItem'], False)
+            self.assertIsNone(row['description'])
+
+    @patch('scripts.backfill.is_partitioned', return_value=True)
+    @patch('scripts.backfill.ensure_monthly_partitions', return_value=[])
+    @patch('scripts.backfill.psycopg2.connect')
+    def test_partitions_are_created_once_per_wholesaler(self, mock_connect, mock_ensure, mock_is_partitioned):
+        """Tests that the partitions of all files are created up front, spanning each wholesaler's dates."""
+        files = [
+            ('parmed-2025-01-31.csv', 'parmed', datetime(2025, 1, 31, tzinfo=timezone.utc)),
+            ('blupax-2025-02-01.csv', 'blupax', datetime(2025, 2, 1, tzinfo=timezone.utc)),
+            ('parmed-2025-03-02.csv', 'parmed', datetime(2025, 3, 2, tzinfo=timezone.utc)),
+        ]
+
+        ensure_partitions('dsn', files)
+
+        self.assertEqual(
+            [call.args[1:] for call in mock_ensure.call_args_list],
+            [
+                ('"wholesaler_tracking".blupax', date(2025, 2, 1), date(2025, 2, 1)),
+                ('"wholesaler_tracking".parmed', date(2025, 1, 31), date(2025, 3, 2)),
+            ]
+        )
+        mock_connect.return_value.close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
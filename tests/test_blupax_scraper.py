@@ -0,0 +1,111 @@
+import json
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from src.scrapers.blupax_scraper import BlupaxScraper
+
+
+def make_page(product_ids, category_paths=(), name='SHOP_PRODUCTS_DATA'):
+    """Builds a mock BluPax page with preloaded products and category links."""
+    links = ''.join(f'<a href="{path}">Category</a>' for path in category_paths)
+    products = json.dumps({'data': [{'id': product_id, 'description': f'Product {product_id}'} for product_id in product_ids]})
+    response = MagicMock()
+    response.content = f'<html>{links}<script>PRELOADED_DATA.{name} = {products};</script></html>'.encode()
+    response.status_code = 200
+    response.headers = {}
+    return response
+
+
+class TestBlupaxScraper(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the BluPax specials and catalog crawl."""
+
+    @patch('src.scrapers.blupax_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_specials_only_by_default(self, mock_request):
+        """Tests that only the specials page is fetched when the catalog crawl is disabled."""
+        mock_request.return_value = make_page([1, 2], name='SPECIALS_PRODUCTS_DATA')
+
+        scraper = BlupaxScraper(full_catalog=False)
+        data = await scraper.get_data()
+
+        self.assertEqual([item['id'] for item in data], [1, 2])
+        self.assertEqual(mock_request.call_count, 1)
+
+    @patch('src.scrapers.blupax_scraper.set_host_rate')
+    @patch('src.scrapers.blupax_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_catalog_crawls_categories_and_pages(self, mock_request, mock_set_rate):
+        """Tests that categories are discovered, listings paginated until no new products, and ids de-duplicated."""
+        pages = {
+            '/specials': make_page([1], name='SPECIALS_PRODUCTS_DATA'),
+            '/shop': make_page([1, 2], ['/shop/category/generics-1', '/shop/category/brands-2']),
+            '/shop/page/2': make_page([3]),
+            '/shop/page/3': make_page([3]),
+            '/shop/category/generics-1': make_page([2, 4], ['/shop/category/brands-2']),
+            '/shop/category/generics-1/page/2': make_page([]),
+            '/shop/category/brands-2': make_page([5]),
+            '/shop/category/brands-2/page/2': make_page([5]),
+        }
+        mock_request.side_effect = lambda **kwargs: pages[kwargs['url'].removeprefix('https://www.blupaxpharma.com')]
+
+        scraper = BlupaxScraper(full_catalog=True, max_concurrency=2, requests_per_second=5)
+        data = await scraper.get_data()
+
+        self.assertEqual(sorted(item['id'] for item in data), [1, 2, 3, 4, 5])
+        self.assertEqual(mock_request.call_count, len(pages))
+        mock_set_rate.assert_called_once_with('www.blupaxpharma.com', 5)
+
+    @patch('src.scrapers.blupax_scraper.set_host_rate')
+    @patch('src.scrapers.blupax_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_catalog_stops_at_page_limit(self, mock_request, mock_set_rate):
+        """Tests that the crawl fetches at most max_pages listing pages."""
+        mock_request.side_effect = lambda **kwargs: make_page([kwargs['url']])
+
+        scraper = BlupaxScraper(full_catalog=True, max_pages=3)
+        await scraper.get_data()
+
+        # The specials page and three listing pages
+        self.assertEqual(mock_request.call_count, 4)
+        # Pages beyond the limit were not seen, so the run is incomplete
+        self.assertIn('over the limit of 3', scraper.fetch_failures[-1])
+
+    @patch('src.scrapers.blupax_scraper.set_host_rate')
+    @patch('src.scrapers.blupax_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_failed_listing_marks_run_incomplete(self, mock_request, mock_set_rate):
+        """Tests that a failed listing page is recorded and the writer finishes the run as incomplete."""
+        pages = {
+            '/specials': make_page([1], name='SPECIALS_PRODUCTS_DATA'),
+            '/shop': make_page([2], ['/shop/category/generics-1']),
+            '/shop/page/2': make_page([]),
+            '/shop/category/generics-1': None,
+        }
+        mock_request.side_effect = lambda **kwargs: pages[kwargs['url'].removeprefix('https://www.blupaxpharma.com')]
+        writer = AsyncMock()
+
+        scraper = BlupaxScraper(full_catalog=True)
+        with patch.object(scraper, '_create_writer', return_value=writer):
+            await scraper.run()
+
+        written = [item['id'] for call in writer.write.call_args_list for item in call.args[0]]
+        self.assertEqual(written, [1, 2])
+        self.assertEqual(scraper.fetch_failures, ['https://www.blupaxpharma.com/shop/category/generics-1'])
+        writer.finish.assert_awaited_once_with(complete=False)
+
+    @patch('src.scrapers.blupax_scraper.set_host_rate')
+    @patch('src.scrapers.blupax_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_listing_without_products_block_is_a_failure(self, mock_request, mock_set_rate):
+        """Tests that a listing page without preloaded products, e.g. a login page, is recorded as a failure."""
+        login_page = MagicMock(content=b'<html><form action="/login"></form></html>', status_code=200, headers={})
+        pages = {
+            '/specials': make_page([1], name='SPECIALS_PRODUCTS_DATA'),
+            '/shop': login_page,
+        }
+        mock_request.side_effect = lambda **kwargs: pages[kwargs['url'].removeprefix('https://www.blupaxpharma.com')]
+
+        scraper = BlupaxScraper(full_catalog=True)
+        data = await scraper.get_data()
+
+        self.assertEqual([item['id'] for item in data], [1])
+        self.assertEqual(scraper.fetch_failures, ['https://www.blupaxpharma.com/shop'])
+
+
+if __name__ == '__main__':
+    unittest.main()
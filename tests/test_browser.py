@@ -0,0 +1,97 @@
+import asyncio
+import unittest
+from unittest.mock import patch, ANY, AsyncMock, MagicMock
+
+from src.utils import browser
+from src.utils.browser import PARMED_LOGIN_SELECTORS, scripted_login, login_for_parmed_token
+
+CREDENTIALS = {'PARMED_USERNAME': 'user@example.com', 'PARMED_PASSWORD': 'secret'}
+
+
+def make_page(token: str | None = 'token-123'):
+    """Builds a mock page whose form submit triggers the token capture of handle_request."""
+    page = MagicMock()
+    page.route = AsyncMock()
+    page.goto = AsyncMock()
+    page.fill = AsyncMock()
+
+    async def click(selector, timeout=None):
+        if selector == PARMED_LOGIN_SELECTORS['submit'] and token:
+            browser.captured_token = token
+            browser.token_found = True
+            browser.token_event.set()
+
+    page.click = AsyncMock(side_effect=click)
+    return page
+
+
+class TestScriptedLogin(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the selector-driven ParMed login."""
+
+    def setUp(self):
+        browser.captured_token = None
+        browser.token_found = False
+        browser.token_event = asyncio.Event()
+
+    @patch.dict('os.environ', CREDENTIALS)
+    async def test_scripted_login_fills_form_and_waits_for_token(self):
+        """Tests that the form is filled with the selectors and the login succeeds once the token is captured."""
+        page = make_page()
+
+        self.assertTrue(await scripted_login(page))
+
+        page.fill.assert_any_await(PARMED_LOGIN_SELECTORS['username'], 'user@example.com', timeout=ANY)
+        page.fill.assert_any_await(PARMED_LOGIN_SELECTORS['password'], 'secret', timeout=ANY)
+        self.assertEqual(browser.captured_token, 'token-123')
+
+    @patch.object(browser, 'SCRIPTED_LOGIN_TIMEOUT_SECONDS', 0.05)
+    @patch.dict('os.environ', CREDENTIALS)
+    async def test_scripted_login_times_out_without_token(self):
+        """Tests that the wait for the token is bounded and reported as a failed login."""
+        self.assertFalse(await scripted_login(make_page(token=None)))
+
+    @patch.dict('os.environ', CREDENTIALS)
+    @patch('src.utils.browser.Agent')
+    @patch('src.utils.browser.get_proxy_pool')
+    @patch('src.utils.browser.BrowserSession')
+    @patch('src.utils.browser.async_playwright')
+    async def test_login_returns_token_and_stops_session(self, mock_playwright, mock_session_cls, mock_pool, mock_agent):
+        """Tests that a scripted login returns the token without the agent and stops the browser session."""
+        mock_playwright.return_value.__aenter__ = AsyncMock()
+        mock_playwright.return_value.__aexit__ = AsyncMock(return_value=False)
+        mock_pool.return_value.choose.return_value.browser_config = {}
+        session = mock_session_cls.return_value
+        session.start = AsyncMock()
+        session.stop = AsyncMock()
+        session.get_current_page = AsyncMock(return_value=make_page())
+
+        token = await login_for_parmed_token()
+
+        self.assertEqual(token, 'token-123')
+        mock_agent.assert_not_called()
+        session.stop.assert_awaited_once()
+
+    @patch.dict('os.environ', CREDENTIALS)
+    @patch('src.utils.browser.get_proxy_pool')
+    @patch('src.utils.browser.BrowserSession')
+    @patch('src.utils.browser.async_playwright')
+    async def test_login_stops_session_when_it_raises(self, mock_playwright, mock_session_cls, mock_pool):
+        """Tests that the browser session is stopped when the login raises."""
+        mock_playwright.return_value.__aenter__ = AsyncMock()
+        mock_playwright.return_value.__aexit__ = AsyncMock(return_value=False)
+        mock_pool.return_value.choose.return_value.browser_config = {}
+        session = mock_session_cls.return_value
+        session.start = AsyncMock()
+        session.stop = AsyncMock()
+        page = make_page()
+        page.goto.side_effect = RuntimeError("navigation failed")
+        session.get_current_page = AsyncMock(return_value=page)
+
+        with self.assertRaises(RuntimeError):
+            await login_for_parmed_token()
+
+        session.stop.assert_awaited_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from datetime import datetime, timezone
+
+import psycopg2
+
+from src.utils.bulk_load import CopyRowStream, bulk_insert, encode_copy_value
+
+
+class TestBulkLoad(unittest.TestCase):
+    """Test suite for the COPY text format encoder."""
+
+    def test_encode_copy_value(self):
+        """Tests that values are encoded and escaped as COPY text expects."""
+        self.assertEqual(encode_copy_value(None), '\\N')
+        self.assertEqual(encode_copy_value(True), 't')
+        self.assertEqual(encode_copy_value(12), '12')
+        self.assertEqual(encode_copy_value('a\tb\nc\\d\x00'), 'a\\tb\\nc\\\\d')
+        self.assertEqual(encode_copy_value({'a': 1}), '{"a": 1}')
+
+    def test_stream_reads_rows_in_chunks(self):
+        """Tests that the stream yields the same text regardless of the read size."""
+        rows = [(i, f'item {i}') for i in range(100)]
+        scraped_at = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+        expected = CopyRowStream(rows, [scraped_at]).read()
+        stream = CopyRowStream(rows, [scraped_at])
+        chunks = []
+        while chunk := stream.read(7):
+            chunks.append(chunk)
+
+        self.assertEqual(''.join(chunks), expected)
+        self.assertEqual(stream.row_count, 100)
+        self.assertTrue(expected.startswith('0\titem 0\t2025-01-01T00:00:00+00:00\n'))
+
+    def test_stream_counts_encoded_bytes(self):
+        """Tests that the byte count is the UTF-8 length of the text read, not its character count."""
+        stream = CopyRowStream([('Café', 'µg')])
+        while stream.read(3):
+            pass
+
+        self.assertEqual(stream.byte_count, len('Café\tµg\n'.encode('utf-8')))
+
+    def test_failed_copy_falls_back_in_the_same_transaction(self):
+        """Tests that a failed COPY is rolled back to its savepoint and the rows are inserted instead."""
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        cur.copy_expert.side_effect = psycopg2.OperationalError("COPY is not supported")
+        on_loaded = MagicMock()
+
+        with patch('src.utils.bulk_load.execute_values') as mock_execute_values:
+            row_count = bulk_insert(conn, 'wholesaler_tracking.parmed', ['itemId'], [('a',), ('b',)], on_loaded=on_loaded)
+
+        self.assertEqual(row_count, 2)
+        mock_execute_values.assert_called_once()
+        cur.execute.assert_any_call("ROLLBACK TO SAVEPOINT bulk_copy")
+        on_loaded.assert_called_once_with(cur)
+
+    def test_on_loaded_error_is_not_retried(self):
+        """Tests that an error after the COPY is raised instead of retrying the insert."""
+        conn = MagicMock()
+        cur = conn.cursor.return_value.__enter__.return_value
+        on_loaded = MagicMock(side_effect=psycopg2.DataError("numeric field overflow"))
+
+        with patch('src.utils.bulk_load.execute_values') as mock_execute_values:
+            with self.assertRaises(psycopg2.DataError):
+                bulk_insert(conn, 'wholesaler_tracking.parmed', ['itemId'], [('a',)], on_loaded=on_loaded)
+
+        mock_execute_values.assert_not_called()
+        on_loaded.assert_called_once_with(cur)
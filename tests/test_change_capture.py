@@ -0,0 +1,50 @@
+import unittest
+
+from src.utils.change_capture import SnapshotChanges, content_hash, diff_snapshot
+
+
+class TestChangeCapture(unittest.TestCase):
+    """Test suite for change-only snapshot detection."""
+
+    fields = ('price', 'quantity')
+
+    def test_diff_snapshot_classifies_items(self):
+        """Tests that new, changed, unchanged, disappeared and reappeared items are told apart."""
+        unchanged = {'id': 1, 'price': 10, 'quantity': 5, 'description': 'A'}
+        changed = {'id': 2, 'price': 12, 'quantity': 5}
+        new = {'id': 3, 'price': 1, 'quantity': 1}
+        reappeared = {'id': 5, 'price': 3, 'quantity': 1}
+        state = {
+            '1': (content_hash(unchanged, self.fields), True),
+            '2': (content_hash({'price': 11, 'quantity': 5}, self.fields), True),
+            '4': ('gone', True),
+            '5': (content_hash(reappeared, self.fields), False),
+        }
+
+        changes = diff_snapshot([unchanged, changed, new, reappeared, dict(new)], 'id', self.fields, state)
+
+        self.assertEqual(
+            [(row['id'], row['change_type']) for row in changes.rows],
+            [(2, 'changed'), (3, 'new'), (5, 'new'), ('4', 'disappeared')]
+        )
+        self.assertEqual(changes.unchanged_count, 1)
+        self.assertIn(('4', None, False), changes.state_updates)
+
+    def test_non_compared_fields_do_not_count_as_changes(self):
+        """Tests that only the compared fields affect the content hash."""
+        self.assertEqual(
+            content_hash({'price': 1, 'quantity': 2, 'description': 'A'}, self.fields),
+            content_hash({'price': 1, 'quantity': 2, 'description': 'B'}, self.fields)
+        )
+
+    def test_merge_counts_keeps_no_rows(self):
+        """Tests that totalling a run adds the counts of a batch without holding on to its rows."""
+        total = SnapshotChanges()
+        batch = SnapshotChanges(rows=[{'id': 1}], state_updates=[('1', 'hash', True)], new_count=1, changed_count=2)
+
+        total.merge_counts(batch)
+        total.merge_counts(batch)
+
+        self.assertEqual(total.rows, [])
+        self.assertEqual(total.state_updates, [])
+        self.assertEqual(total.summary(), "2 new, 4 changed, 0 disappeared, 0 unchanged")
@@ -0,0 +1,238 @@
+import json
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from src.scrapers.parmed_scraper import ParmedScraper
+from src.utils.fingerprints import FingerprintStore, PageFingerprint, payload_fingerprint
+
+
+def make_response(item_ids, total_count=None):
+    """Builds a mock ParMed API response containing the given item IDs."""
+    payload = {'itemList': [{'itemId': item_id} for item_id in item_ids]}
+    if total_count is not None:
+        payload['totalCount'] = total_count
+    response = MagicMock()
+    response.json.return_value = payload
+    response.content = json.dumps(payload).encode()
+    response.status_code = 200
+    response.headers = {}
+    return response
+
+
+class TestParmedScraper(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the paginated ParMed catalog crawl."""
+
+    @patch('src.scrapers.parmed_scraper.get_parmed_token', new_callable=AsyncMock, return_value='token')
+    @patch('src.scrapers.parmed_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_full_catalog_fetches_all_pages_in_order(self, mock_request, mock_token):
+        """Tests that every page reported by the total count is fetched, merged in order and de-duplicated."""
+        pages = {
+            0: make_response([1, 2], total_count=5),
+            1: make_response([3, 2]),
+            2: make_response([5]),
+        }
+        mock_request.side_effect = lambda **kwargs: pages.get(kwargs['data']['pageNo'], make_response([]))
+
+        scraper = ParmedScraper(page_size=2, max_concurrency=2)
+        data = await scraper.get_data()
+
+        self.assertEqual([item['itemId'] for item in data], [1, 2, 3, 5])
+        self.assertEqual(mock_request.call_count, 3)
+
+    @patch('src.scrapers.parmed_scraper.get_parmed_token', new_callable=AsyncMock, return_value='token')
+    @patch('src.scrapers.parmed_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_full_catalog_without_total_stops_at_short_page(self, mock_request, mock_token):
+        """Tests that pages are fetched until a short page when the API does not report a total."""
+        pages = {
+            0: make_response([1, 2]),
+            1: make_response([3, 4]),
+            2: make_response([5]),
+            3: make_response([]),
+        }
+        mock_request.side_effect = lambda **kwargs: pages.get(kwargs['data']['pageNo'], make_response([]))
+
+        scraper = ParmedScraper(page_size=2, max_concurrency=2)
+        data = await scraper.get_data()
+
+        self.assertEqual([item['itemId'] for item in data], [1, 2, 3, 4, 5])
+
+    @patch('src.scrapers.parmed_scraper.get_parmed_token', new_callable=AsyncMock, return_value='token')
+    @patch('src.scrapers.parmed_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_first_page_only(self, mock_request, mock_token):
+        """Tests that only the first page is fetched when the full-catalog mode is disabled."""
+        mock_request.return_value = make_response([1, 2], total_count=10)
+
+        scraper = ParmedScraper(full_catalog=False, page_size=2)
+        data = await scraper.get_data()
+
+        self.assertEqual(len(data), 2)
+        mock_request.assert_called_once()
+
+    @patch('src.scrapers.parmed_scraper.get_parmed_token', new_callable=AsyncMock, return_value='token')
+    @patch('src.scrapers.parmed_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_sharded_crawl_merges_shards(self, mock_request, mock_token):
+        """Tests that each facet shard is crawled with its own facet filter and the results are de-duplicated."""
+        shards = {
+            None: make_response([1, 2], total_count=3),
+            'A': make_response([1, 2], total_count=2),
+            'B': make_response([2, 3], total_count=2),
+        }
+        mock_request.side_effect = lambda **kwargs: shards[next(iter(kwargs['data']['facets']['manufacturer']), None)]
+
+        scraper = ParmedScraper(page_size=10, shard_facet='manufacturer', shard_values=['A', 'B'])
+        data = await scraper.get_data()
+
+        self.assertEqual(sorted(item['itemId'] for item in data), [1, 2, 3])
+        self.assertEqual(mock_request.call_count, 3)
+        self.assertEqual(scraper.fetch_failures, [])
+
+    @patch('src.scrapers.parmed_scraper.get_parmed_token', new_callable=AsyncMock, return_value='token')
+    @patch('src.scrapers.parmed_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_sharded_crawl_missing_items_marks_run_incomplete(self, mock_request, mock_token):
+        """Tests that a sharded run is incomplete when the shards hold fewer items than the unfiltered catalog."""
+        shards = {
+            None: make_response([1, 2], total_count=4),
+            'A': make_response([1, 2], total_count=2),
+            'B': make_response([3], total_count=1),
+        }
+        mock_request.side_effect = lambda **kwargs: shards[next(iter(kwargs['data']['facets']['manufacturer']), None)]
+        writer = AsyncMock()
+
+        with patch.dict('os.environ', {'PARMED_SHARD_FACET': 'manufacturer', 'PARMED_SHARD_VALUES': 'A, B'}):
+            scraper = ParmedScraper(page_size=10)
+        with patch.object(scraper, '_create_writer', return_value=writer):
+            await scraper.run()
+
+        self.assertEqual(scraper.shard_values, ['A', 'B'])
+        self.assertEqual(scraper.fetch_failures, ['shards:manufacturer'])
+        writer.finish.assert_awaited_once_with(complete=False)
+
+    @patch('src.scrapers.parmed_scraper.get_parmed_token', new_callable=AsyncMock, return_value='token')
+    @patch('src.scrapers.parmed_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_run_streams_pages_to_writer_in_batches(self, mock_request, mock_token):
+        """Tests that run() writes the crawled items in fixed-size batches and finishes the writer once."""
+        pages = {
+            0: make_response([1, 2], total_count=5),
+            1: make_response([3, 4]),
+            2: make_response([4, 5]),
+        }
+        mock_request.side_effect = lambda **kwargs: pages[kwargs['data']['pageNo']]
+        writer = AsyncMock()
+
+        scraper = ParmedScraper(page_size=2, max_concurrency=2)
+        scraper.batch_size = 3
+        with patch.object(scraper, '_create_writer', return_value=writer):
+            await scraper.run()
+
+        batches = [[item['itemId'] for item in call.args[0]] for call in writer.write.call_args_list]
+        self.assertEqual(batches, [[1, 2, 3], [4, 5]])
+        writer.finish.assert_awaited_once_with(complete=True)
+
+    @patch('src.scrapers.parmed_scraper.get_parmed_token', new_callable=AsyncMock, return_value='token')
+    @patch('src.scrapers.parmed_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_failed_page_marks_run_incomplete(self, mock_request, mock_token):
+        """Tests that a page that could not be fetched is skipped and the writer finishes the run as incomplete."""
+        pages = {
+            0: make_response([1, 2], total_count=6),
+            1: None,
+            2: make_response([5, 6]),
+        }
+        mock_request.side_effect = lambda **kwargs: pages[kwargs['data']['pageNo']]
+        writer = AsyncMock()
+        fingerprints = MagicMock(load=AsyncMock(), save=AsyncMock())
+        fingerprints.is_unchanged.return_value = False
+        fingerprints.conditional_headers.return_value = {}
+        fingerprints.unchanged_item_keys.return_value = set()
+
+        scraper = ParmedScraper(page_size=2, max_concurrency=2)
+        scraper.change_only = True
+        with patch.object(scraper, '_create_writer', return_value=writer), \
+             patch('src.scrapers.base.FingerprintStore', return_value=fingerprints):
+            await scraper.run()
+
+        written = [item['itemId'] for call in writer.write.call_args_list for item in call.args[0]]
+        self.assertEqual(written, [1, 2, 5, 6])
+        self.assertEqual(scraper.fetch_failures, ['1'])
+        writer.finish.assert_awaited_once_with(complete=False)
+        fingerprints.save.assert_not_awaited()
+
+    @patch('src.scrapers.parmed_scraper.get_parmed_token', new_callable=AsyncMock, return_value='token')
+    @patch('src.scrapers.parmed_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_failed_page_without_total_is_not_the_end(self, mock_request, mock_token):
+        """Tests that without a total count a failed page stops the crawl as a failure, not as the last page."""
+        pages = {
+            0: make_response([1, 2]),
+            1: None,
+            2: make_response([5, 6]),
+            3: make_response([]),
+        }
+        mock_request.side_effect = lambda **kwargs: pages.get(kwargs['data']['pageNo'], make_response([]))
+
+        scraper = ParmedScraper(page_size=2, max_concurrency=1)
+        data = await scraper.get_data()
+
+        self.assertEqual([item['itemId'] for item in data], [1, 2])
+        self.assertEqual(scraper.fetch_failures, ['1'])
+
+    @patch.dict('os.environ', {'SNAPSHOT_ARCHIVE_DIR': ''})
+    @patch('src.scrapers.parmed_scraper.get_parmed_token', new_callable=AsyncMock, return_value='token')
+    @patch('src.scrapers.parmed_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_items_of_unchanged_pages_are_observed(self, mock_request, mock_token):
+        """Tests that the items of skipped pages are passed to the writer to be folded into the rollups."""
+        mock_request.return_value = make_response([1, 2], total_count=2)
+        writer = AsyncMock()
+        fingerprints = MagicMock(load=AsyncMock(), save=AsyncMock())
+        fingerprints.unchanged_item_keys.return_value = {'3', '4'}
+
+        scraper = ParmedScraper(page_size=2, max_concurrency=2)
+        scraper.change_only = True
+        with patch.object(scraper, '_create_writer', return_value=writer), \
+             patch('src.scrapers.base.FingerprintStore', return_value=fingerprints):
+            await scraper.run()
+
+        writer.observe_unchanged.assert_awaited_once_with({'3', '4'})
+        writer.finish.assert_awaited_once_with(complete=True)
+
+    @patch.dict('os.environ', {'SNAPSHOT_ARCHIVE_DIR': '/tmp/archive'})
+    @patch('src.scrapers.parmed_scraper.get_parmed_token', new_callable=AsyncMock, return_value='token')
+    @patch('src.scrapers.parmed_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_pages_are_not_skipped_with_the_archive(self, mock_request, mock_token):
+        """Tests that page fingerprints are not used while the archive needs every item."""
+        mock_request.return_value = make_response([1, 2], total_count=2)
+        writer = AsyncMock()
+
+        scraper = ParmedScraper(page_size=2, max_concurrency=2)
+        scraper.change_only = True
+        with patch.object(scraper, '_create_writer', return_value=writer), \
+             patch('src.scrapers.base.FingerprintStore') as mock_store:
+            await scraper.run()
+
+        mock_store.assert_not_called()
+        self.assertIsNone(scraper.fingerprints)
+        writer.finish.assert_awaited_once_with(complete=True)
+
+    @patch('src.scrapers.parmed_scraper.get_parmed_token', new_callable=AsyncMock, return_value='token')
+    @patch('src.scrapers.parmed_scraper.async_http_request', new_callable=AsyncMock)
+    async def test_unchanged_pages_are_skipped(self, mock_request, mock_token):
+        """Tests that pages matching the previous run's fingerprint are not parsed and their items count as seen."""
+        pages = {
+            0: make_response([1, 2], total_count=6),
+            1: make_response([3, 4]),
+            2: make_response([5, 6]),
+        }
+        mock_request.side_effect = lambda **kwargs: pages[kwargs['data']['pageNo']]
+
+        scraper = ParmedScraper(page_size=2, max_concurrency=2)
+        scraper.fingerprints = FingerprintStore('parmed', pool=None)
+        scraper.fingerprints.previous = {
+            '1': PageFingerprint(payload_fingerprint(pages[1].content), item_keys=['3', '4']),
+            '2': PageFingerprint('outdated', etag='"v1"', item_keys=['5']),
+        }
+        data = await scraper.get_data()
+
+        self.assertEqual([item['itemId'] for item in data], [1, 2, 5, 6])
+        pages[1].json.assert_not_called()
+        self.assertEqual(scraper.fingerprints.unchanged_item_keys(), {'3', '4'})
+        self.assertEqual(scraper.fingerprints.updates['2'].item_keys, ['5', '6'])
+        page_2_headers = [call.kwargs['headers'] for call in mock_request.call_args_list if call.kwargs['data']['pageNo'] == 2]
+        self.assertEqual(page_2_headers[0]['If-None-Match'], '"v1"')
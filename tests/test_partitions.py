@@ -0,0 +1,94 @@
+import unittest
+from datetime import date, datetime, timezone
+from unittest.mock import MagicMock
+
+from scripts.migrate_partitions import rename_partitions
+from src.utils.partitions import (
+    add_months, ensure_default_partition, ensure_future_partitions, ensure_monthly_partitions, month_start,
+    split_table_name
+)
+
+
+def month_bound(month: date) -> str:
+    """Returns the bound expression of a monthly partition, as pg_get_expr prints it."""
+    return f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+
+
+class TestPartitions(unittest.TestCase):
+    """Test suite for the monthly partition helpers."""
+
+    def test_add_months_crosses_years(self):
+        """Tests that month arithmetic wraps around the end of the year."""
+        self.assertEqual(add_months(date(2025, 11, 1), 2), date(2026, 1, 1))
+        self.assertEqual(add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+
+    def test_split_table_name(self):
+        """Tests that quoted and unqualified table names are split into schema and table."""
+        self.assertEqual(split_table_name('"wholesaler_tracking".parmed'), ('wholesaler_tracking', 'parmed'))
+        self.assertEqual(split_table_name('blupax'), ('public', 'blupax'))
+
+    def test_ensure_monthly_partitions_creates_missing_months(self):
+        """Tests that only the missing partitions are created, with month bounds."""
+        cur = MagicMock()
+        # The first partition exists, the other two do not
+        cur.fetchall.return_value = [(month_bound(date(2025, 11, 1)),)]
+
+        created = ensure_monthly_partitions(cur, 'wholesaler_tracking.parmed', date(2025, 11, 20), date(2026, 1, 1))
+
+        self.assertEqual(created, ['parmed_p202512', 'parmed_p202601'])
+        statements = [call.args[0] for call in cur.execute.call_args_list if call.args[0].startswith('CREATE')]
+        self.assertIn("FROM ('2025-12-01 00:00:00+00') TO ('2026-01-01 00:00:00+00')", statements[0])
+        self.assertIn('PARTITION OF wholesaler_tracking.parmed', statements[1])
+
+    def test_ensure_default_partition(self):
+        """Tests that the default partition is created only when missing."""
+        cur = MagicMock()
+        cur.fetchall.side_effect = [[(month_bound(date(2025, 11, 1)),)], [('DEFAULT',)]]
+
+        self.assertTrue(ensure_default_partition(cur, 'wholesaler_tracking.parmed'))
+        self.assertFalse(ensure_default_partition(cur, 'wholesaler_tracking.parmed'))
+
+        statements = [call.args[0] for call in cur.execute.call_args_list if call.args[0].startswith('CREATE')]
+        self.assertEqual(statements, [
+            'CREATE TABLE IF NOT EXISTS wholesaler_tracking.parmed_default PARTITION OF wholesaler_tracking.parmed DEFAULT'
+        ])
+
+    def test_future_partitions_after_migration(self):
+        """Tests that the partitions of a migrated table are recognized by their bounds, not their names."""
+        this_month = month_start(datetime.now(timezone.utc).date())
+        cur = MagicMock()
+        cur.fetchone.return_value = (1,)
+        # Bounds of the parmed_partitioned_pYYYYMM partitions and the default partition the migration created,
+        # printed in another session time zone
+        cur.fetchall.return_value = [
+            ('DEFAULT',),
+            (month_bound(add_months(this_month, -1)),),
+            (month_bound(this_month),),
+            (month_bound(add_months(this_month, 1)).replace(' 00:00:00+00', ' 02:00:00+02'),),
+        ]
+
+        created = ensure_future_partitions(cur, 'wholesaler_tracking.parmed', months_ahead=2)
+
+        self.assertEqual(created, [f"parmed_p{add_months(this_month, 2):%Y%m}"])
+        statements = [call.args[0] for call in cur.execute.call_args_list if call.args[0].startswith('CREATE')]
+        self.assertEqual(len(statements), 1)
+
+    def test_rename_partitions(self):
+        """Tests that the staging partitions and indexes take the names of the table they replace."""
+        cur = MagicMock()
+        cur.fetchall.return_value = [('parmed_partitioned_itemid_scraped_at_idx',), ('parmed_partitioned_p202506',)]
+        # The legacy table has an index with the first name
+        cur.fetchone.side_effect = [('wholesaler_tracking.parmed_itemid_scraped_at_idx',), (None,)]
+
+        self.assertEqual(rename_partitions(cur, 'parmed'), 2)
+
+        statements = [call.args[0] for call in cur.execute.call_args_list if call.args[0].startswith('ALTER')]
+        self.assertEqual(statements, [
+            'ALTER TABLE wholesaler_tracking.parmed_itemid_scraped_at_idx RENAME TO parmed_legacy_itemid_scraped_at_idx',
+            'ALTER TABLE wholesaler_tracking.parmed_partitioned_itemid_scraped_at_idx RENAME TO parmed_itemid_scraped_at_idx',
+            'ALTER TABLE wholesaler_tracking.parmed_partitioned_p202506 RENAME TO parmed_p202506',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
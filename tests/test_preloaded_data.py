@@ -0,0 +1,42 @@
+import json
+import unittest
+
+from src.utils.preloaded_data import extract_preloaded_data, find_json_end
+
+
+class TestPreloadedData(unittest.TestCase):
+    """Test suite for extracting PRELOADED_DATA blocks from raw pages."""
+
+    def test_nested_objects_and_brackets_in_strings(self):
+        """Tests that a block ends at its balancing brace, not at braces, quotes or `};` inside strings."""
+        specials = {
+            'data': [{'id': 1, 'description': 'Tabs {10mg}; "coated" \\ }; café', 'tags': [[1], {'a': {}}]}],
+            'meta': {'page': 1},
+        }
+        body = (
+            '<script>\nPRELOADED_DATA.SPECIALS_PRODUCTS_DATA = '
+            + json.dumps(specials, indent=2, ensure_ascii=False)
+            + ';\nPRELOADED_DATA.CATEGORIES = [{"name": "Generics"}];\n</script>'
+        ).encode('utf-8')
+
+        blocks = extract_preloaded_data(body)
+
+        self.assertEqual(blocks, {'SPECIALS_PRODUCTS_DATA': specials, 'CATEGORIES': [{'name': 'Generics'}]})
+
+    def test_selected_blocks_only(self):
+        """Tests that only the requested blocks are decoded."""
+        body = b'PRELOADED_DATA.A = {"x": 1}; PRELOADED_DATA.B = {"y": 2};'
+
+        self.assertEqual(extract_preloaded_data(body, ['B']), {'B': {'y': 2}})
+
+    def test_invalid_and_unterminated_blocks_are_skipped(self):
+        """Tests that a block that is not JSON or never ends does not prevent extracting the others."""
+        body = b"PRELOADED_DATA.A = {'js': undefined}; PRELOADED_DATA.B = {\"y\": 2}; PRELOADED_DATA.C = {\"z\": "
+
+        self.assertEqual(extract_preloaded_data(body), {'B': {'y': 2}})
+        with self.assertRaises(ValueError):
+            find_json_end(body, body.rindex(b'{'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import json
+import unittest
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+from src.utils.price_rollup import observe_unchanged_prices, rollup_rows
+
+
+class TestPriceRollup(unittest.TestCase):
+    """Test suite for building the latest-price and daily-rollup rows of a batch."""
+
+    def test_rollup_rows_per_price_field(self):
+        """Tests that every item gets one row per present price field with its attributes."""
+        items = [
+            {'id': 1, 'price': Decimal('10.50'), 'unit_price': Decimal('0.35'), 'description': 'A', 'brand': None},
+            {'id': 2, 'price': None, 'unit_price': Decimal('1.00'), 'description': 'B', 'brand': 'X'},
+            {'id': None, 'price': Decimal('1'), 'unit_price': None, 'description': 'C', 'brand': None},
+        ]
+
+        rows = rollup_rows('blupax', 'id', ('price', 'unit_price'), ('description',), items)
+
+        self.assertEqual(
+            [row[:4] for row in rows],
+            [('blupax', '1', 'price', Decimal('10.50')), ('blupax', '1', 'unit_price', Decimal('0.35')),
+             ('blupax', '2', 'unit_price', Decimal('1.00'))]
+        )
+        self.assertEqual(json.loads(rows[2][4]), {'description': 'B'})
+
+    def test_rollup_rows_keeps_last_duplicate(self):
+        """Tests that a repeated item only produces one row, from its last occurrence."""
+        items = [{'itemId': 'a', 'price': 1}, {'itemId': 'a', 'price': 2}]
+
+        rows = rollup_rows('parmed', 'itemId', ('price',), (), items)
+
+        self.assertEqual([row[3] for row in rows], [2])
+
+    def test_observe_unchanged_prices_uses_latest_prices(self):
+        """Tests that unchanged items are folded in by key from latest_price in one statement."""
+        cur = MagicMock()
+        cur.rowcount = 2
+        scraped_at = datetime(2025, 6, 1, 23, 30, tzinfo=timezone.utc)
+
+        self.assertEqual(observe_unchanged_prices(cur, 'parmed', ['a', 'b'], scraped_at), 2)
+        self.assertEqual(observe_unchanged_prices(cur, 'parmed', [], scraped_at), 0)
+
+        cur.execute.assert_called_once()
+        sql, parameters = cur.execute.call_args.args
+        self.assertIn('UPDATE wholesaler_tracking.latest_price', sql)
+        self.assertIn('INSERT INTO wholesaler_tracking.daily_price_rollup', sql)
+        self.assertEqual(parameters['item_keys'], ['a', 'b'])
+        self.assertEqual(parameters['day'], date(2025, 6, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
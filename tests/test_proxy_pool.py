@@ -0,0 +1,50 @@
+import os
+import unittest
+from unittest.mock import patch
+
+from src.utils.proxy_pool import ProxyEndpoint, ProxyPool
+
+
+class TestProxyPool(unittest.TestCase):
+    """Test suite for proxy selection and sticky sessions."""
+
+    def setUp(self):
+        self.fast = ProxyEndpoint("fast:1", "user", "pass", latency=0.1)
+        self.slow = ProxyEndpoint("slow:1", "user", "pass", latency=0.5)
+        self.pool = ProxyPool([self.slow, self.fast])
+
+    def test_chooses_healthiest_proxy(self):
+        """Tests that the proxy with the best latency and error rate is chosen."""
+        self.assertIs(self.pool.choose(), self.fast)
+        for _ in range(5):
+            self.fast.record(0.1, success=False)
+        self.assertIs(self.pool.choose(), self.slow)
+
+    def test_sticky_session_rotates_on_errors(self):
+        """Tests that a wholesaler keeps its proxy until the proxy's error rate gets too high."""
+        self.assertIs(self.pool.choose('parmed'), self.fast)
+        self.slow.latency = 0.01
+        self.assertIs(self.pool.choose('parmed'), self.fast)
+
+        for _ in range(3):
+            self.fast.record(0.1, success=False)
+        self.assertIs(self.pool.choose('parmed'), self.slow)
+
+    def test_sticky_keys_prefer_different_proxies(self):
+        """Tests that different wholesalers are spread over different proxies when scores are equal."""
+        pool = ProxyPool([ProxyEndpoint("a:1", "user", "pass"), ProxyEndpoint("b:1", "user", "pass")])
+        self.assertIsNot(pool.choose('parmed'), pool.choose('blupax'))
+
+    @patch.dict(os.environ, {
+        'OX_USERNAME': 'user',
+        'OX_PASSWORD': 'pass',
+        'OX_PROXY_SERVER_ADDRESSES': 'http://a:1, b:2',
+        'OX_SESSION_IDS': 's1,s2',
+    })
+    def test_from_env_creates_session_endpoints(self):
+        """Tests that one endpoint is created per server and session ID."""
+        pool = ProxyPool.from_env()
+        self.assertEqual(
+            [(e.server, e.username) for e in pool.endpoints],
+            [("a:1", "user-sessid-s1"), ("a:1", "user-sessid-s2"), ("b:2", "user-sessid-s1"), ("b:2", "user-sessid-s2")]
+        )
@@ -0,0 +1,127 @@
+import time
+import httpx
+import asyncio
+import unittest
+from unittest.mock import patch, AsyncMock
+
+from src.utils.metrics import metrics
+from src.utils.http_client import AsyncHttpClient
+from src.utils.resilience import CircuitBreaker, CircuitOpenError, RateLimiter, RetryPolicy, parse_retry_after
+
+
+def make_response(status_code: int, headers: dict | None = None) -> httpx.Response:
+    """Builds an httpx response for a request to the test host."""
+    return httpx.Response(status_code, headers=headers, request=httpx.Request("GET", "https://example.test/"))
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the per-host rate limiter."""
+
+    async def test_set_rate_spreads_requests(self):
+        """Tests that concurrent requests to a rate-limited host are sent one interval apart."""
+        limiter = RateLimiter()
+        limiter.set_rate("example.test", 50)
+
+        with patch("src.utils.resilience.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+            for _ in range(3):
+                await limiter.wait("example.test")
+            await limiter.wait("other.test")
+
+        delays = [call.args[0] for call in mock_sleep.call_args_list]
+        self.assertEqual(len(delays), 2)
+        self.assertAlmostEqual(delays[0], 0.02, delta=0.005)
+        self.assertAlmostEqual(delays[1], 0.04, delta=0.005)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Test suite for the per-host circuit breaker."""
+
+    def test_opens_after_threshold_and_half_opens_after_timeout(self):
+        """Tests that the circuit opens after consecutive failures and lets a single trial through later."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+
+        breaker.opened_at = time.monotonic() - 10
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+
+    def test_parse_retry_after(self):
+        """Tests that Retry-After values in seconds are parsed and invalid values are ignored."""
+        self.assertEqual(parse_retry_after("7"), 7.0)
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertIsNone(parse_retry_after(None))
+
+
+class TestAsyncHttpClientRetries(unittest.IsolatedAsyncioTestCase):
+    """Test suite for the retry behaviour of the async HTTP client."""
+
+    def setUp(self):
+        metrics.reset()
+        self.client = AsyncHttpClient(retry_policy=RetryPolicy(max_attempts=3, base_delay=0))
+
+    async def test_retries_server_errors_until_success(self):
+        """Tests that a 503 followed by a 200 is retried and counted."""
+        with patch.object(self.client, '_send', new_callable=AsyncMock) as mock_send:
+            mock_send.side_effect = [make_response(503), make_response(200)]
+            response = await self.client.request("GET", "https://example.test/", headers={})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(metrics.get("retry", "example.test"), 1)
+        self.assertEqual(metrics.get("success", "example.test"), 1)
+
+    async def test_does_not_retry_client_errors(self):
+        """Tests that a 404 is raised immediately."""
+        with patch.object(self.client, '_send', new_callable=AsyncMock) as mock_send:
+            mock_send.return_value = make_response(404)
+            with self.assertRaises(httpx.HTTPStatusError):
+                await self.client.request("GET", "https://example.test/", headers={})
+
+        mock_send.assert_awaited_once()
+
+    async def test_gives_up_and_opens_circuit(self):
+        """Tests that repeated transport errors exhaust the retries and trip the circuit breaker."""
+        self.client._get_breaker("example.test").failure_threshold = 3
+        with patch.object(self.client, '_send', new_callable=AsyncMock) as mock_send:
+            mock_send.side_effect = httpx.ConnectError("refused")
+            with self.assertRaises(httpx.ConnectError):
+                await self.client.request("GET", "https://example.test/", headers={})
+            with self.assertRaises(CircuitOpenError):
+                await self.client.request("GET", "https://example.test/", headers={})
+
+        self.assertEqual(mock_send.await_count, 3)
+        self.assertEqual(metrics.get("gave_up", "example.test"), 1)
+
+    async def test_cancelled_trial_does_not_block_the_host(self):
+        """Tests that a half-open trial cancelled before its outcome re-opens the circuit instead of holding it."""
+        breaker = self.client._get_breaker("example.test")
+        breaker.failures = breaker.failure_threshold
+        breaker.opened_at = time.monotonic() - breaker.reset_timeout
+        started = asyncio.Event()
+
+        async def hang(*args, **kwargs):
+            started.set()
+            await asyncio.sleep(3600)
+
+        with patch.object(self.client, '_send', side_effect=hang):
+            task = asyncio.create_task(self.client.request("GET", "https://example.test/", headers={}))
+            await started.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self.assertFalse(breaker.trial_in_progress)
+        self.assertEqual(breaker.state, "open")
+
+        # Once the reset timeout passes again, a new trial is let through
+        breaker.opened_at = time.monotonic() - breaker.reset_timeout
+        with patch.object(self.client, '_send', new_callable=AsyncMock) as mock_send:
+            mock_send.return_value = make_response(200)
+            response = await self.client.request("GET", "https://example.test/", headers={})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(breaker.state, "closed")
@@ -0,0 +1,61 @@
+import unittest
+from decimal import Decimal
+
+from src.scrapers.schema import Column, WholesalerSchema
+from src.scrapers.parmed_scraper import PARMED_SCHEMA
+from src.scrapers.blupax_scraper import BLUPAX_SCHEMA
+
+
+class TestWholesalerSchema(unittest.TestCase):
+    """Test suite for schema declarations and column-wise type coercion."""
+
+    schema = WholesalerSchema(
+        name="test",
+        table="test",
+        columns=(
+            Column("id"),
+            Column("price", "NUMERIC", path="pricing.price"),
+            Column("quantity", "INTEGER"),
+            Column("is_available", "BOOLEAN"),
+        ),
+        item_key="id"
+    )
+
+    def test_coerces_values_column_by_column(self):
+        """Tests that values are extracted by path, coerced to their types and stripped of null bytes."""
+        batch = self.schema.coerce([
+            {"id": "a\x00", "pricing": {"price": "$1,234.50"}, "quantity": "3", "is_available": "Yes"},
+            {"id": 7, "pricing": {"price": 2}, "quantity": 4.0, "is_available": None},
+        ])
+
+        self.assertEqual(batch.as_tuples(), [("a", Decimal("1234.50"), 3, True), ("7", 2, 4, None)])
+        self.assertEqual(batch.quarantined, [])
+
+    def test_quarantines_rows_that_fail_coercion(self):
+        """Tests that a malformed value quarantines its row without failing the rest of the batch."""
+        bad = {"id": "b", "quantity": "many", "is_available": "Short dated"}
+        batch = self.schema.coerce([{"id": "a", "quantity": 1}, bad])
+
+        self.assertEqual(batch.as_dicts(), [{"id": "a", "price": None, "quantity": 1, "is_available": None}])
+        self.assertEqual(len(batch.quarantined), 1)
+        item, errors = batch.quarantined[0]
+        self.assertIs(item, bad)
+        self.assertEqual(set(errors), {"quantity", "is_available"})
+
+    def test_quarantines_booleans_and_out_of_range_integers(self):
+        """Tests that booleans and values outside the INTEGER range are quarantined instead of failing the load."""
+        batch = self.schema.coerce([
+            {"id": "a", "quantity": True},
+            {"id": "b", "quantity": "2147483648"},
+            {"id": "c", "quantity": -2 ** 31 - 1},
+            {"id": "d", "quantity": 2 ** 31 - 1},
+        ])
+
+        self.assertEqual([row["id"] for row in batch.as_dicts()], ["d"])
+        self.assertEqual([item["id"] for item, errors in batch.quarantined], ["a", "b", "c"])
+
+    def test_wholesaler_schemas_are_declared(self):
+        """Tests that the declared wholesaler schemas match their table layouts."""
+        self.assertEqual(len(PARMED_SCHEMA.columns), 36)
+        self.assertEqual(len(BLUPAX_SCHEMA.columns), 41)
+        self.assertIn("    packQuantity INTEGER", PARMED_SCHEMA.create_table_sql())
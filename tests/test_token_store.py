@@ -0,0 +1,46 @@
+import os
+import json
+import time
+import base64
+import tempfile
+import unittest
+
+from src.utils.token_store import TokenStore, get_token_expiry
+
+
+def make_jwt(claims: dict) -> str:
+    """Builds an unsigned JWT carrying the given claims."""
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip('=')
+    return f"header.{payload}.signature"
+
+
+class TestTokenStore(unittest.TestCase):
+    """Test suite for the persistent access-token store."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = TokenStore('parmed', path=os.path.join(self.tmp_dir.name, 'token.json'))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_saved_token_is_reused(self):
+        """Tests that a saved token is returned while it is still valid."""
+        self.store.save('abc', expires_at=time.time() + 3600)
+        self.assertEqual(self.store.get(), 'abc')
+
+    def test_token_near_expiry_is_not_reused(self):
+        """Tests that a token within the refresh margin is treated as expired."""
+        self.store.save('abc', expires_at=time.time() + 60)
+        self.assertIsNone(self.store.get())
+
+    def test_invalidate_removes_token(self):
+        """Tests that an invalidated token is no longer returned."""
+        self.store.save('abc', expires_at=time.time() + 3600)
+        self.store.invalidate()
+        self.assertIsNone(self.store.get())
+
+    def test_expiry_is_read_from_jwt(self):
+        """Tests that the expiry of a JWT token is taken from its 'exp' claim."""
+        self.assertEqual(get_token_expiry(make_jwt({'exp': 1234}), captured_at=0), 1234)
+        self.assertEqual(get_token_expiry('opaque', captured_at=10, default_ttl=5), 15)